@@ -0,0 +1,151 @@
+# bank.py
+# 按生成参数索引的本地题库
+
+import json
+import mmap
+import os
+import random
+import time
+from array import array
+
+from function import Expression, CustomMathError, GENERATOR_VERSION
+
+INDEX_FILE = "index.json"
+
+
+class QuestionBank:
+    def __init__(self, directory="question_bank", max_bytes=256 * 1024 * 1024):
+        """
+        初始化题库
+        每个题目集以 (max, question_num, seed, 生成器版本) 为键保存为一个数据文件和一个偏移量文件，
+        数据文件每行为 "题目\\t答案"，偏移量文件保存每行的起始位置，用于随机读取
+        :param directory: 题库目录
+        :param max_bytes: 题库占用磁盘空间上限，超过时按最近最少使用淘汰题目集
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index_file:
+                self.index = json.load(index_file)
+        else:
+            self.index = {}
+
+    @staticmethod
+    def key(max, question_num, seed):
+        """返回题目集的键"""
+        return f"v{GENERATOR_VERSION}-m{max}-n{question_num}-s{seed}"
+
+    def path(self, key, suffix):
+        """返回题目集文件的路径"""
+        return os.path.join(self.directory, key + suffix)
+
+    def save_index(self):
+        """原子地写入索引文件"""
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(self.index, index_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.index_path)
+
+    def build(self, max, question_num, seed):
+        """
+        生成并保存一个题目集（已存在时直接返回），题目流式写入磁盘，不在内存中保留
+        :return: 题目集的键
+        """
+        if seed is None:
+            raise CustomMathError("保存到题库的题目集必须指定随机种子。")
+        key = self.key(max, question_num, seed)
+        if key in self.index:
+            self.touch(key)
+            return key
+        offsets = array('Q')
+        position = 0
+        data_path = self.path(key, ".txt")
+        exp = Expression(max, question_num, seed=seed)
+        with open(data_path, "wb") as data_file:
+            for question, answer in exp.iter_questions():
+                line = f"{question}\t{answer}\n".encode()
+                offsets.append(position)
+                data_file.write(line)
+                position += len(line)
+        offsets.append(position)  # 结尾位置，便于计算最后一行的长度
+        with open(self.path(key, ".idx"), "wb") as offset_file:
+            offsets.tofile(offset_file)
+        # 提前停止时题目集只有部分题目，记录实际数量与生成状态
+        self.index[key] = {'max': max, 'count': len(offsets) - 1, 'status': exp.status, 'seed': seed,
+                           'bytes': position + len(offsets) * offsets.itemsize, 'last_used': time.time()}
+        self.evict(keep=key)
+        self.save_index()
+        return key
+
+    def touch(self, key):
+        """更新题目集的最近使用时间"""
+        self.index[key]['last_used'] = time.time()
+        self.save_index()
+
+    def get(self, max, question_num, seed):
+        """
+        返回 (题目列表, 答案列表)；相同参数的题目集已保存时直接读取，不再重新生成
+        :param max: 生成数字的最大值
+        :param question_num: 题目数量
+        :param seed: 随机种子
+        """
+        key = self.build(max, question_num, seed)
+        questions, answers = [], []
+        with open(self.path(key, ".txt")) as data_file:
+            for line in data_file:
+                question, answer = line.rstrip("\n").split("\t")
+                questions.append(question)
+                answers.append(answer)
+        return questions, answers
+
+    def sample(self, max, count, seed=None):
+        """
+        从已保存的、最大值为 max 的最大题目集中随机抽取 count 道不重复的题目
+        通过偏移量文件按行随机读取，不调用 Expression.run
+        :return: (题目列表, 答案列表)
+        """
+        candidates = [k for k, entry in self.index.items() if entry['max'] == max and entry['count'] >= count]
+        if not candidates:
+            raise CustomMathError(f"题库中没有最大值为{max}且至少包含{count}道题目的题目集。")
+        key = candidates[0]
+        for candidate in candidates[1:]:
+            if self.index[candidate]['count'] > self.index[key]['count']:
+                key = candidate
+        if count == 0:
+            return [], []
+        rows = random.Random(seed).sample(range(self.index[key]['count']), count)
+        questions, answers = [], []
+        with open(self.path(key, ".idx"), "rb") as offset_file, open(self.path(key, ".txt"), "rb") as data_file:
+            with mmap.mmap(offset_file.fileno(), 0, access=mmap.ACCESS_READ) as offset_map, \
+                    mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data_map:
+                offsets = memoryview(offset_map).cast('Q')
+                try:
+                    for row in rows:
+                        line = data_map[offsets[row]:offsets[row + 1] - 1].decode()
+                        question, answer = line.split("\t")
+                        questions.append(question)
+                        answers.append(answer)
+                finally:
+                    offsets.release()
+        self.touch(key)
+        return questions, answers
+
+    def size(self):
+        """返回题库占用的字节数"""
+        return sum(entry['bytes'] for entry in self.index.values())
+
+    def evict(self, keep=None):
+        """按最近最少使用淘汰题目集，直到占用空间不超过上限"""
+        while self.size() > self.max_bytes:
+            candidates = [k for k in self.index if k != keep]
+            if not candidates:
+                break
+            oldest = min(candidates, key=lambda k: self.index[k]['last_used'])
+            for suffix in (".txt", ".idx"):
+                try:
+                    os.remove(self.path(oldest, suffix))
+                except FileNotFoundError:
+                    pass
+            del self.index[oldest]
@@ -0,0 +1,359 @@
+# batch.py
+# 基于 NumPy 的批量题目生成与计算
+
+import time
+
+import numpy as np
+
+from function import Number, Expression, CustomMathError, AcceptanceWindow, estimate_capacity
+
+OPERATORS = [' + ', ' - ', ' * ', ' % ']  # 运算符编码：0 加，1 减，2 乘，3 除
+PRECEDENCE = [1, 1, 2, 2]  # 各运算符的优先级
+LIMIT = 1 << 31  # 中间结果的分子、分母上限，保证 int64 乘法不溢出
+
+# 题目形状：
+# 1: A o1 B
+# 2: (A o1 B) o2 C，dir2 为 1 时为 C o2 (A o1 B)
+# 3: 在形状 2 的基础上再与 D 进行 o3 运算，dir3 决定 D 的位置
+# 4: (A o1 B) o3 (C o2 D)，swap 为 1 时交换两个子表达式
+SHAPES = np.array([1, 2, 3, 4])
+SHAPE_WEIGHTS = np.array([1 / 3, 1 / 3, 1 / 6, 1 / 6])  # 与 Expression 的形状分布一致
+
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_OP_SALT = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5],
+                    dtype=np.uint64)
+
+
+def _mix(x):
+    """splitmix64 混合函数，用于计算规范化哈希"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX_1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+def _operate(op, n1, d1, n2, d2):
+    """
+    对假分数数组逐行执行运算并约分
+    :param op: 运算符编码数组
+    :return: (分子, 分母, 是否合法, 是否溢出)
+    """
+    overflow = (np.abs(n1) >= LIMIT) | (d1 >= LIMIT) | (np.abs(n2) >= LIMIT) | (d2 >= LIMIT)
+    # 溢出的行先替换为 0/1，避免后续乘法真正溢出
+    n1 = np.where(overflow, 0, n1)
+    n2 = np.where(overflow, 0, n2)
+    d1 = np.where(overflow, 1, d1)
+    d2 = np.where(overflow, 1, d2)
+    cross = n1 * d2
+    numerator = np.select([op == 0, op == 1, op == 2], [cross + n2 * d1, cross - n2 * d1, n1 * n2], cross)
+    denominator = np.where(op == 3, d1 * n2, d1 * d2)
+    zero_divisor = denominator == 0
+    denominator = np.where(zero_divisor, 1, denominator)
+    gcd = np.gcd(numerator, denominator)
+    numerator //= gcd
+    denominator //= gcd
+    valid = ~zero_divisor & ~overflow & (numerator >= 0)
+    return numerator, denominator, valid, overflow
+
+
+def _combine(op, h1, top1, acc1, h2, top2, acc2):
+    """
+    计算运算结果的规范化哈希
+    ' + ' 与 ' * ' 的连续运算展开后按多重集合求和，与操作数顺序无关
+    :return: (哈希, 顶层运算符, 展开后的累加值)
+    """
+    commutative = (op == 0) | (op == 2)
+    part_1 = np.where(top1 == op, acc1, _mix(h1))
+    part_2 = np.where(top2 == op, acc2, _mix(h2))
+    acc = part_1 + part_2
+    salt = _OP_SALT[op]
+    ordered = _mix(_mix(h1 ^ salt) + h2)
+    h = np.where(commutative, _mix(acc ^ salt), ordered)
+    return h, op.astype(np.int64), acc
+
+
+class BatchExpression:
+    def __init__(self, max, question_num, seed=None, batch_size=4096, max_attempts=None, time_limit=None):
+        """
+        初始化一个BatchExpression对象，以数组为单位批量生成和计算题目
+        :param max: 生成数字的最大值
+        :param question_num: 要生成的问题数量
+        :param seed: 随机种子
+        :param batch_size: 每批生成的候选表达式数量
+        :param max_attempts: 候选表达式的总数上限，None 表示每道题平均 Expression.ATTEMPTS_PER_QUESTION 个
+        :param time_limit: 生成时间上限（秒），None 表示不限制
+        与 Expression 相同，容量不足或达到上限时提前停止并保留已生成的题目，原因见 status
+        """
+        if (not isinstance(max, int)) or max < 2:
+            raise CustomMathError("max必须大于等于2。")
+        self.max = max
+        self.question_num = question_num
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.expressions = set()  # 已生成表达式的规范化哈希
+        self.generation_times = 0  # 记录生成表达式的尝试次数
+        self.expression_num = 0  # 当前已生成的有效表达式数量
+        self.max_attempts = (max_attempts if max_attempts is not None
+                             else Expression.ATTEMPTS_PER_QUESTION * question_num)
+        self.time_limit = time_limit
+        self.status = None  # 生成结束时的状态，取值同 Expression.status
+        self.templates = {}  # 题目结构编码到格式字符串的缓存
+        self.strings = {}  # （分子，分母）到字符串表示的缓存
+
+    def sample_operands(self, size):
+        """按 Number 的分布批量生成操作数，返回约分后的（分子，分母）数组"""
+        max = self.max
+        integer = self.rng.integers(0, max, size)
+        denominator = self.rng.integers(1, max, size)
+        is_fra = self.rng.integers(0, 2, size).astype(bool)
+        numerator = np.where(is_fra, self.rng.integers(1, denominator + 1), 0)
+        improper = integer * denominator + numerator
+        # 如果生成的值大于等于 max，调整整数部分使其小于 max
+        improper -= (improper // (max * denominator)) * denominator
+        gcd = np.gcd(improper, denominator)
+        return improper // gcd, denominator // gcd
+
+    def sample(self, size):
+        """批量生成候选表达式，返回由数组组成的字典"""
+        rng = self.rng
+        batch = {'shape': rng.choice(SHAPES, size, p=SHAPE_WEIGHTS)}
+        for k in 'abcd':
+            batch['n' + k], batch['d' + k] = self.sample_operands(size)
+        for k in ('o1', 'o2', 'o3'):
+            batch[k] = rng.integers(0, 4, size)
+        # 加法与乘法的一元子表达式总是把前一结果放在左侧
+        batch['dir2'] = rng.integers(0, 2, size) * ((batch['o2'] == 1) | (batch['o2'] == 3))
+        batch['dir3'] = rng.integers(0, 2, size) * ((batch['o3'] == 1) | (batch['o3'] == 3))
+        batch['swap'] = rng.integers(0, 2, size)
+        # 非除法的二元子表达式大数在前
+        for first, second, op in (('a', 'b', 'o1'), ('c', 'd', 'o2')):
+            n1, d1, n2, d2 = batch['n' + first], batch['d' + first], batch['n' + second], batch['d' + second]
+            swap = (batch[op] != 3) & (n1 * d2 < n2 * d1)
+            batch['n' + first], batch['n' + second] = np.where(swap, n2, n1), np.where(swap, n1, n2)
+            batch['d' + first], batch['d' + second] = np.where(swap, d2, d1), np.where(swap, d1, d2)
+        shape = batch['shape']
+        batch['o2'] = np.where(shape >= 2, batch['o2'], 0)
+        batch['o3'] = np.where(shape >= 3, batch['o3'], 0)
+        return batch
+
+    def evaluate(self, batch):
+        """
+        向量化计算一批表达式
+        :return: (答案分子, 答案分母, 是否合法, 规范化哈希)
+        """
+        shape = batch['shape']
+        o1, o2, o3 = batch['o1'], batch['o2'], batch['o3']
+        dir2, dir3, swap = batch['dir2'] == 1, batch['dir3'] == 1, batch['swap'] == 1
+        leaves = {}
+        for k in 'abcd':
+            n, d = batch['n' + k], batch['d' + k]
+            leaves[k] = (n, d, _mix(n.astype(np.uint64) * np.uint64(LIMIT) + d.astype(np.uint64)))
+        no_top = np.full(len(shape), -1)
+        zero = np.zeros(len(shape), dtype=np.uint64)
+
+        (na, da, ha), (nb, db, hb) = leaves['a'], leaves['b']
+        (nc, dc, hc), (nd, dd, hd) = leaves['c'], leaves['d']
+        n1, d1, valid_1, _ = _operate(o1, na, da, nb, db)
+        h1, top1, acc1 = _combine(o1, ha, no_top, zero, hb, no_top, zero)
+
+        # 第二层：形状 4 为 C o2 D，其余为前一结果与 C 的一元运算
+        binary = shape == 4
+        left_right = binary | dir2
+        ln = np.where(binary, nc, np.where(dir2, nc, n1))
+        ld = np.where(binary, dc, np.where(dir2, dc, d1))
+        rn = np.where(binary, nd, np.where(dir2, n1, nc))
+        rd = np.where(binary, dd, np.where(dir2, d1, dc))
+        n2, d2, valid_2, _ = _operate(o2, ln, ld, rn, rd)
+        lh = np.where(left_right, hc, h1)
+        ltop = np.where(left_right, no_top, top1)
+        lacc = np.where(left_right, zero, acc1)
+        rh = np.where(binary, hd, np.where(dir2, h1, hc))
+        rtop = np.where(binary | ~dir2, no_top, top1)
+        racc = np.where(binary | ~dir2, zero, acc1)
+        h2, top2, acc2 = _combine(o2, lh, ltop, lacc, rh, rtop, racc)
+
+        # 第三层：形状 4 连接两个子表达式，形状 3 为前一结果与 D 的一元运算
+        ln = np.where(binary, np.where(swap, n2, n1), np.where(dir3, nd, n2))
+        ld = np.where(binary, np.where(swap, d2, d1), np.where(dir3, dd, d2))
+        rn = np.where(binary, np.where(swap, n1, n2), np.where(dir3, n2, nd))
+        rd = np.where(binary, np.where(swap, d1, d2), np.where(dir3, d2, dd))
+        n3, d3, valid_3, _ = _operate(o3, ln, ld, rn, rd)
+        lh = np.where(binary, np.where(swap, h2, h1), np.where(dir3, hd, h2))
+        ltop = np.where(binary, np.where(swap, top2, top1), np.where(dir3, no_top, top2))
+        lacc = np.where(binary, np.where(swap, acc2, acc1), np.where(dir3, zero, acc2))
+        rh = np.where(binary, np.where(swap, h1, h2), np.where(dir3, h2, hd))
+        rtop = np.where(binary, np.where(swap, top1, top2), np.where(dir3, top2, no_top))
+        racc = np.where(binary, np.where(swap, acc1, acc2), np.where(dir3, acc2, zero))
+        h3, _, _ = _combine(o3, lh, ltop, lacc, rh, rtop, racc)
+
+        numerator = np.select([shape == 1, shape == 2], [n1, n2], n3)
+        denominator = np.select([shape == 1, shape == 2], [d1, d2], d3)
+        valid = valid_1 & ((shape < 2) | valid_2) & ((shape < 3) | valid_3)
+        keys = np.select([shape == 1, shape == 2], [h1, h2], h3)
+        return numerator, denominator, valid, keys
+
+    def expression_list(self, batch, row):
+        """将批中的一行转换为 Expression 使用的表达式列表，便于与标量计算结果对照"""
+        def number(k):
+            return Number(nums=(0, int(batch['n' + k][row]), int(batch['d' + k][row])))
+
+        shape = batch['shape'][row]
+        o1, o2, o3 = (OPERATORS[batch[k][row]] for k in ('o1', 'o2', 'o3'))
+        first = [number('a'), o1, number('b')]
+        if shape == 1:
+            return [first]
+        if shape == 4:
+            second = [number('c'), o2, number('d')]
+            if batch['swap'][row]:
+                return [second, first, [o3]]
+            return [first, second, [o3]]
+        second = [number('c'), o2] if batch['dir2'][row] else [o2, number('c')]
+        if shape == 2:
+            return [first, second]
+        third = [number('d'), o3] if batch['dir3'][row] else [o3, number('d')]
+        return [first, second, third]
+
+    def template(self, code):
+        """
+        根据结构编码生成最少括号的格式字符串，{0}~{3} 分别对应操作数 A~D
+        :param code: 结构编码，见 structure_codes
+        """
+        template = self.templates.get(code)
+        if template is not None:
+            return template
+        rest, swap = divmod(code, 2)
+        rest, dir3 = divmod(rest, 2)
+        rest, dir2 = divmod(rest, 2)
+        rest, o3 = divmod(rest, 4)
+        rest, o2 = divmod(rest, 4)
+        shape, o1 = divmod(rest, 4)
+
+        def render(tree):
+            # 返回 (文本, 优先级, 运算符)，叶子的优先级最高
+            if isinstance(tree, str):
+                return tree, 3, None
+            op, left, right = tree
+            left_text, left_prec, _ = render(left)
+            right_text, right_prec, right_op = render(right)
+            prec = PRECEDENCE[op]
+            if left_prec < prec:
+                left_text = '(' + left_text + ')'
+            # 右侧同级运算只有在同为加法或同为乘法时才省略括号，保证文本与结构一一对应
+            if right_prec < prec or (right_prec == prec and (op != right_op or op in (1, 3))):
+                right_text = '(' + right_text + ')'
+            return left_text + OPERATORS[op] + right_text, prec, op
+
+        tree = (o1, '{0}', '{1}')
+        if shape == 4:
+            other = (o2, '{2}', '{3}')
+            tree = (o3, other, tree) if swap else (o3, tree, other)
+        elif shape >= 2:
+            tree = (o2, '{2}', tree) if dir2 else (o2, tree, '{2}')
+            if shape == 3:
+                tree = (o3, '{3}', tree) if dir3 else (o3, tree, '{3}')
+        template = self.templates[code] = render(tree)[0]
+        return template
+
+    @staticmethod
+    def _code(shape, o1, o2, o3, dir2, dir3, swap):
+        """将题目结构的各部分组合为一个整数编码"""
+        return ((((shape * 4 + o1) * 4 + o2) * 4 + o3) * 2 + dir2) * 4 + dir3 * 2 + swap
+
+    def structure_codes(self, batch):
+        """向量化计算每一行的结构编码"""
+        return self._code(batch['shape'], batch['o1'], batch['o2'], batch['o3'],
+                          batch['dir2'], batch['dir3'], batch['swap'])
+
+    def strings_of(self, numerator, denominator, cache=True):
+        """
+        将最简假分数数组转换为带分数字符串列表，每个不同的数值只格式化一次
+        :param cache: 是否跨批次缓存格式化结果（操作数取值有限，答案则不缓存）
+        """
+        order = np.lexsort((denominator, numerator))
+        numerator, denominator = numerator[order], denominator[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (numerator[1:] != numerator[:-1]) | (denominator[1:] != denominator[:-1])
+        inverse = np.empty(len(order), dtype=np.int64)
+        inverse[order] = np.cumsum(first) - 1
+        strings = self.strings if cache else {}
+        table = []
+        for pair in zip(numerator[first].tolist(), denominator[first].tolist()):
+            string = strings.get(pair)
+            if string is None:
+                integer, rest = divmod(pair[0], pair[1])
+                string = strings[pair] = Number.format(integer, rest, pair[1])
+            table.append(string)
+        return [table[i] for i in inverse.tolist()]
+
+    def generate_batch(self, size, limit):
+        """
+        生成一批候选表达式，返回其中合法且不重复的 (问题, 答案) 列表
+        :param size: 候选表达式数量
+        :param limit: 最多返回的题目数量
+        """
+        self.generation_times += size
+        batch = self.sample(size)
+        numerator, denominator, valid, keys = self.evaluate(batch)
+        # 先在批内去重，再与之前批次生成的表达式比对
+        rows = np.flatnonzero(valid)
+        _, first = np.unique(keys[rows], return_index=True)
+        rows = rows[np.sort(first)]
+        seen = self.expressions
+        accepted = []
+        for row, key in zip(rows.tolist(), keys[rows].tolist()):
+            if key in seen:
+                continue  # 与已生成的表达式等价（交换律/结合律），丢弃
+            seen.add(key)
+            accepted.append(row)
+            if len(accepted) >= limit:
+                break
+        rows = np.array(accepted, dtype=np.int64)
+        self.expression_num += len(rows)
+        if not len(rows):
+            return []
+        templates = [self.template(code) for code in self.structure_codes(batch)[rows].tolist()]
+        columns = [self.strings_of(batch['n' + k][rows], batch['d' + k][rows]) for k in 'abcd']
+        questions = [t.format(a, b, c, d) for t, a, b, c, d in zip(templates, *columns)]
+        return list(zip(questions, self.strings_of(numerator[rows], denominator[rows], cache=False)))
+
+    def acceptance_rate(self):
+        """返回生成尝试中被接受的比例"""
+        if self.generation_times == 0:
+            return 0.0
+        return self.expression_num / self.generation_times
+
+    def capacity(self):
+        """估计最多能生成的不同题目数量，题目形状含1~3个运算符，见 estimate_capacity"""
+        return sum(estimate_capacity(self.max, count) for count in range(1, 4))
+
+    def run(self):
+        """批量生成题目，返回问题和答案列表，提前停止时返回已生成的部分，原因见 status"""
+        questions = []
+        answers = []
+        target = min(self.question_num, self.capacity())
+        deadline = time.monotonic() + self.time_limit if self.time_limit is not None else None
+        window = AcceptanceWindow()  # 最近的接受率，骤降时视为不同的题目已基本耗尽
+        while self.expression_num < target:
+            if self.generation_times >= self.max_attempts:
+                self.status = Expression.ATTEMPT_LIMIT
+                break
+            if window.exhausted(self.generation_times, self.expression_num):
+                self.status = Expression.INFEASIBLE
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                self.status = Expression.TIME_LIMIT
+                break
+            remaining = target - self.expression_num
+            # 最后一批按剩余数量缩小，避免浪费
+            size = min(self.batch_size, max(2 * remaining, 64), self.max_attempts - self.generation_times)
+            pairs = self.generate_batch(size, remaining)
+            for question, answer in pairs:
+                questions.append(question)
+                answers.append(answer)
+        else:
+            self.status = Expression.COMPLETE
+        if target < self.question_num:
+            self.status = Expression.INFEASIBLE
+        return questions, answers
@@ -0,0 +1,178 @@
+# benchmark.py
+# 运算与题目生成热点路径的性能基准测试
+# 用法：
+#   python benchmark.py --save     运行基准测试并保存为基线
+#   python benchmark.py --check    运行基准测试并与基线比较，性能退化时以非零状态退出
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from function import Number, Fraction, Expression
+
+BASELINE_PATH = "benchmark_baseline.json"
+MAX_VALUES = [5, 10, 20, 100]  # 生成基准中的最大值
+QUESTION_NUMS = [100, 1000, 10000]  # 生成基准中的题目数量
+QUICK_MAX_VALUES = [10]
+QUICK_QUESTION_NUMS = [100]
+TABLE_MAX_VALUES = [5, 10, 12]  # 结果表基准中的最大值，不超过 tables.TABLE_MAX
+OPERATORS = [' + ', ' - ', ' * ', ' % ']
+
+
+def measure(func, repeat=3, clock=time.perf_counter):
+    """
+    运行 func 若干次，返回 (最短耗时, 峰值内存, 最后一次的返回值)
+    峰值内存在单独的一次运行中用 tracemalloc 测得，不影响计时
+    :param clock: 计时函数，测试时可替换为固定的时钟
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = clock()
+        result = func()
+        best = min(best, clock() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def bench_numbers(count=20000, max=10):
+    """Number 随机构造与化简的吞吐量"""
+    rng = random.Random(0)
+    nums = [(rng.randint(0, max), rng.randint(0, 4 * max), rng.randint(1, max)) for _ in range(count)]
+    results = {}
+    seconds, peak, _ = measure(lambda: [Number(max, rng=rng) for _ in range(count)])
+    results['number_random'] = {'ops': count, 'seconds': seconds, 'throughput': count / seconds, 'peak_bytes': peak}
+    seconds, peak, _ = measure(lambda: [Number(nums=n).reduce_fraction() for n in nums])
+    results['number_reduce'] = {'ops': count, 'seconds': seconds, 'throughput': count / seconds, 'peak_bytes': peak}
+    return results
+
+
+def bench_fractions(count=20000, max=10):
+    """Fraction.calculate_fractions 按运算符分别统计的吞吐量"""
+    rng = random.Random(1)
+    pairs = [(Number(max, rng=rng), Number(max, rng=rng)) for _ in range(count)]
+    pairs = [(a, b) for a, b in pairs if b != 0]
+    results = {}
+    for op in OPERATORS:
+        seconds, peak, _ = measure(lambda: [Fraction(a, b, op).calculate_fractions() for a, b in pairs])
+        results[f'fraction{op.strip()}'] = {'ops': len(pairs), 'seconds': seconds,
+                                           'throughput': len(pairs) / seconds, 'peak_bytes': peak}
+    return results
+
+
+def bench_generation(max_values, question_nums):
+    """在 max 与题目数量的网格上测试 generate_expressions 与 randomly_generate_questions"""
+    results = {}
+    for max in max_values:
+        for question_num in question_nums:
+            def generate():
+                exp = Expression(max, question_num, seed=0)
+                exp.generate_expressions()
+                return exp
+
+            seconds, peak, exp = measure(generate, repeat=1)
+            results[f'generate_expressions[max={max},n={question_num}]'] = {
+                'ops': question_num, 'seconds': seconds, 'throughput': question_num / seconds,
+                'peak_bytes': peak, 'generation_times': exp.generation_times,
+                'acceptance_rate': exp.acceptance_rate()}
+
+            def render():
+                exp.questions = []
+                exp.randomly_generate_questions()
+
+            seconds, peak, _ = measure(render, repeat=1)
+            results[f'randomly_generate_questions[max={max},n={question_num}]'] = {
+                'ops': question_num, 'seconds': seconds, 'throughput': question_num / seconds,
+                'peak_bytes': peak}
+    return results
+
+
+def bench_tables(max_values, question_num=20000):
+    """同一网格上分别不使用与使用结果表（tables=True）运行 Expression.run，比较吞吐量与峰值内存"""
+    results = {}
+    for max in max_values:
+        for tables in (False, True):
+            seconds, peak, _ = measure(lambda: Expression(max, question_num, seed=0, tables=tables).run(), repeat=1)
+            results[f'run[max={max},n={question_num},tables={tables}]'] = {
+                'ops': question_num, 'seconds': seconds, 'throughput': question_num / seconds, 'peak_bytes': peak}
+    return results
+
+
+def run_benchmarks(quick=False):
+    """运行所有基准测试，返回以基准名称为键的结果字典"""
+    results = {}
+    count = 2000 if quick else 20000
+    results.update(bench_numbers(count))
+    results.update(bench_fractions(count))
+    if quick:
+        results.update(bench_generation(QUICK_MAX_VALUES, QUICK_QUESTION_NUMS))
+        results.update(bench_tables(QUICK_MAX_VALUES, 1000))
+    else:
+        results.update(bench_generation(MAX_VALUES, QUESTION_NUMS))
+        results.update(bench_tables(TABLE_MAX_VALUES))
+    return results
+
+
+def compare(results, baseline, tolerance=0.3):
+    """
+    将结果与基线比较，返回退化项的说明列表
+    吞吐量低于基线 (1 - tolerance) 倍或峰值内存高于基线 (1 + tolerance) 倍视为退化
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐量 {current['throughput']:.0f}/s，基线 {base['throughput']:.0f}/s")
+        if current['peak_bytes'] > base['peak_bytes'] * (1 + tolerance):
+            regressions.append(f"{name}: 峰值内存 {current['peak_bytes']} B，基线 {base['peak_bytes']} B")
+    return regressions
+
+
+def print_results(results):
+    """以表格形式输出结果"""
+    for name, result in results.items():
+        line = f"{name:<55} {result['throughput']:>12.0f}/s {result['peak_bytes'] / 1024:>10.1f} KiB"
+        if 'acceptance_rate' in result:
+            line += f"  尝试 {result['generation_times']}  接受率 {result['acceptance_rate']:.3f}"
+        print(line)
+
+
+def main(argv=None, runner=run_benchmarks):
+    """
+    命令行入口
+    :param argv: 命令行参数，None 表示使用 sys.argv
+    :param runner: 以 quick 参数运行基准测试并返回结果字典的函数，测试时可替换为固定结果
+    """
+    parser = argparse.ArgumentParser(description="四则运算生成器性能基准测试")
+    parser.add_argument("--quick", action="store_true", help="只运行小规模网格")
+    parser.add_argument("--save", action="store_true", help="将结果保存为基线")
+    parser.add_argument("--check", action="store_true", help="与基线比较，退化时返回非零状态")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线 JSON 文件路径")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="允许的相对退化幅度")
+    args = parser.parse_args(argv)
+
+    results = runner(args.quick)
+    print_results(results)
+    if args.save:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"基线已保存到 {args.baseline}")
+    if args.check:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"退化: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
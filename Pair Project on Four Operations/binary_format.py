@@ -0,0 +1,206 @@
+# binary_format.py
+# 定长记录的二进制题目文件格式，支持内存映射与随机访问
+#
+# 文件由 32 字节的文件头和连续的定长记录组成，每条记录保存一道题目及其答案：
+#   shape         运算符数量
+#   tokens        后缀表达式编码，0 为操作数，1~4 依次为 + - * %，最高位表示该子表达式带括号，0xFF 为空位
+#   integer/numerator/denominator  按出现顺序保存的操作数（整数，分子，分母）
+#   answer_integer/answer_numerator/answer_denominator  答案（整数，分子，分母）
+# 由于记录定长，第 k 道题位于 32 + k * 记录长度 处，读取时无需解析前面的内容
+
+import struct
+from itertools import islice
+
+import numpy as np
+
+from function import Number, CustomMathError
+from export import write_question_files
+from grading import tokenize, parse_number
+
+MAGIC = b'EXB1'
+HEADER = struct.Struct('<4sIIQ12x')  # 魔数, 版本, 最大运算符数量, 题目数量
+VERSION = 1
+OPERATORS = ['+', '-', '*', '%']
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '%': 2}
+PAREN = 0x80  # 带括号标记
+EMPTY = 0xFF  # 空位
+
+
+def record_dtype(max_operators):
+    """返回最多包含 max_operators 个运算符的题目记录类型"""
+    operands = max_operators + 1
+    return np.dtype([
+        ('shape', np.uint8),
+        ('tokens', np.uint8, (2 * max_operators + 1,)),
+        ('integer', np.int32, (operands,)),
+        ('numerator', np.int32, (operands,)),
+        ('denominator', np.int32, (operands,)),
+        ('answer_integer', np.int64),
+        ('answer_numerator', np.int64),
+        ('answer_denominator', np.int64),
+    ])
+
+
+def encode_question(question):
+    """
+    将题目字符串编码为 (后缀表达式编码列表, 操作数列表)，括号信息一并保留
+    :param question: 题目字符串
+    """
+    tokens = []
+    operands = []
+    stack = []  # 运算符与左括号
+    for token in tokenize(question):
+        if token == '(':
+            stack.append(token)
+        elif token == ')':
+            while stack and stack[-1] != '(':
+                tokens.append(OPERATORS.index(stack.pop()) + 1)
+            if not stack or not tokens:
+                raise CustomMathError("括号不匹配。")
+            stack.pop()
+            tokens[-1] |= PAREN  # 后缀表达式的最后一项即括号内子表达式的根
+        elif isinstance(token, str):
+            while stack and stack[-1] != '(' and PRECEDENCE[stack[-1]] >= PRECEDENCE[token]:
+                tokens.append(OPERATORS.index(stack.pop()) + 1)
+            stack.append(token)
+        else:
+            tokens.append(0)
+            operands.append(token)
+    while stack:
+        if stack[-1] == '(':
+            raise CustomMathError("括号不匹配。")
+        tokens.append(OPERATORS.index(stack.pop()) + 1)
+    return tokens, operands
+
+
+def decode_question(tokens, integers, numerators, denominators):
+    """
+    将后缀表达式编码还原为题目字符串
+    :param tokens: 后缀表达式编码序列
+    """
+    stack = []
+    operand = 0
+    for code in tokens:
+        if code == EMPTY:
+            break
+        kind = code & ~PAREN
+        if kind == 0:
+            text = str(Number(nums=(integers[operand], numerators[operand], denominators[operand])))
+            operand += 1
+        else:
+            right = stack.pop()
+            left = stack.pop()
+            text = left + f" {OPERATORS[kind - 1]} " + right
+        if code & PAREN:
+            text = '(' + text + ')'
+        stack.append(text)
+    return stack[0]
+
+
+def format_answer(integer, numerator, denominator):
+    """将答案字段格式化为字符串"""
+    return Number.format(int(integer), int(numerator), int(denominator))
+
+
+def write_binary(pairs, path, max_operators=3, chunk_size=10000):
+    """
+    将 (问题, 答案) 对流式写入二进制题目文件
+    :param pairs: (问题, 答案) 对的可迭代对象
+    :param path: 文件路径
+    :param max_operators: 每道题最多包含的运算符数量，决定记录长度
+    :param chunk_size: 每次批量编码并写入的题目数量
+    :return: 写入的题目数量
+    """
+    dtype = record_dtype(max_operators)
+    pairs = iter(pairs)
+    count = 0
+    with open(path, "wb") as binary_file:
+        binary_file.write(HEADER.pack(MAGIC, VERSION, max_operators, 0))
+        while True:
+            chunk = list(islice(pairs, chunk_size))
+            if not chunk:
+                break
+            shapes, token_rows, integers, numerators, denominators, answers = [], [], [], [], [], []
+            for question, answer in chunk:
+                tokens, operands = encode_question(question)
+                padding = max_operators + 1 - len(operands)
+                if padding < 0:
+                    raise CustomMathError(f"题目包含的运算符超过{max_operators}个：{question}")
+                shapes.append(len(operands) - 1)
+                token_rows.append(tokens + [EMPTY] * (2 * padding))
+                integers.append([operand.integer for operand in operands] + [0] * padding)
+                numerators.append([operand.numerator for operand in operands] + [0] * padding)
+                denominators.append([operand.denominator for operand in operands] + [0] * padding)
+                answer = parse_number(answer)
+                answers.append((answer.integer, answer.numerator, answer.denominator))
+            records = np.zeros(len(chunk), dtype=dtype)
+            records['shape'] = shapes
+            records['tokens'] = token_rows
+            records['integer'] = integers
+            records['numerator'] = numerators
+            records['denominator'] = denominators
+            answers = np.array(answers, dtype=np.int64)
+            records['answer_integer'] = answers[:, 0]
+            records['answer_numerator'] = answers[:, 1]
+            records['answer_denominator'] = answers[:, 2]
+            binary_file.write(records.tobytes())
+            count += len(chunk)
+        # 写完后回填题目数量
+        binary_file.seek(0)
+        binary_file.write(HEADER.pack(MAGIC, VERSION, max_operators, count))
+    return count
+
+
+class ExerciseFile:
+    def __init__(self, path):
+        """
+        以内存映射方式打开二进制题目文件，按需解码，第 k 道题的读取为 O(1)
+        :param path: 文件路径
+        """
+        with open(path, "rb") as binary_file:
+            magic, version, max_operators, count = HEADER.unpack(binary_file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise CustomMathError(f"不是有效的二进制题目文件：{path}")
+        self.path = path
+        self.max_operators = max_operators
+        dtype = record_dtype(max_operators)
+        if count:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def question(self, k):
+        """返回第 k 道题（从0开始）的题目字符串"""
+        record = self.records[k]
+        return decode_question(record['tokens'].tolist(), record['integer'].tolist(),
+                               record['numerator'].tolist(), record['denominator'].tolist())
+
+    def answer(self, k):
+        """返回第 k 道题（从0开始）的答案字符串"""
+        record = self.records[k]
+        return format_answer(record['answer_integer'], record['answer_numerator'], record['answer_denominator'])
+
+    def __getitem__(self, k):
+        """返回第 k 道题的 (问题, 答案)；切片时返回零拷贝的记录视图"""
+        if isinstance(k, slice):
+            return self.records[k]
+        return self.question(k), self.answer(k)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+
+def text_to_binary(exercise_path, answer_path, binary_path, max_operators=3):
+    """将题目文件和答案文件转换为二进制题目文件，返回题目数量"""
+    with open(exercise_path) as question_file, open(answer_path) as answer_file:
+        pairs = ((q.rstrip("\n"), a.rstrip("\n")) for q, a in zip(question_file, answer_file) if q.strip())
+        return write_binary(pairs, binary_path, max_operators)
+
+
+def binary_to_text(binary_path, exercise_path, answer_path):
+    """将二进制题目文件转换为题目文件和答案文件，返回题目数量"""
+    return write_question_files(ExerciseFile(binary_path), exercise_path, answer_path)
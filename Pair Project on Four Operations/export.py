@@ -0,0 +1,139 @@
+# export.py
+# 题目与答案的导出功能
+# 除题目/答案文本文件外，还支持按列导出为 CSV、JSONL 和 Parquet（需要安装 pyarrow），
+# 每次只处理 chunk_size 行（Parquet 中即一个 row group），内存占用与题目总数无关
+
+import csv
+import json
+import os
+from itertools import islice
+
+from grading import parse_number
+
+COLUMNS = ['question', 'answer', 'operator_count', 'operators', 'answer_numerator', 'answer_denominator', 'seed']
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.parquet': 'parquet'}
+SEED_RANGE = range(-2 ** 63, 2 ** 63)  # seed 列为 64 位整数，所有格式都按此校验
+
+
+def tee_question_files(records, exercise_path="Exercises.txt", answer_path="Answer.txt", chunk_size=1000):
+    """
+    将记录中的问题和答案流式写入题目文件和答案文件，同时按原顺序产出记录，
+    这样写文本文件与按列导出可以在同一遍生成中完成
+    每次只缓存 chunk_size 条记录，写出后即释放，内存占用与题目总数无关
+    :param records: 以 (问题, 答案) 开头的元组的可迭代对象，例如 Expression.iter_records()
+    :param exercise_path: 题目文件路径
+    :param answer_path: 答案文件路径
+    :param chunk_size: 每次批量写入的行数
+    """
+    with open(exercise_path, "w") as question_file, open(answer_path, "w") as answer_file:
+        for chunk in _chunks(records, chunk_size):
+            question_file.write(''.join(f"{record[0]}\n" for record in chunk))
+            answer_file.write(''.join(f"{record[1]}\n" for record in chunk))
+            yield from chunk
+
+
+def write_question_files(pairs, exercise_path="Exercises.txt", answer_path="Answer.txt", chunk_size=1000):
+    """
+    将 (问题, 答案) 对流式写入题目文件和答案文件，见 tee_question_files
+    :param pairs: (问题, 答案) 对的可迭代对象，例如 Expression.iter_questions()
+    :return: 写入的题目数量
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size必须大于等于1。")
+    return sum(1 for _ in tee_question_files(pairs, exercise_path, answer_path, chunk_size))
+
+
+def read_question_files(exercise_path="Exercises.txt", answer_path="Answer.txt"):
+    """逐行读取题目文件和答案文件，生成 (问题, 答案) 对"""
+    with open(exercise_path) as question_file, open(answer_path) as answer_file:
+        for question, answer in zip(question_file, answer_file):
+            if question.strip():
+                yield question.rstrip("\n"), answer.rstrip("\n")
+
+
+def question_rows(records, seed=None):
+    """
+    将 (问题, 答案, 运算符列表) 转换为按列导出的行（字典），列见 COLUMNS
+    运算符由生成器按计算顺序给出，不再从题目文本中解析；答案保存为假分数的分子和分母
+    :param records: (问题, 答案, 运算符列表) 的可迭代对象，例如 Expression.iter_records()
+    :param seed: 生成题目时使用的随机种子
+    """
+    for question, answer, operators in records:
+        numerator, denominator = parse_number(answer).improper()
+        yield {'question': question, 'answer': answer, 'operator_count': len(operators), 'operators': operators,
+               'answer_numerator': numerator, 'answer_denominator': denominator, 'seed': seed}
+
+
+def _chunks(rows, chunk_size):
+    """将行按 chunk_size 分块"""
+    if chunk_size < 1:
+        raise ValueError("chunk_size必须大于等于1。")
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(rows, path, chunk_size=1000):
+    """按块写入 CSV 文件，operators 列以空格分隔，返回行数"""
+    count = 0
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for chunk in _chunks(rows, chunk_size):
+            writer.writerows(dict(row, operators=' '.join(row['operators'])) for row in chunk)
+            count += len(chunk)
+    return count
+
+
+def write_jsonl(rows, path, chunk_size=1000):
+    """按块写入 JSON Lines 文件，每行一个 JSON 对象，返回行数"""
+    count = 0
+    with open(path, "w") as jsonl_file:
+        for chunk in _chunks(rows, chunk_size):
+            jsonl_file.write(''.join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk))
+            count += len(chunk)
+    return count
+
+
+def write_parquet(rows, path, chunk_size=1000):
+    """按块写入 Parquet 文件，每块为一个 row group，需要安装 pyarrow，返回行数"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("导出 Parquet 文件需要安装 pyarrow。") from e
+    schema = pa.schema([('question', pa.string()), ('answer', pa.string()), ('operator_count', pa.int8()),
+                        ('operators', pa.list_(pa.string())), ('answer_numerator', pa.int64()),
+                        ('answer_denominator', pa.int64()), ('seed', pa.int64())])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(rows, chunk_size):
+            columns = {name: [row[name] for row in chunk] for name in COLUMNS}
+            writer.write_table(pa.table(columns, schema=schema))
+            count += len(chunk)
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+
+def export_questions(records, path, format=None, seed=None, chunk_size=1000):
+    """
+    将 (问题, 答案, 运算符列表) 按列流式导出
+    :param records: (问题, 答案, 运算符列表) 的可迭代对象，例如 Expression.iter_records()
+    :param path: 导出文件路径
+    :param format: 'csv'、'jsonl' 或 'parquet'，None 表示根据扩展名判断
+    :param seed: 生成题目时使用的随机种子，写入 seed 列；必须是 None 或 64 位整数，各格式一致
+    :param chunk_size: 每次批量写入的行数
+    :return: 写入的行数
+    """
+    if format is None:
+        format = FORMATS.get(os.path.splitext(path)[1].lower())
+    if format not in WRITERS:
+        raise ValueError(f"不支持的导出格式：{format or path}，可选 csv、jsonl、parquet。")
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed not in SEED_RANGE):
+        raise ValueError(f"seed必须是64位整数：{seed!r}")
+    return WRITERS[format](question_rows(records, seed), path, chunk_size)
@@ -1,21 +1,50 @@
 # function.py
 # 定义数学相关功能的文件
 
+import hashlib
+import json
 import random
 import math
+import time
+from collections import namedtuple, OrderedDict
+from functools import total_ordering, lru_cache
+
+GENERATOR_VERSION = 1  # 生成算法版本，生成结果改变时递增，用于使题库等缓存失效
 
 
 class CustomMathError(Exception):
     """自定义数学错误类，用于处理特定的数学相关异常"""
-    pass
+    NEGATIVE = 'negative'  # 子表达式或结果为负数
+    ZERO_DIVISOR = 'zero_divisor'  # 除数为零
+    INVALID = 'invalid'  # 其他错误
+
+    def __init__(self, message, reason=INVALID):
+        """
+        :param message: 错误信息
+        :param reason: 错误原因，用于统计表达式被拒绝的原因
+        """
+        super().__init__(message)
+        self.reason = reason
 
 
+@total_ordering
 class Number:
-    def __init__(self, max: int = None, nums: tuple = None):
+    """
+    不可变的带分数，始终以最简形式保存（整数，分子，分母），且 0 <= 分子 < 分母
+    相同数值的对象会被驻留复用，共享同一份缓存的字符串表示
+    同时保存假分数形式的分子，连续运算时无需反复由带分数换算
+    """
+    __slots__ = ('integer', 'numerator', 'denominator', '_improper', '_str')
+
+    _interned = {}  # 已驻留的对象，键为（整数，分子，分母）
+    INTERN_LIMIT = 1 << 16  # 驻留对象数量上限，超过后新对象不再驻留
+
+    def __new__(cls, max: int = None, nums: tuple = None, rng=None):
         """
-        初始化一个Number对象
+        创建一个Number对象
         :param max: 随机生成数字时的最大值
         :param nums: 用于直接指定数字的组成部分（整数，分子，分母）
+        :param rng: 随机数生成器，默认使用全局的 random 模块
         """
         try:
             if nums:
@@ -23,63 +52,192 @@ class Number:
                 if isinstance(nums, tuple) and len(nums) == 3:
                     if nums[2] == 0:
                         raise ValueError("分母不能为零。")
-                    else:
-                        self.integer = int(nums[0])  # 整数部分
-                        self.numerator = int(nums[1])  # 分子
-                        self.denominator = int(nums[2])  # 分母
+                    integer, numerator, denominator = int(nums[0]), int(nums[1]), int(nums[2])
                 else:
                     raise ValueError("nums必须是一个三元组（整数，分子，分母）。")
             else:
                 # 如果没有提供nums，则随机生成一个数字
                 if (not isinstance(max, int)) or max < 1:
                     raise ValueError("max必须大于等于1。")
-                self.integer = random.randint(0, max - 1)  # 随机生成整数部分
-                self.denominator = random.randint(1, max - 1)  # 随机生成分母
-                is_fra = random.randint(1, 2)  # 随机决定是否生成分数部分
+                if rng is None:
+                    rng = random
+                integer = rng.randint(0, max - 1)  # 随机生成整数部分
+                denominator = rng.randint(1, max - 1)  # 随机生成分母
+                is_fra = rng.randint(1, 2)  # 随机决定是否生成分数部分
                 if is_fra == 1:
-                    self.numerator = random.randint(1, self.denominator)  # 生成分子
+                    numerator = rng.randint(1, denominator)  # 生成分子
                 else:
-                    self.numerator = 0  # 不生成分数部分
-                    # 计算生成的数值
-                generated_value = self.integer + self.numerator / self.denominator
+                    numerator = 0  # 不生成分数部分
                 # 如果生成的值大于等于 max，调整整数部分使其小于 max
-                if generated_value >= max:
-                    adjustment = int(generated_value // max)
-                    self.integer -= adjustment
+                improper = integer * denominator + numerator
+                if improper >= max * denominator:
+                    integer -= improper // (max * denominator)
         except ValueError as e:
             raise CustomMathError(str(e))
+        return cls._make(integer, numerator, denominator)
+
+    @classmethod
+    def _make(cls, integer, numerator, denominator):
+        """化简（整数，分子，分母）并返回对应的驻留对象"""
+        if denominator < 0:
+            numerator, denominator = -numerator, -denominator
+        # 约分，并将假分数转化为带分数
+        gcd = math.gcd(numerator, denominator)
+        if gcd != 1:
+            numerator //= gcd
+            denominator //= gcd
+        if numerator >= denominator or numerator < 0:
+            integer += numerator // denominator
+            numerator %= denominator
+        return cls._intern(integer, numerator, denominator)
+
+    @classmethod
+    def from_improper(cls, numerator, denominator):
+        """
+        由最简假分数（分子，分母）创建Number对象，分母必须为正数，不再约分
+        用于 rational_* 运算函数的结果
+        """
+        integer, numerator = divmod(numerator, denominator)
+        return cls._intern(integer, numerator, denominator)
+
+    @classmethod
+    def _intern(cls, integer, numerator, denominator):
+        """返回最简形式（整数，分子，分母）对应的驻留对象"""
+        key = (integer, numerator, denominator)
+        number = cls._interned.get(key)
+        if number is None:
+            number = object.__new__(cls)
+            object.__setattr__(number, 'integer', integer)  # 整数部分
+            object.__setattr__(number, 'numerator', numerator)  # 分子
+            object.__setattr__(number, 'denominator', denominator)  # 分母
+            object.__setattr__(number, '_improper', integer * denominator + numerator)  # 假分数的分子
+            object.__setattr__(number, '_str', None)
+            if len(cls._interned) < cls.INTERN_LIMIT:
+                cls._interned[key] = number
+        return number
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Number对象不可修改。")
+
+    def __delattr__(self, name):
+        raise AttributeError("Number对象不可修改。")
+
+    def __reduce__(self):
+        """支持pickle和copy，重建时同样经过驻留"""
+        return Number, (None, (self.integer, self.numerator, self.denominator))
 
     def reduce_fraction(self):
-        """简化分数"""
-        # 计算最大公约数
-        gcd = math.gcd(self.numerator, self.denominator)
-        numerator = self.numerator // gcd
-        denominator = self.denominator // gcd
-        # 处理假分数，将其转化为带分数
-        integer = numerator // denominator + self.integer
-        numerator = numerator % denominator
-        self.integer = int(integer)
-        self.numerator = int(numerator)
-        self.denominator = int(denominator)
+        """简化分数；Number始终为最简形式，保留此方法以兼容旧代码"""
+        return self
 
-    def __str__(self):
-        """将Number对象转换为字符串表示"""
-        if self.integer == 0:
-            if self.numerator:
-                return f"{self.numerator}/{self.denominator}"
+    def improper(self):
+        """返回假分数形式（分子，分母）"""
+        return self._improper, self.denominator
+
+    def _as_improper(self, other):
+        """将比较对象转换为假分数形式，不支持的类型返回None"""
+        if isinstance(other, Number):
+            return other.improper()
+        if isinstance(other, int):
+            return other, 1
+        return None
+
+    def __eq__(self, other):
+        if isinstance(other, Number):
+            return (self.integer == other.integer and self.numerator == other.numerator
+                    and self.denominator == other.denominator)
+        if isinstance(other, int):
+            return self.numerator == 0 and self.integer == other
+        return NotImplemented
+
+    def __lt__(self, other):
+        other = self._as_improper(other)
+        if other is None:
+            return NotImplemented
+        # 分母均为正数，交叉相乘后精确比较
+        return self._improper * other[1] < other[0] * self.denominator
+
+    def __hash__(self):
+        if self.numerator == 0:
+            return hash(self.integer)
+        return hash((self.integer, self.numerator, self.denominator))
+
+    def __repr__(self):
+        return f"Number(nums=({self.integer}, {self.numerator}, {self.denominator}))"
+
+    @staticmethod
+    def format(integer, numerator, denominator):
+        """将最简形式的（整数，分子，分母）格式化为字符串"""
+        if integer == 0:
+            if numerator:
+                return f"{numerator}/{denominator}"
             else:
                 return '0'
         else:
-            if self.numerator:
-                return f"{self.integer}'{self.numerator}/{self.denominator}"
+            if numerator:
+                return f"{integer}'{numerator}/{denominator}"
             else:
-                return str(self.integer)
+                return str(integer)
+
+    def __str__(self):
+        """将Number对象转换为字符串表示"""
+        if self._str is None:
+            object.__setattr__(self, '_str', Number.format(self.integer, self.numerator, self.denominator))
+        return self._str
 
     def __float__(self):
         """将Number对象转换为浮点数"""
         return self.integer + self.numerator / self.denominator
 
 
+def rational_add(n1, d1, n2, d2):
+    """
+    最简假分数相加，返回最简假分数 (分子, 分母)
+    先以分母的最大公约数约去公因子，中间结果不超过最终结果所需的大小
+    """
+    if d1 == d2 == 1:
+        return n1 + n2, 1
+    g = math.gcd(d1, d2)
+    if g == 1:
+        return n1 * d2 + n2 * d1, d1 * d2  # 分母互素时结果已是最简形式
+    t = n1 * (d2 // g) + n2 * (d1 // g)
+    g2 = math.gcd(t, g)
+    return t // g2, (d1 // g) * (d2 // g2)
+
+
+def rational_sub(n1, d1, n2, d2):
+    """最简假分数相减，返回最简假分数 (分子, 分母)"""
+    return rational_add(n1, d1, -n2, d2)
+
+
+def rational_mul(n1, d1, n2, d2):
+    """
+    最简假分数相乘，返回最简假分数 (分子, 分母)
+    相乘前交叉约分，结果无需再约分
+    """
+    if d1 == d2 == 1:
+        return n1 * n2, 1
+    if n1 == 0 or n2 == 0:
+        return 0, 1
+    g1 = math.gcd(n1, d2)
+    g2 = math.gcd(n2, d1)
+    return (n1 // g1) * (n2 // g2), (d1 // g2) * (d2 // g1)
+
+
+def rational_div(n1, d1, n2, d2):
+    """最简假分数相除，返回最简假分数 (分子, 分母)；除数为零时抛出 CustomMathError"""
+    if n2 == 0:
+        raise CustomMathError("除数不能为零。", CustomMathError.ZERO_DIVISOR)
+    if n2 < 0:
+        n2, d2 = -n2, -d2
+    if d1 == d2 == 1 and n1 % n2 == 0:
+        return n1 // n2, 1
+    return rational_mul(n1, d1, d2, n2)
+
+
+RATIONAL_OPERATIONS = {' + ': rational_add, ' - ': rational_sub, ' * ': rational_mul, ' % ': rational_div}
+
+
 class Fraction:
     def __init__(self, f1: Number, f2: Number, op: str):
         """
@@ -93,61 +251,512 @@ class Fraction:
             self.f2 = f2
         else:
             raise CustomMathError("参数必须是Number类型。")
-        if op in [' + ', ' - ', ' * ', ' % ']:
+        if op in RATIONAL_OPERATIONS:
             self.op = op
         else:
             raise CustomMathError("操作符必须是' + ', ' - ', ' * ', 或 ' % '之一。")
 
     def calculate_fractions(self):
-        """执行分数计算"""
-        try:
-            if self.op == ' + ':
-                # 加法运算
-                denominator = self.f1.denominator * self.f2.denominator
-                numerator = (self.f1.integer * self.f1.denominator + self.f1.numerator) * self.f2.denominator \
-                            + (self.f2.integer * self.f2.denominator + self.f2.numerator) * self.f1.denominator
-                result = Number(nums=(0, numerator, denominator))
-            elif self.op == ' - ':
-                # 减法运算
-                denominator = self.f1.denominator * self.f2.denominator
-                numerator = (self.f1.integer * self.f1.denominator + self.f1.numerator) * self.f2.denominator \
-                            - (self.f2.integer * self.f2.denominator + self.f2.numerator) * self.f1.denominator
-                result = Number(nums=(0, numerator, denominator))
-            elif self.op == ' * ':
-                # 乘法运算
-                denominator = self.f1.denominator * self.f2.denominator
-                numerator = (self.f1.numerator + self.f1.integer * self.f1.denominator) \
-                            * (self.f2.numerator + self.f2.integer * self.f2.denominator)
-                result = Number(nums=(0, numerator, denominator))
-            elif self.op == ' % ':
-                # 除法运算
-                if float(self.f2) == 0:
-                    raise CustomMathError("除数不能为零。")
-                denominator = self.f1.denominator * (self.f2.numerator + self.f2.integer * self.f2.denominator)
-                numerator = (self.f1.numerator + self.f1.integer * self.f1.denominator) * self.f2.denominator
-                result = Number(nums=(0, numerator, denominator))
-
-            result.reduce_fraction()  # 简化结果
+        """执行分数计算，全程使用整数精确运算"""
+        f1, f2 = self.f1, self.f2
+        numerator, denominator = RATIONAL_OPERATIONS[self.op](f1._improper, f1.denominator,
+                                                               f2._improper, f2.denominator)
+        return Number.from_improper(numerator, denominator)  # 运算结果已是最简形式
+
+
+class CalculationCache:
+    """Fraction.calculate_fractions 的 LRU 缓存，以 (左操作数, 右操作数, 运算符) 为键"""
+
+    def __init__(self, max_size=4096):
+        """
+        :param max_size: 最多缓存的计算结果数量，超过时淘汰最久未使用的结果
+        """
+        if max_size < 1:
+            raise CustomMathError("缓存大小必须大于等于1。")
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0  # 命中次数
+        self.misses = 0  # 未命中次数
+        self.evictions = 0  # 淘汰次数
+
+    def __len__(self):
+        return len(self.entries)
+
+    def calculate(self, f1, f2, op):
+        """计算 f1 op f2，结果已缓存时直接返回；计算出错时不缓存"""
+        key = (f1, f2, op)
+        result = self.entries.get(key)
+        if result is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
             return result
-        except OverflowError:
-            raise CustomMathError("计算结果超出可表示范围")
+        self.misses += 1
+        result = self.entries[key] = Fraction(f1, f2, op).calculate_fractions()
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def clear(self):
+        """清空缓存和计数"""
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def to_dict(self):
+        """导出缓存统计"""
+        total = self.hits + self.misses
+        return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / total if total else 0.0}
+
+
+class GenerationStats:
+    """表达式生成过程的分阶段计时、拒绝原因计数和按运算符数量的直方图"""
+    PHASES = ('generate_expression_list', 'calculate_answer', 'randomly_generate_questions')
+    DUPLICATE = 'duplicate'  # 与已生成的表达式重复
+    FILTERED = 'filtered'  # 不满足配额对答案的要求
+    SEEN = 'seen'  # 在之前的会话中出过
+
+    def __init__(self, callback=None):
+        """
+        :param callback: 生成结束时以 to_dict() 的结果调用的回调函数
+        """
+        self.callback = callback
+        self.timers = {phase: 0.0 for phase in self.PHASES}  # 各阶段累计耗时（秒）
+        self.calls = {phase: 0 for phase in self.PHASES}  # 各阶段调用次数
+        self.rejections = {}  # 拒绝原因到次数
+        self.accepted = {}  # 运算符数量到接受次数
+        self.rejected = {}  # 运算符数量到拒绝次数，未知数量记为 0
+
+    def add_time(self, phase, seconds, calls=1):
+        """累计一个阶段的耗时"""
+        self.timers[phase] += seconds
+        self.calls[phase] += calls
+
+    def accept(self, operator_count):
+        """记录一个被接受的表达式"""
+        self.accepted[operator_count] = self.accepted.get(operator_count, 0) + 1
+
+    def reject(self, reason, operator_count=0):
+        """记录一个被拒绝的表达式及其原因"""
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        self.rejected[operator_count] = self.rejected.get(operator_count, 0) + 1
+
+    def to_dict(self):
+        """导出为可序列化为 JSON 的字典"""
+        return {
+            'timers': dict(self.timers),
+            'calls': dict(self.calls),
+            'rejections': dict(self.rejections),
+            'accepted_by_operators': {str(k): v for k, v in sorted(self.accepted.items())},
+            'rejected_by_operators': {str(k): v for k, v in sorted(self.rejected.items())},
+        }
+
+    def to_json(self, **kwargs):
+        """导出为 JSON 字符串"""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def report(self):
+        """生成结束时调用回调函数"""
+        if self.callback is not None:
+            self.callback(self.to_dict())
+
+
+OPERATORS = [' + ', ' - ', ' * ', ' % ']
+PRECEDENCE = {' + ': 1, ' - ': 1, ' * ': 2, ' % ': 2}
+
+# 表达式树的运算节点，叶子为 Number 对象；与 (运算符, 左子树, 右子树) 元组兼容
+ExpressionNode = namedtuple('ExpressionNode', ['op', 'left', 'right'])
+
+
+def leaf(number):
+    """
+    返回数字叶子的分析结果
+    分析结果为 (子树, 值, 键, 文本, 文本顶层连续运算所用的唯一运算符)，
+    最后一项在顶层混用了同优先级的不同运算符或为数字时为 None；
+    组合过程中键和文本保持嵌套元组形式，由 finish 在根上一次展开
+    """
+    return number, number, ('n', number.integer, number.numerator, number.denominator), str(number), None
+
+
+def precedence(tree):
+    """返回子树根的优先级，数字最高"""
+    return PRECEDENCE[tree.op] if isinstance(tree, ExpressionNode) else 3
+
+
+def combine(op, left, right, calculate=None):
+    """
+    由两个子树的分析结果组合出新节点的分析结果，计算、非负检查、键和文本片段一次完成
+    :param op: 运算符
+    :param left: 左子树的分析结果
+    :param right: 右子树的分析结果
+    :param calculate: 计算 calculate(f1, f2, op) 的函数，None 表示使用 Fraction
+    """
+    node_l, value_l, key_l, text_l, chain_l = left
+    node_r, value_r, key_r, text_r, chain_r = right
+    if calculate is None:
+        value = Fraction(value_l, value_r, op).calculate_fractions()
+    else:
+        value = calculate(value_l, value_r, op)
+    if value < 0:
+        raise CustomMathError("子表达式不能小于零。", CustomMathError.NEGATIVE)
+    # 子树的键和文本原样嵌套，不在每一步展开或拼接，整条链的代价保持线性
+    key = op, key_l, key_r
+    # 左子树优先级低时加括号；右子树优先级相同时，只有顶层全是同一个可交换运算符才能省略括号
+    prec, prec_l, prec_r = PRECEDENCE[op], precedence(node_l), precedence(node_r)
+    if prec_l < prec:
+        text_l = '(', text_l, ')'
+    if prec_r < prec or (prec_r == prec and (op in [' - ', ' % '] or chain_r != op)):
+        text_r = '(', text_r, ')'
+    chain = op if prec_l != prec or chain_l == op else None
+    return ExpressionNode(op, node_l, node_r), value, key, (text_l, op, text_r), chain
+
+
+def canonical(key):
+    """
+    将 combine 得到的嵌套键转换为规范化键，与 Expression.canonical_key 的结果一致
+    ' + ' 与 ' * ' 的结合链只在这里展开一次并对操作数排序
+    :param key: combine 或 leaf 得到的键
+    """
+    if key[0] == 'n':
+        return key
+    op, left, right = key
+    if op not in [' + ', ' * ']:
+        return op, canonical(left), canonical(right)
+    operands = []
+    stack = [left, right]
+    while stack:
+        child = stack.pop()
+        if child[0] == op:
+            stack.append(child[1])
+            stack.append(child[2])
+        else:
+            operands.append(canonical(child))
+    return op, tuple(sorted(operands))
+
+
+def render(text):
+    """
+    将 combine 得到的嵌套文本片段按顺序展开，最后只拼接一次
+    :param text: 字符串或由字符串与嵌套元组组成的元组
+    """
+    parts = []
+    stack = [text]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        else:
+            stack.extend(reversed(item))
+    return ''.join(parts)
+
+
+def finish(analysis):
+    """
+    在根节点上完成分析结果：展开规范化键、拼接文本
+    :param analysis: leaf 或 combine 的结果
+    """
+    node, value, key, text, chain = analysis
+    return node, value, canonical(key), render(text), chain
+
+
+def analyze(tree):
+    """
+    一次遍历表达式树，返回 (树, 值, 规范化键, 最少括号的文本, 顶层运算符)
+    子表达式为负数或除数为零时抛出 CustomMathError
+    :param tree: 表达式树，节点为 ExpressionNode 或 (运算符, 左子树, 右子树)，叶子为 Number 对象
+    """
+    def walk(subtree):
+        if isinstance(subtree, Number):
+            return leaf(subtree)
+        op, left, right = subtree
+        return combine(op, walk(left), walk(right))
+
+    return finish(walk(tree))
+
+
+def key_digest(key):
+    """
+    返回规范化键的 64 位摘要，判重集合只保存摘要而不是嵌套元组
+    每道题在集合中约占 60 字节（int 对象与集合槽位），1000 万道题约 600 MB；
+    摘要与进程无关，可以跨进程比较，1000 万道题内出现碰撞的概率约为百万分之三
+    :param key: canonical_key 或 finish 得到的规范化键
+    """
+    return int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), 'little')
+
+
+def count_operators(expression):
+    """返回表达式树或表达式列表中的运算符数量"""
+    if isinstance(expression, ExpressionNode):
+        return 1 + count_operators(expression.left) + count_operators(expression.right)
+    if isinstance(expression, Number):
+        return 0
+    return len(expression)
+
+
+def expression_operators(expression):
+    """返回表达式树或表达式列表中的运算符符号（不含两侧空格），按计算顺序排列"""
+    if isinstance(expression, ExpressionNode):
+        operators = expression_operators(expression.left)
+        operators.extend(expression_operators(expression.right))
+        operators.append(expression.op.strip())
+        return operators
+    if isinstance(expression, Number):
+        return []
+    # 每个子表达式恰有一个运算符：二元 [数, 运算符, 数]、一元 [运算符, 数] 或 [数, 运算符]、连接 [运算符]
+    return [next(item for item in sub if isinstance(item, str)).strip() for sub in expression]
+
+
+OPERAND_COUNT_LIMIT = 10000  # max 超过此值时不再精确计算操作数数量，改用上界
+
+
+def count_operands(max):
+    """
+    返回 Number(max) 可能生成的不同操作数数量，即 [0, max) 内分母不超过 max-1 的最简分数个数：
+    max × (φ(1) + ... + φ(max-1))，max 超过 OPERAND_COUNT_LIMIT 时返回上界 max × max(max-1)/2
+    :param max: 生成数字的最大值，小于2时无法生成任何数字
+    """
+    if not isinstance(max, int) or max < 2:
+        return 0
+    if max > OPERAND_COUNT_LIMIT:
+        return max * (max * (max - 1) // 2)
+    phi = list(range(max))  # 欧拉函数筛法
+    for p in range(2, max):
+        if phi[p] == p:
+            for multiple in range(p, max, p):
+                phi[multiple] -= phi[multiple] // p
+    return max * sum(phi[1:])
+
+
+EXACT_CAPACITY_PAIRS = 50000  # 精确枚举时组合的子表达式对总数上限，超过后改用递推的上界
+
+
+@lru_cache(maxsize=32)
+def exact_capacity(max, operator_count):
+    """
+    按运算符数量逐层枚举所有合法的不同表达式（子表达式非负、除数非零，按规范化键去重），
+    返回各层的 (总数, 含除法的数量, 答案为分数的数量, 含除法且答案为分数的数量) 列表，第 k 项对应 k 个运算符；
+    组合的子表达式对超过 EXACT_CAPACITY_PAIRS 时停止枚举，列表短于 operator_count + 1
+    :param max: 生成数字的最大值
+    :param operator_count: 最多枚举的运算符数量
+    """
+    if count_operands(max) ** 2 > EXACT_CAPACITY_PAIRS:
+        return [(count_operands(max), 0, count_operands(max) - max, 0)]
+    # 每层只保存 规范化键 -> (假分数分子, 分母, 是否含除法)
+    operands = {}
+    for denominator in range(1, max):
+        for numerator in range(denominator):
+            if math.gcd(numerator, denominator) == 1:
+                for integer in range(max):
+                    operands[('n', integer * denominator + numerator, denominator)] = (
+                        integer * denominator + numerator, denominator, False)
+    levels = [operands]
+    counts = [(len(operands), 0, sum(d != 1 for _, d, _ in operands.values()), 0)]
+    pairs = 0
+    for count in range(1, operator_count + 1):
+        pairs += sum(len(levels[i]) * len(levels[count - 1 - i]) for i in range(count))
+        if pairs > EXACT_CAPACITY_PAIRS:
+            break
+        level = {}
+        for i in range(count):
+            for key_l, (n1, d1, div_l) in levels[i].items():
+                for key_r, (n2, d2, div_r) in levels[count - 1 - i].items():
+                    for op in OPERATORS:
+                        if op == ' - ' and n1 * d2 < n2 * d1 or op == ' % ' and n2 == 0:
+                            continue
+                        if op in [' + ', ' * ']:
+                            # 与 canonical 相同：展开同一运算符的结合链并排序
+                            parts = (key_l[1] if key_l[0] == op else (key_l,)) + \
+                                    (key_r[1] if key_r[0] == op else (key_r,))
+                            key = op, tuple(sorted(parts))
+                        else:
+                            key = op, key_l, key_r
+                        level[key] = RATIONAL_OPERATIONS[op](n1, d1, n2, d2) + (div_l or div_r or op == ' % ',)
+        levels.append(level)
+        division = [d for _, d, div in level.values() if div]
+        counts.append((len(level), len(division), sum(d != 1 for _, d, _ in level.values()),
+                       sum(d != 1 for d in division)))
+    return counts
+
+
+def estimate_capacity(max, operator_count, division=False, fractional_only=False):
+    """
+    估计恰含 operator_count 个运算符的不同表达式数量
+    数量较小时由 exact_capacity 精确枚举；否则按运算符数量递推上界：
+    ' + '、' * ' 的左右子树无序，' - ' 只取大数在前的一种顺序，因此只计无序的子树对，' % ' 计有序的子树对
+    :param max: 生成数字的最大值
+    :param operator_count: 运算符数量
+    :param division: 是否必须含除法
+    :param fractional_only: 是否只保留答案为分数的题目；上界只在 max 小于3时考虑此项：此时操作数都是整数，
+                            答案只能由至少两个运算符且含除法的表达式得到分数
+    """
+    if not isinstance(max, int) or max < 2:
+        return 0
+    if max <= OPERAND_COUNT_LIMIT:
+        counts = exact_capacity(max, operator_count if operator_count > 3 else 3)  # 默认的1~3个运算符只需枚举一次
+        if len(counts) > operator_count:
+            return counts[operator_count][2 * fractional_only + division]
+    if fractional_only and max < 3:
+        if operator_count < 2:
+            return 0
+        division = True
+    totals = [count_operands(max)]  # 各运算符数量的表达式数量上界
+    plain = [totals[0]]  # 不含除法的表达式数量上界
+    for count in range(1, operator_count + 1):
+        ordered = sum(totals[i] * totals[count - 1 - i] for i in range(count))
+        ordered_plain = sum(plain[i] * plain[count - 1 - i] for i in range(count))
+        # 左右子树属于同一层时，相同的子树只能组成一个无序对
+        diagonal = totals[(count - 1) // 2] if count % 2 else 0
+        diagonal_plain = plain[(count - 1) // 2] if count % 2 else 0
+        plain.append(3 * (ordered_plain + diagonal_plain) // 2)
+        totals.append(plain[-1] + ordered + 3 * (ordered - ordered_plain + diagonal - diagonal_plain) // 2)
+    return totals[-1] - plain[-1] if division else totals[-1]
+
+
+class AcceptanceWindow:
+    """按固定的尝试次数窗口统计最近的接受率，接受率相对此前的最高值骤降时，视为不同的题目已基本耗尽"""
+    SIZE = 1000  # 每个窗口的尝试次数
+    DROP = 0.05  # 窗口接受率低于此前最高接受率的这个比例（或为零）时停止
+
+    def __init__(self):
+        self.attempts = 0  # 当前窗口开始时的累计尝试次数
+        self.accepted = 0  # 当前窗口开始时的累计接受数量
+        self.best = 0.0  # 此前各窗口的最高接受率
+
+    def exhausted(self, attempts, accepted):
+        """
+        每满一个窗口计算一次接受率，返回是否应当停止生成
+        :param attempts: 累计尝试次数
+        :param accepted: 累计接受数量
+        """
+        if attempts - self.attempts < self.SIZE:
+            return False
+        rate = (accepted - self.accepted) / (attempts - self.attempts)
+        self.attempts, self.accepted = attempts, accepted
+        self.best = max(self.best, rate)
+        return rate == 0 or rate < self.best * self.DROP
+
+
+class Quotas:
+    def __init__(self, operators=None, division=0.0, fractional_only=False):
+        """
+        分层生成的配额
+        :param operators: 运算符数量到题目比例的字典，例如 {1: 0.3, 2: 0.4, 3: 0.3}，比例之和为1；
+                          None 表示各运算符数量均分
+        :param division: 含除法的题目至少占的比例
+        :param fractional_only: 是否只保留答案为分数（非整数）的题目
+        """
+        if operators is not None:
+            if any(count < 1 or share < 0 for count, share in operators.items()):
+                raise CustomMathError("运算符数量必须大于等于1，比例不能为负数。")
+            if abs(sum(operators.values()) - 1) > 1e-9:
+                raise CustomMathError("各运算符数量的比例之和必须为1。")
+        if not 0 <= division <= 1:
+            raise CustomMathError("含除法题目的比例必须在0到1之间。")
+        self.operators = operators
+        self.division = division
+        self.fractional_only = fractional_only
+
+    @staticmethod
+    def apportion(total, weights):
+        """按最大余数法把 total 分配给各项，返回与 weights 顺序一致的整数列表"""
+        weight_sum = sum(weights)
+        if weight_sum == 0:
+            return [0] * len(weights)
+        exact = [total * weight / weight_sum for weight in weights]
+        counts = [int(value) for value in exact]
+        order = sorted(range(len(weights)), key=lambda i: exact[i] - counts[i], reverse=True)
+        for i in order[:total - sum(counts)]:
+            counts[i] += 1
+        return counts
+
+    def plan(self, question_num, max_operators=3):
+        """
+        把题目数量分配到各层，返回 {(运算符数量, 是否必须含除法): 题目数量}
+        含除法的题目按各运算符数量的题目数量成比例分配
+        :param question_num: 题目数量
+        :param max_operators: 生成器支持的最大运算符数量
+        """
+        shares = self.operators or {k: 1 / max_operators for k in range(1, max_operators + 1)}
+        if max(shares) > max_operators:
+            raise CustomMathError(f"运算符数量不能超过{max_operators}。")
+        operator_counts = sorted(shares)
+        totals = self.apportion(question_num, [shares[k] for k in operator_counts])
+        divisions = self.apportion(math.ceil(self.division * question_num - 1e-9), totals)
+        plan = {}
+        for count, total, division in zip(operator_counts, totals, divisions):
+            if division:
+                plan[(count, True)] = division
+            if total > division:
+                plan[(count, False)] = total - division
+        return plan
+
+    def accepts(self, answer):
+        """答案是否满足配额要求"""
+        return not self.fractional_only or answer.numerator != 0
 
 
 class Expression:
-    def __init__(self, max, question_num):
+    COMPLETE = 'complete'  # 生成了全部题目
+    INFEASIBLE = 'infeasible'  # 容量估计或接受率表明不可能生成足够的不同题目，只生成了能生成的部分
+    ATTEMPT_LIMIT = 'attempt_limit'  # 尝试次数达到上限，只生成了部分题目
+    TIME_LIMIT = 'time_limit'  # 生成时间达到上限，只生成了部分题目
+    STATUS_MESSAGES = {
+        COMPLETE: "生成完成",
+        INFEASIBLE: "参数允许的不同题目数量不足",
+        ATTEMPT_LIMIT: "尝试次数达到上限",
+        TIME_LIMIT: "生成时间达到上限",
+    }
+    ATTEMPTS_PER_QUESTION = 100  # 未指定尝试次数上限时，每道题平均允许的尝试次数
+
+    def __init__(self, max, question_num, constructive=False, seed=None, max_operators=None, quotas=None,
+                 tables=False, cache_size=0, seen=None, max_attempts=None, time_limit=None):
         """
         初始化一个Expression对象
         :param max: 生成数字的最大值
         :param question_num: 要生成的问题数量
+        :param constructive: 是否按约束直接构造合法表达式，而不是生成后再校验丢弃
+        :param seed: 随机种子；指定后使用独立的随机数生成器，结果可复现
+        :param max_operators: 指定后使用表达式树生成任意形状、1~max_operators 个运算符的题目，
+                              不指定时使用最多3个运算符的表达式列表
+        :param quotas: Quotas 对象，指定后按配额分层生成，每层直接按其运算符数量和运算符抽样
+        :param tables: 是否使用预先计算的操作数与运算结果表（见 tables.py），max 不超过 TABLE_MAX 时有效；
+                       抽样方式不同，相同种子得到的题目与不使用时不同
+        :param cache_size: 计算结果 LRU 缓存的大小，0 或 None 表示不使用缓存，见 enable_cache
+        :param seen: 记录之前会话已出过题目的 SeenFilter 对象，出过的题目不再生成，新题目会加入其中
+        :param max_attempts: 生成候选表达式的总次数上限，None 表示每道题平均 ATTEMPTS_PER_QUESTION 次
+        :param time_limit: 生成时间上限（秒），None 表示不限制
+        达到上限或容量不足时提前停止并保留已生成的题目，原因见 status
         """
+        if max_operators is not None and max_operators < 1:
+            raise CustomMathError("max_operators必须大于等于1。")
         self.max = max
         self.question_num = question_num
-        self.expressions = set()  # 用于存储生成的表达式字符串，确保不重复
+        self.constructive = constructive
+        self.seed = seed
+        self.max_operators = max_operators
+        self.quotas = quotas
+        self.remaining = None  # 各层尚未生成的题目数量，见 next_stratum
+        self.table = None  # 运算结果表
+        if tables:
+            from tables import get_table, TABLE_MAX
+            if isinstance(max, int) and 2 <= max <= TABLE_MAX:
+                self.table = get_table(max)
+        self.cache = CalculationCache(cache_size) if cache_size else None  # 计算结果缓存
+        self.seen = seen
+        self.rng = random.Random(seed) if seed is not None else random
+        self.stats = None  # 生成过程统计，默认关闭，见 enable_instrumentation
+        self.expressions = set()  # 已生成表达式规范化键的摘要（见 key_digest），确保不重复
         self.expression_lists = []  # 存储生成的表达式列表
         self.generation_times = 0  # 记录生成表达式的尝试次数
         self.answers = []  # 存储计算得到的答案
         self.questions = []  # 存储最终生成的问题
         self.expression_num = 0  # 当前已生成的有效表达式数量
+        self.max_attempts = max_attempts if max_attempts is not None else self.ATTEMPTS_PER_QUESTION * question_num
+        self.time_limit = time_limit
+        self.deadline = None  # 生成截止时间（time.monotonic），见 begin
+        self.infeasible = False  # 容量估计是否不足 question_num，见 begin
+        self.window = AcceptanceWindow()  # 最近的接受率，骤降时停止生成，见 begin
+        self.status = None  # 生成结束时的状态，COMPLETE 等，生成前为 None
 
     def generate_subexpression(self, etype, op):
         """
@@ -156,14 +765,15 @@ class Expression:
         :param op: 运算符
         """
         if etype == 1:
-            # 生成两个随机数
-            num_1 = Number(self.max)
-            num_1.reduce_fraction()
-            num_2 = Number(self.max)
-            num_2.reduce_fraction()
+            # 生成两个随机数；使用结果表时只抽取结果合法的操作数对
+            if self.table is not None:
+                num_1, num_2 = self.table.sample_pair(op, self.rng)
+            else:
+                num_1 = self.generate_number()
+                num_2 = self.generate_number()
             if op != ' % ':
                 # 非除法运算时，确保大数在前
-                if float(num_1) >= float(num_2):
+                if num_1 >= num_2:
                     subexpression = [num_1, op, num_2]
                 else:
                     subexpression = [num_2, op, num_1]
@@ -172,65 +782,179 @@ class Expression:
         else:
             # 生成一元运算表达式
             if op in [' - ', ' % ']:
-                if random.randint(0, 1):
-                    num = Number(self.max)
-                    num.reduce_fraction()
+                if self.rng.randint(0, 1):
+                    num = self.generate_number()
                     subexpression = [op, num]
                 else:
-                    num = Number(self.max)
-                    num.reduce_fraction()
+                    num = self.generate_number()
                     subexpression = [num, op]
             else:
-                num = Number(self.max)
-                num.reduce_fraction()
+                num = self.generate_number()
                 subexpression = [op, num]
         return subexpression
 
-    def generate_expression_list(self):
-        """生成表达式列表"""
+    def generate_expression_list(self, operators=None):
+        """
+        生成表达式列表
+        :param operators: 依次使用的运算符列表，None 表示随机决定数量和运算符
+        """
         expression_list = []
-        sub_num = random.randint(1, 3)  # 随机决定子表达式的数量
-        operators = [random.choice([' + ', ' - ', ' * ', ' % ']) for _ in range(sub_num)]
+        if operators is None:
+            sub_num = self.rng.randint(1, 3)  # 随机决定子表达式的数量
+            operators = [self.rng.choice([' + ', ' - ', ' * ', ' % ']) for _ in range(sub_num)]
+        sub_num = len(operators)
         subexpression_1 = self.generate_subexpression(1, operators[0])
-        str_sub_1 = str(subexpression_1[0]) + subexpression_1[1] + str(subexpression_1[2])
         if sub_num == 1:
             expression_list.append(subexpression_1)
-            str_sub_2 = ''
-            str_sub_3 = ''
-            string = str_sub_1 + '|' + str_sub_2 + '|' + str_sub_3
         elif sub_num == 2:
             subexpression_2 = self.generate_subexpression(2, operators[1])
-            str_sub_2 = str(subexpression_2[0]) + str(subexpression_2[1])
-            str_sub_3 = ''
             expression_list.append(subexpression_1)
             expression_list.append(subexpression_2)
-            string = str_sub_1 + '|' + str_sub_2 + '|' + str_sub_3
         else:
-            etype = random.randint(1, 2)
+            etype = self.rng.randint(1, 2)
             subexpression_2 = self.generate_subexpression(etype, operators[1])
             if etype == 1:
                 subexpression_3 = [operators[2]]
+                # 两个二元子表达式按文本排序，加法与乘法时大者在前
+                str_sub_1 = str(subexpression_1[0]) + subexpression_1[1] + str(subexpression_1[2])
                 str_sub_2 = str(subexpression_2[0]) + str(subexpression_2[1]) + str(subexpression_2[2])
-                str_sub_3 = subexpression_3[0]
                 if str_sub_1 >= str_sub_2 and operators[2] in [' + ', ' * ']:
                     expression_list.append(subexpression_1)
                     expression_list.append(subexpression_2)
                     expression_list.append(subexpression_3)
-                    string = str_sub_1 + '|' + str_sub_2 + '|' + str_sub_3
                 else:
                     expression_list.append(subexpression_2)
                     expression_list.append(subexpression_1)
                     expression_list.append(subexpression_3)
-                    string = str_sub_1 + '|' + str_sub_2 + '|' + str_sub_3
             else:
                 subexpression_3 = self.generate_subexpression(2, operators[2])
-                str_sub_2 = str(subexpression_2[0]) + str(subexpression_2[1])
-                str_sub_3 = str(subexpression_3[0]) + str(subexpression_3[1])
                 expression_list.append(subexpression_1)
                 expression_list.append(subexpression_2)
                 expression_list.append(subexpression_3)
-                string = str_sub_1 + '|' + str_sub_2 + '|' + str_sub_3
-        return expression_list, string
+        return expression_list
+
+    def generate_number(self, nonzero=False):
+        """
+        生成一个化简后的随机数
+        :param nonzero: 是否要求生成的数不为零（用作除数时）
+        """
+        if self.table is not None:
+            if nonzero:
+                # 非零操作数即除法的有效右操作数
+                return self.table.operands[self.table.sample_valid(' % ', 0, self.rng)]
+            return self.table.sample(self.rng)
+        num = Number(self.max, rng=self.rng)
+        while nonzero and num == 0:
+            num = Number(self.max, rng=self.rng)
+        return num
+
+    def calculate(self, f1, f2, op):
+        """计算 f1 op f2；启用结果表且两个操作数都在表中时直接查表，否则使用计算结果缓存"""
+        if self.table is not None:
+            return self.table.calculate(f1, f2, op)
+        if self.cache is not None:
+            return self.cache.calculate(f1, f2, op)
+        return Fraction(f1, f2, op).calculate_fractions()
+
+    def enable_cache(self, max_size=4096):
+        """开启（或以新的大小重新开启）计算结果缓存，返回 CalculationCache 对象"""
+        self.cache = CalculationCache(max_size)
+        return self.cache
+
+    def disable_cache(self):
+        """关闭计算结果缓存"""
+        self.cache = None
+
+    def clear_cache(self):
+        """清空计算结果缓存"""
+        if self.cache is not None:
+            self.cache.clear()
+
+    def generate_valid_subexpression(self, etype, op, result=None):
+        """
+        按非负、除数非零的约束直接生成子表达式，并返回子表达式及其值
+        :param etype: 表达式类型（1表示二元运算，2表示一元运算）
+        :param op: 运算符
+        :param result: 一元运算时，前一个子表达式的计算结果
+        """
+        if etype == 1:
+            if self.table is not None:
+                num_1, num_2 = self.table.sample_pair(op, self.rng)
+            elif op == ' % ':
+                num_1, num_2 = self.generate_number(), self.generate_number(nonzero=True)
+            else:
+                num_1, num_2 = self.generate_number(), self.generate_number()
+            if op != ' % ' and num_1 < num_2:
+                num_1, num_2 = num_2, num_1  # 非除法运算时，确保大数在前，减法结果因此非负
+            subexpression = [num_1, op, num_2]
+            value = self.calculate(subexpression[0], subexpression[2], op)
+        else:
+            if op == ' - ':
+                # 根据大小决定减数与被减数的位置，保证差非负
+                num = self.generate_number()
+                if num <= result:
+                    subexpression = [op, num]
+                    value = self.calculate(result, num, op)
+                else:
+                    subexpression = [num, op]
+                    value = self.calculate(num, result, op)
+            elif op == ' % ':
+                # 前一结果为零时只能作被除数
+                if result == 0 or self.rng.randint(0, 1):
+                    num = self.generate_number(nonzero=True)
+                    subexpression = [op, num]
+                    value = self.calculate(result, num, op)
+                else:
+                    num = self.generate_number()
+                    subexpression = [num, op]
+                    value = self.calculate(num, result, op)
+            else:
+                num = self.generate_number()
+                subexpression = [op, num]
+                value = self.calculate(result, num, op)
+        return subexpression, value
+
+    def generate_valid_expression_list(self, operators=None):
+        """
+        按约束直接生成合法的表达式列表，返回表达式列表及其答案
+        :param operators: 依次使用的运算符列表，None 表示随机决定数量和运算符
+        """
+        if operators is None:
+            sub_num = self.rng.randint(1, 3)  # 随机决定子表达式的数量
+            operators = [self.rng.choice([' + ', ' - ', ' * ', ' % ']) for _ in range(sub_num)]
+        sub_num = len(operators)
+        subexpression_1, result_1 = self.generate_valid_subexpression(1, operators[0])
+        if sub_num == 1:
+            return [subexpression_1], result_1
+        if sub_num == 2:
+            subexpression_2, result = self.generate_valid_subexpression(2, operators[1], result_1)
+            return [subexpression_1, subexpression_2], result
+        if self.rng.randint(1, 2) == 2:
+            subexpression_2, result_2 = self.generate_valid_subexpression(2, operators[1], result_1)
+            subexpression_3, result = self.generate_valid_subexpression(2, operators[2], result_2)
+            return [subexpression_1, subexpression_2, subexpression_3], result
+        # 两个二元子表达式由第三个运算符连接
+        subexpression_2, result_2 = self.generate_valid_subexpression(1, operators[1])
+        op = operators[2]
+        if op == ' - ':
+            swap = result_1 < result_2
+        elif op == ' % ':
+            if result_1 == 0 and result_2 == 0:
+                raise CustomMathError("除数不能为零。", CustomMathError.ZERO_DIVISOR)
+            swap = result_2 == 0
+        else:
+            swap = self.rng.randint(0, 1) == 1
+        if swap:
+            subexpression_1, subexpression_2 = subexpression_2, subexpression_1
+            result_1, result_2 = result_2, result_1
+        result = self.calculate(result_1, result_2, op)
+        return [subexpression_1, subexpression_2, [op]], result
+
+    def acceptance_rate(self):
+        """返回生成尝试中被接受的比例"""
+        if self.generation_times == 0:
+            return 0.0
+        return self.expression_num / self.generation_times
 
     def calculate_answer(self, expression_list):
         """
@@ -238,182 +962,502 @@ class Expression:
         :param expression_list: 表达式列表
         """
         try:
-            # 计算第一个子表达式的结果
-            expression_1 = Fraction(expression_list[0][0], expression_list[0][2], expression_list[0][1])
-            result_1 = expression_1.calculate_fractions()
-            if float(result_1) < 0:
-                raise CustomMathError("子表达式不能小于零。")
-            if len(expression_list) == 1:
-                result = result_1
-            elif len(expression_list) == 2:
-                # 处理两个子表达式的情况
-                if isinstance(expression_list[1][0], str):
-                    expression_2 = Fraction(result_1, expression_list[1][1], expression_list[1][0])
-                else:
-                    expression_2 = Fraction(expression_list[1][0], result_1, expression_list[1][1])
-                result = expression_2.calculate_fractions()
-            else:
-                # 处理三个子表达式的情况
-                if len(expression_list[2]) == 1:
-                    expression_2 = Fraction(expression_list[1][0], expression_list[1][2], expression_list[1][1])
-                    result_2 = expression_2.calculate_fractions()
-                    if float(result_2) < 0:
-                        raise CustomMathError("子表达式不能小于零。")
-                    expression_3 = Fraction(result_1, result_2, expression_list[2][0])
-                    result = expression_3.calculate_fractions()
-                else:
-                    if isinstance(expression_list[1][0], str):
-                        expression_2 = Fraction(result_1, expression_list[1][1], expression_list[1][0])
-                    else:
-                        expression_2 = Fraction(expression_list[1][0], result_1, expression_list[1][1])
-                    result_2 = expression_2.calculate_fractions()
-                    if float(result_2) < 0:
-                        raise CustomMathError("子表达式不能小于零。")
-                    if isinstance(expression_list[2][0], str):
-                        expression_2 = Fraction(result_2, expression_list[2][1], expression_list[2][0])
-                    else:
-                        expression_2 = Fraction(expression_list[2][0], result_2, expression_list[2][1])
-                    result = expression_2.calculate_fractions()
-            if float(result) < 0:
-                raise CustomMathError("子表达式不能小于零。")
-            return result
+            return self.evaluate_tree(self.expression_tree(expression_list))
         except CustomMathError as e:
             raise e
         except Exception:
             raise CustomMathError("计算过程中出现错误。")
 
-    def generate_expressions(self):
-        """生成表达式"""
-        while self.expression_num < self.question_num:
+    def evaluate_tree(self, tree):
+        """
+        计算表达式树的值，每个子表达式都不能小于零
+        :param tree: 表达式树
+        """
+        if isinstance(tree, Number):
+            return tree
+        op, left, right = tree
+        result = self.calculate(self.evaluate_tree(left), self.evaluate_tree(right), op)
+        if result < 0:
+            raise CustomMathError("子表达式不能小于零。", CustomMathError.NEGATIVE)
+        return result
+
+    def generate_tree(self, operator_count, operators=None):
+        """
+        自底向上随机生成包含 operator_count 个运算符的表达式树
+        每个节点生成时即完成计算、规范化键和渲染；减法时大数在前，除数为零时交换左右子树
+        :param operator_count: 运算符数量
+        :param operators: 使用的运算符列表，生成过程中从末尾依次取出；None 表示随机选择
+        :return: combine 形式的分析结果，需经 finish 得到规范化键和文本
+        """
+        if operator_count == 0:
+            return leaf(self.generate_number())
+        if operator_count == 1 and self.table is not None:
+            # 两个操作数都在表中，直接按有效位掩码抽取结果合法的操作数对
+            op = operators.pop() if operators else self.rng.choice(OPERATORS)
+            left, right = self.table.sample_pair(op, self.rng)
+            return combine(op, leaf(left), leaf(right), self.calculate)
+        left_count = self.rng.randint(0, operator_count - 1)
+        left = self.generate_tree(left_count, operators)
+        right = self.generate_tree(operator_count - 1 - left_count, operators)
+        op = operators.pop() if operators else self.rng.choice(OPERATORS)
+        if op == ' - ':
+            if left[1] < right[1]:
+                left, right = right, left
+        elif op == ' % ':
+            if right[1] == 0:
+                if left[1] == 0:
+                    raise CustomMathError("除数不能为零。", CustomMathError.ZERO_DIVISOR)
+                left, right = right, left
+        return combine(op, left, right, self.calculate)
+
+    def expression_tree(self, expression_list):
+        """
+        将表达式列表转换为与 calculate_answer 计算顺序一致的树
+        树的节点为 ExpressionNode(运算符, 左子树, 右子树)，叶子为 Number 对象
+        :param expression_list: 表达式列表
+        """
+        def apply(subtree, item):
+            # 一元子表达式：[op, num] 表示 子树 op num，[num, op] 表示 num op 子树
+            if isinstance(item[0], str):
+                return ExpressionNode(item[0], subtree, item[1])
+            return ExpressionNode(item[1], item[0], subtree)
+
+        first = ExpressionNode(expression_list[0][1], expression_list[0][0], expression_list[0][2])
+        if len(expression_list) == 1:
+            return first
+        if len(expression_list) == 2:
+            return apply(first, expression_list[1])
+        if len(expression_list[2]) == 1:
+            second = ExpressionNode(expression_list[1][1], expression_list[1][0], expression_list[1][2])
+            return ExpressionNode(expression_list[2][0], first, second)
+        return apply(apply(first, expression_list[1]), expression_list[2])
+
+    def canonical_key(self, expression_list):
+        """
+        计算表达式的规范化键，用于判重
+        ' + ' 与 ' * ' 的连续运算会被展开并对操作数排序，
+        因此 2 + 3 与 3 + 2、(1 + 2) + 3 与 1 + (2 + 3) 得到相同的键
+        :param expression_list: 表达式列表或表达式树
+        """
+        def normalize(node):
+            if isinstance(node, Number):
+                return 'n', node.integer, node.numerator, node.denominator
+            op, left, right = node
+            if op in [' + ', ' * ']:
+                # 展开同一运算符的结合链，并按键排序消除交换律的差异
+                operands = []
+                stack = [left, right]
+                while stack:
+                    child = stack.pop()
+                    if not isinstance(child, Number) and child[0] == op:
+                        stack.append(child[1])
+                        stack.append(child[2])
+                    else:
+                        operands.append(normalize(child))
+                return op, tuple(sorted(operands))
+            return op, normalize(left), normalize(right)
+
+        if isinstance(expression_list, ExpressionNode):
+            return normalize(expression_list)
+        return normalize(self.expression_tree(expression_list))
+
+    def enable_instrumentation(self, callback=None):
+        """
+        开启生成过程统计，返回 GenerationStats 对象
+        :param callback: 生成结束时以统计字典调用的回调函数
+        """
+        self.stats = GenerationStats(callback)
+        return self.stats
+
+    def capacity(self, stratum=None):
+        """
+        估计最多能生成的不同题目数量（上界）
+        :param stratum: 只估计指定层 (运算符数量, 是否必须含除法)，None 表示所有运算符数量之和
+        """
+        fractional_only = self.quotas is not None and self.quotas.fractional_only
+        if stratum is not None:
+            return estimate_capacity(self.max, stratum[0], stratum[1], fractional_only)
+        return sum(estimate_capacity(self.max, count, fractional_only=fractional_only)
+                   for count in range(1, (self.max_operators or 3) + 1))
+
+    def feasible(self):
+        """按容量估计判断能否生成 question_num 道不同的题目；指定配额时检查每一层"""
+        if self.quotas is None:
+            return self.capacity() >= self.question_num
+        plan = self.quotas.plan(self.question_num, self.max_operators or 3)
+        return all(self.capacity(stratum) >= count for stratum, count in plan.items())
+
+    def begin(self):
+        """
+        开始生成前按容量估计确定本次最多生成的题目数量，并设置截止时间
+        容量不足时仍生成容量和尝试次数、时间上限允许的部分，结束后 status 为 INFEASIBLE
+        :return: 本次最多生成的题目数量
+        """
+        if self.quotas is None:
+            target = min(self.question_num, self.capacity())
+        else:
+            # 各层最多生成其容量允许的数量，容量为零的层不再抽取
+            plan = self.quotas.plan(self.question_num, self.max_operators or 3)
+            self.remaining = {stratum: min(count, self.capacity(stratum)) for stratum, count in plan.items()}
+            target = sum(self.remaining.values())
+        self.infeasible = target < self.question_num
+        self.window = AcceptanceWindow()
+        if self.time_limit is not None:
+            self.deadline = time.monotonic() + self.time_limit
+        return target
+
+    def next_stratum(self):
+        """
+        按各层剩余的题目数量随机选择下一道题所属的层，相当于逐个取出打乱后的分层计划
+        未指定配额时返回 None
+        :return: (运算符数量, 是否必须含除法)
+        """
+        if self.quotas is None:
+            return None
+        if self.remaining is None:
+            self.remaining = self.quotas.plan(self.question_num, self.max_operators or 3)
+        pick = self.rng.randrange(sum(self.remaining.values()))
+        for stratum, left in self.remaining.items():
+            if pick < left:
+                self.remaining[stratum] -= 1
+                return stratum
+            pick -= left
+
+    def stratum_operators(self, stratum):
+        """为指定的层抽取运算符列表；必须含除法时随机选一个位置放置除法"""
+        operator_count, division = stratum
+        operators = [self.rng.choice(OPERATORS) for _ in range(operator_count)]
+        if division and ' % ' not in operators:
+            operators[self.rng.randrange(operator_count)] = ' % '
+        return operators
+
+    def generate_candidate(self, stratum=None, stats=None):
+        """
+        生成并计算一个候选表达式，返回 (表达式, 答案, 规范化键, 问题)
+        表达式树引擎在生成时已渲染出问题；表达式列表的问题为 None，由 render_question 随机渲染
+        :param stratum: 分层生成时表达式所属的层，None 表示不限制
+        :param stats: GenerationStats 对象，指定时记录各阶段耗时，被拒绝时记录原因后重新抛出异常
+        """
+        start = time.perf_counter() if stats is not None else None
+        phase = 'generate_expression_list'  # 表达式树和按约束构造时，生成与计算同时进行，都计入生成阶段
+        operators = self.stratum_operators(stratum) if stratum is not None else None
+        exp_list = None
+        operator_count = len(operators) if operators else 0
+        try:
+            if self.max_operators is not None:
+                operator_count = operator_count or self.rng.randint(1, self.max_operators)
+                node, answer, key, question, _ = finish(self.generate_tree(operator_count, operators))
+                return node, answer, key, question
+            if self.constructive:
+                exp_list, answer = self.generate_valid_expression_list(operators)
+                tree = self.expression_tree(exp_list)
+            else:
+                exp_list = self.generate_expression_list(operators)
+                if stats is not None:
+                    middle = time.perf_counter()
+                    stats.add_time(phase, middle - start)
+                    start, phase = middle, 'calculate_answer'
+                # 表达式树只构建一次，计算答案和规范化键共用
+                tree = self.expression_tree(exp_list)
+                answer = self.evaluate_tree(tree)
+        except CustomMathError as e:
+            if stats is not None:
+                stats.reject(e.reason, len(exp_list) if exp_list else operator_count)
+            raise
+        finally:
+            if stats is not None:
+                stats.add_time(phase, time.perf_counter() - start)
+        return exp_list, answer, self.canonical_key(tree), None
+
+    def next_expression(self, stratum=None):
+        """
+        生成下一个合法且不重复的表达式，返回 (表达式, 答案, 问题)
+        问题仅在使用表达式树时已渲染，否则为 None
+        达到尝试次数或时间上限，或最近的接受率骤降（见 AcceptanceWindow）时返回 None，并记录 status
+        :param stratum: 分层生成时表达式所属的层，None 表示不限制
+        """
+        stats = self.stats
+        quotas = self.quotas
+        while True:
+            if self.generation_times >= self.max_attempts:
+                self.status = self.ATTEMPT_LIMIT
+                return None
+            if self.window.exhausted(self.generation_times, self.expression_num):
+                self.status = self.INFEASIBLE  # 不同的题目已基本耗尽
+                return None
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.status = self.TIME_LIMIT
+                return None
             self.generation_times += 1
             try:
-                exp_list, exp_string = self.generate_expression_list()
-                answer = self.calculate_answer(exp_list)
+                expression, answer, key, question = self.generate_candidate(stratum, stats)
             except CustomMathError:
                 continue  # 如果生成的表达式无效，则继续尝试
-            self.expressions.add(exp_string)  # 添加到已生成的表达式集合中
+            if quotas is not None and not quotas.accepts(answer):
+                if stats is not None:
+                    stats.reject(GenerationStats.FILTERED, count_operators(expression))
+                continue  # 答案不满足配额要求
+            digest = key_digest(key)
+            if digest in self.expressions:
+                if stats is not None:
+                    stats.reject(GenerationStats.DUPLICATE, count_operators(expression))
+                continue  # 与已生成的表达式等价（交换律/结合律），丢弃
+            if self.seen is not None and key in self.seen:
+                if stats is not None:
+                    stats.reject(GenerationStats.SEEN, count_operators(expression))
+                continue  # 之前的会话中已出过
+            self.expressions.add(digest)  # 只保存摘要，每道题的内存开销固定
+            if self.seen is not None:
+                self.seen.add(key)
+            self.expression_num += 1
+            if stats is not None:
+                stats.accept(count_operators(expression))
+            return expression, answer, question
+
+    def expression_stream(self):
+        """逐个生成 (表达式, 答案, 问题)，生成全部题目或提前停止时记录 status"""
+        target = self.begin()
+        while self.expression_num < target:
+            result = self.next_expression(self.next_stratum())
+            if result is None:
+                break
+            yield result
+        else:
+            self.status = self.COMPLETE
+        if self.infeasible:
+            self.status = self.INFEASIBLE
+
+    def generate_expressions(self):
+        """生成表达式，提前停止时保留已生成的部分"""
+        for exp_list, answer, question in self.expression_stream():
             self.expression_lists.append(exp_list)
             self.answers.append(str(answer))
-            self.expression_num += 1
+            if question is not None:
+                self.questions.append(question)
 
-    def randomly_generate_questions(self):
-        """随机生成问题"""
-        for expression in self.expression_lists:
-            op_1 = expression[0][1]  # 第一个操作符
-            # 处理第一个子表达式
-            if expression[0][1] in [' + ', ' * ']:
-                if random.randint(0, 1):
-                    question_1 = str(expression[0][0]) + str(expression[0][1]) + str(expression[0][2])
+    def iter_records(self):
+        """
+        逐个生成 (问题, 答案, 运算符列表)，不保存表达式、问题和答案列表
+        运算符直接取自生成的表达式，按计算顺序排列，见 expression_operators
+        只有判重用的摘要集合会随题目数量增长，每道题约 60 字节（见 key_digest）；
+        提前停止时生成的题目少于 question_num，原因见 status
+        """
+        stats = self.stats
+        for exp_list, answer, question in self.expression_stream():
+            if question is None:
+                if stats is None:
+                    question = self.render_question(exp_list)
                 else:
-                    question_1 = str(expression[0][2]) + str(expression[0][1]) + str(expression[0][0])
-            else:
+                    start = time.perf_counter()
+                    question = self.render_question(exp_list)
+                    stats.add_time('randomly_generate_questions', time.perf_counter() - start)
+            yield question, str(answer), expression_operators(exp_list)
+        if stats is not None:
+            stats.report()
+
+    def iter_questions(self):
+        """逐个生成 (问题, 答案) 对，见 iter_records"""
+        for question, answer, _ in self.iter_records():
+            yield question, answer
+
+    def randomly_generate_questions(self):
+        """随机生成问题，生成时已渲染的题目（表达式树）不再重复渲染"""
+        start = time.perf_counter()
+        pending = self.expression_lists[len(self.questions):]
+        for expression in pending:
+            self.questions.append(self.render_question(expression))
+        if self.stats is not None:
+            self.stats.add_time('randomly_generate_questions', time.perf_counter() - start, len(pending))
+
+    def render_question(self, expression):
+        """
+        将一个表达式列表随机渲染为问题字符串；表达式树按最少括号渲染
+        :param expression: 表达式列表或表达式树
+        """
+        if isinstance(expression, ExpressionNode):
+            return analyze(expression)[3]
+        op_1 = expression[0][1]  # 第一个操作符
+        # 处理第一个子表达式
+        if expression[0][1] in [' + ', ' * ']:
+            if self.rng.randint(0, 1):
                 question_1 = str(expression[0][0]) + str(expression[0][1]) + str(expression[0][2])
+            else:
+                question_1 = str(expression[0][2]) + str(expression[0][1]) + str(expression[0][0])
+        else:
+            question_1 = str(expression[0][0]) + str(expression[0][1]) + str(expression[0][2])
 
-            if len(expression) >= 2:
-                # 处理第二个子表达式
-                if len(expression[1]) == 2:
-                    if str(expression[1][0]) == ' + ':
-                        op_2 = ' + '
-                        if random.randint(0, 1):
-                            question_2 = question_1 + op_2 + str(expression[1][1])
-                        else:
-                            if expression[0][1] in [' + ', ' - ']:
-                                question_2 = str(expression[1][1]) + op_2 + '(' + question_1 + ')'
-                            else:
-                                question_2 = str(expression[1][1]) + op_2 + question_1
-                    elif str(expression[1][0]) == ' * ':
-                        op_2 = ' * '
-                        if random.randint(0, 1):
-                            if str(expression[0][1]) in [' * ', ' % ']:
-                                question_2 = question_1 + op_2 + str(expression[1][1])
-                            else:
-                                question_2 = '(' + question_1 + ')' + op_2 + str(expression[1][1])
-                        else:
-                            question_2 = str(expression[1][1]) + op_2 + '(' + question_1 + ')'
-                    elif str(expression[1][0]) == ' - ':
-                        op_2 = ' - '
+        if len(expression) >= 2:
+            # 处理第二个子表达式
+            if len(expression[1]) == 2:
+                if str(expression[1][0]) == ' + ':
+                    op_2 = ' + '
+                    if self.rng.randint(0, 1):
                         question_2 = question_1 + op_2 + str(expression[1][1])
-                    elif str(expression[1][0]) == ' % ':
-                        op_2 = ' % '
+                    else:
+                        if expression[0][1] in [' + ', ' - ']:
+                            question_2 = str(expression[1][1]) + op_2 + '(' + question_1 + ')'
+                        else:
+                            question_2 = str(expression[1][1]) + op_2 + question_1
+                elif str(expression[1][0]) == ' * ':
+                    op_2 = ' * '
+                    if self.rng.randint(0, 1):
                         if str(expression[0][1]) in [' * ', ' % ']:
                             question_2 = question_1 + op_2 + str(expression[1][1])
                         else:
                             question_2 = '(' + question_1 + ')' + op_2 + str(expression[1][1])
-                    elif str(expression[1][1]) == ' - ':
-                        op_2 = ' - '
-                        if str(expression[0][1]) in [' * ', ' % ']:
-                            question_2 = str(expression[1][0]) + op_2 + question_1
-                        else:
-                            question_2 = str(expression[1][0]) + op_2 + '(' + question_1 + ')'
                     else:
-                        op_2 = ' % '
+                        question_2 = str(expression[1][1]) + op_2 + '(' + question_1 + ')'
+                elif str(expression[1][0]) == ' - ':
+                    op_2 = ' - '
+                    question_2 = question_1 + op_2 + str(expression[1][1])
+                elif str(expression[1][0]) == ' % ':
+                    op_2 = ' % '
+                    if str(expression[0][1]) in [' * ', ' % ']:
+                        question_2 = question_1 + op_2 + str(expression[1][1])
+                    else:
+                        question_2 = '(' + question_1 + ')' + op_2 + str(expression[1][1])
+                elif str(expression[1][1]) == ' - ':
+                    op_2 = ' - '
+                    if str(expression[0][1]) in [' * ', ' % ']:
+                        question_2 = str(expression[1][0]) + op_2 + question_1
+                    else:
                         question_2 = str(expression[1][0]) + op_2 + '(' + question_1 + ')'
+                else:
+                    op_2 = ' % '
+                    question_2 = str(expression[1][0]) + op_2 + '(' + question_1 + ')'
 
-                    # 处理第三个子表达式（如果存在）
-                    if len(expression) > 2:
-                        if expression[2][0] == ' + ':
-                            op_3 = ' + '
-                            if random.randint(0, 1):
-                                question_3 = question_2 + op_3 + str(expression[2][1])
-                            else:
-                                if op_1 in [' + ', ' - '] and op_2 in [' + ', ' - ']:
-                                    question_3 = str(expression[2][1]) + op_3 + '(' + question_2 + ')'
-                                else:
-                                    question_3 = str(expression[2][1]) + op_3 + question_2
-                        elif expression[2][0] == ' - ':
-                            op_3 = ' - '
+                # 处理第三个子表达式（如果存在）
+                if len(expression) > 2:
+                    if expression[2][0] == ' + ':
+                        op_3 = ' + '
+                        if self.rng.randint(0, 1):
                             question_3 = question_2 + op_3 + str(expression[2][1])
-                        elif expression[2][0] == ' * ':
-                            op_3 = ' * '
-                            if random.randint(0, 1):
+                        else:
+                            # 前一步为减法，或加减法连用时必须加括号，否则 c + a - b 会被解析为 (c + a) - b
+                            if op_2 == ' - ' or (op_1 in [' + ', ' - '] and op_2 == ' + '):
                                 question_3 = str(expression[2][1]) + op_3 + '(' + question_2 + ')'
                             else:
-                                if op_2 in [' * ', ' % ']:
-                                    question_3 = question_2 + op_3 + str(expression[2][1])
-                                else:
-                                    question_3 = '(' + question_2 + ')' + op_3 + str(expression[2][1])
-                        elif expression[2][0] == ' % ':
-                            op_3 = ' % '
+                                question_3 = str(expression[2][1]) + op_3 + question_2
+                    elif expression[2][0] == ' - ':
+                        op_3 = ' - '
+                        question_3 = question_2 + op_3 + str(expression[2][1])
+                    elif expression[2][0] == ' * ':
+                        op_3 = ' * '
+                        if self.rng.randint(0, 1):
+                            question_3 = str(expression[2][1]) + op_3 + '(' + question_2 + ')'
+                        else:
                             if op_2 in [' * ', ' % ']:
                                 question_3 = question_2 + op_3 + str(expression[2][1])
                             else:
                                 question_3 = '(' + question_2 + ')' + op_3 + str(expression[2][1])
-                        elif expression[2][1] == ' - ':
-                            op_3 = ' - '
-                            if op_2 in [' * ', ' % ']:
-                                question_3 = str(expression[2][0]) + op_3 + question_2
-                            else:
-                                question_3 = str(expression[2][0]) + op_3 + '(' + question_2 + ')'
-                        elif expression[2][1] == ' % ':
-                            op_3 = ' % '
-                            question_3 = str(expression[2][0]) + op_3 + '(' + question_2 + ')'
-                else:
-                    # 处理第二个子表达式为完整表达式的情况
-                    question_1 = '(' + question_1 + ')'
-                    question_2 = '(' + str(expression[1][0]) + str(expression[1][1]) + str(expression[1][2]) + ')'
-                    if str(expression[2][0]) in [' + ', ' * ']:
-                        if random.randint(0, 1):
-                            question_3 = question_1 + str(expression[2][0]) + question_2
+                    elif expression[2][0] == ' % ':
+                        op_3 = ' % '
+                        if op_2 in [' * ', ' % ']:
+                            question_3 = question_2 + op_3 + str(expression[2][1])
                         else:
-                            question_3 = question_2 + str(expression[2][0]) + question_1
+                            question_3 = '(' + question_2 + ')' + op_3 + str(expression[2][1])
+                    elif expression[2][1] == ' - ':
+                        op_3 = ' - '
+                        if op_2 in [' * ', ' % ']:
+                            question_3 = str(expression[2][0]) + op_3 + question_2
+                        else:
+                            question_3 = str(expression[2][0]) + op_3 + '(' + question_2 + ')'
+                    elif expression[2][1] == ' % ':
+                        op_3 = ' % '
+                        question_3 = str(expression[2][0]) + op_3 + '(' + question_2 + ')'
+            else:
+                # 处理第二个子表达式为完整表达式的情况
+                question_1 = '(' + question_1 + ')'
+                question_2 = '(' + str(expression[1][0]) + str(expression[1][1]) + str(expression[1][2]) + ')'
+                if str(expression[2][0]) in [' + ', ' * ']:
+                    if self.rng.randint(0, 1):
+                        question_3 = question_1 + str(expression[2][0]) + question_2
                     else:
                         question_3 = question_2 + str(expression[2][0]) + question_1
+                else:
+                    # 减法和除法按 calculate_answer 的计算顺序输出
+                    question_3 = question_1 + str(expression[2][0]) + question_2
 
-            # 根据子表达式的数量，将最终的问题添加到问题列表中
-            if len(expression) == 1:
-                self.questions.append(question_1)
-            elif len(expression) == 2:
-                self.questions.append(question_2)
-            else:
-                self.questions.append(question_3)
+        # 根据子表达式的数量，返回最终的问题
+        if len(expression) == 1:
+            return question_1
+        elif len(expression) == 2:
+            return question_2
+        else:
+            return question_3
 
     def run(self):
-        """运行表达式生成过程"""
+        """运行表达式生成过程，提前停止时返回已生成的部分，原因见 status"""
         self.generate_expressions()  # 生成表达式
         self.randomly_generate_questions()  # 随机生成问题
+        if self.stats is not None:
+            self.stats.report()  # 输出生成过程统计
         return self.questions, self.answers  # 返回生成的问题和答案
 
 
+def _generate_shard(args):
+    """
+    在工作进程中生成一个分片，返回 (生成状态, (规范化键的摘要, 问题, 答案) 列表)
+    :param args: (最大值, 题目数量, 种子, 分片序号, 是否按约束构造)
+    """
+    max, question_num, seed, index, constructive = args
+    exp = Expression(max, question_num, constructive=constructive, seed=f"{seed}-{index}")
+    questions, answers = exp.run()
+    keys = [key_digest(exp.canonical_key(exp_list)) for exp_list in exp.expression_lists]
+    return exp.status, list(zip(keys, questions, answers))
+
+
+def generate_parallel(max, question_num, seed=0, workers=None, constructive=False, shard_size=1000):
+    """
+    多进程分片生成题目
+    分片划分只取决于题目数量和 shard_size，每个分片使用由 (seed, 分片序号) 派生的种子，
+    结果按分片顺序合并并跨分片判重，因此相同的 (max, question_num, seed) 与进程数无关地得到相同输出
+    某个分片提前停止，或追加的分片没有带来新题目时停止生成，返回的题目少于 question_num
+    :param max: 生成数字的最大值
+    :param question_num: 要生成的问题数量
+    :param seed: 随机种子
+    :param workers: 工作进程数，None 表示使用 CPU 核数，1 表示在当前进程内生成
+    :param constructive: 是否按约束直接构造合法表达式
+    :param shard_size: 每个分片的题目数量
+    """
+    if shard_size < 1:
+        raise CustomMathError("shard_size必须大于等于1。")
+    seen = set()
+    questions = []
+    answers = []
+    index = 0
+    executor = None
+    try:
+        if workers != 1:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=workers)
+        complete = True
+        while complete and len(questions) < question_num:
+            # 跨分片去重后不足时，继续追加新的分片
+            before = len(questions)
+            remaining = question_num - len(questions)
+            tasks = []
+            while remaining > 0:
+                size = min(shard_size, remaining)
+                tasks.append((max, size, seed, index, constructive))
+                index += 1
+                remaining -= size
+            shards = executor.map(_generate_shard, tasks) if executor else map(_generate_shard, tasks)
+            for status, shard in shards:
+                complete = complete and status == Expression.COMPLETE
+                for key, question, answer in shard:
+                    if key in seen or len(questions) >= question_num:
+                        continue
+                    seen.add(key)
+                    questions.append(question)
+                    answers.append(answer)
+            complete = complete and len(questions) > before
+    finally:
+        if executor:
+            executor.shutdown()
+    return questions, answers
+
+
 # 测试代码
 if __name__ == "__main__":
     try:
@@ -0,0 +1,431 @@
+# grading.py
+# 题目与答案的解析、计算及判分功能
+
+import glob
+import os
+import re
+
+from function import Number, Fraction, CustomMathError, ExpressionNode
+
+# 带分数 a'b/c、分数 b/c、整数，以及运算符和括号
+_TOKEN = re.compile(r"\s*(?:(\d+)'(\d+)/(\d+)|(\d+)/(\d+)|(\d+)|([-+*%()]))")
+_NUMBER = re.compile(r"\s*(?:(\d+)'(\d+)/(\d+)|(\d+)/(\d+)|(\d+))\s*$")
+_OPERATORS = {'+': ' + ', '-': ' - ', '*': ' * ', '%': ' % '}
+
+ANSWER_KEY_CACHE_SIZE = 8  # 最多缓存的答案表数量
+_answer_keys = {}  # (文件路径, 修改时间, 文件大小) 到解析后答案表的缓存
+_worker_answer_key = None  # 批量判分时每个工作进程持有的答案表
+
+
+def _number(match):
+    """将正则匹配结果转换为Number对象"""
+    groups = match.groups()
+    if groups[0] is not None:
+        return Number(nums=(int(groups[0]), int(groups[1]), int(groups[2])))
+    if groups[3] is not None:
+        return Number(nums=(0, int(groups[3]), int(groups[4])))
+    return Number(nums=(int(groups[5]), 0, 1))
+
+
+def tokenize(text):
+    """
+    将题目字符串切分为Number对象和运算符、括号组成的列表
+    :param text: 题目字符串，例如 "(1'1/2 + 3) % 2"
+    """
+    tokens = []
+    text = text.rstrip()
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise CustomMathError(f"无法解析的内容：{text[pos:]}")
+        if match.group(7) is not None:
+            tokens.append(match.group(7))
+        else:
+            tokens.append(_number(match))
+        pos = match.end()
+    return tokens
+
+
+def parse_expression(text):
+    """
+    解析题目字符串，返回与 Expression.expression_tree 相同形式的表达式树
+    节点为 ExpressionNode(运算符, 左子树, 右子树)，叶子为 Number 对象
+    :param text: 题目字符串
+    """
+    tokens = tokenize(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def expression():
+        nonlocal pos
+        node = term()
+        while peek() in ('+', '-'):
+            op = _OPERATORS[tokens[pos]]
+            pos += 1
+            node = ExpressionNode(op, node, term())
+        return node
+
+    def term():
+        nonlocal pos
+        node = factor()
+        while peek() in ('*', '%'):
+            op = _OPERATORS[tokens[pos]]
+            pos += 1
+            node = ExpressionNode(op, node, factor())
+        return node
+
+    def factor():
+        nonlocal pos
+        token = peek()
+        if isinstance(token, Number):
+            pos += 1
+            return token
+        if token == '(':
+            pos += 1
+            node = expression()
+            if peek() != ')':
+                raise CustomMathError("括号不匹配。")
+            pos += 1
+            return node
+        raise CustomMathError(f"题目格式错误：{text}")
+
+    tree = expression()
+    if pos != len(tokens):
+        raise CustomMathError(f"题目格式错误：{text}")
+    return tree
+
+
+def evaluate(tree):
+    """
+    精确计算表达式树的值
+    :param tree: parse_expression 或 Expression.expression_tree 返回的表达式树
+    """
+    if isinstance(tree, Number):
+        return tree
+    op, left, right = tree
+    return Fraction(evaluate(left), evaluate(right), op).calculate_fractions()
+
+
+def parse_number(text):
+    """
+    解析答案字符串，支持带分数、分数（含假分数）和整数
+    :param text: 答案字符串，例如 "1'1/2"、"3/2"、"6/4"
+    """
+    match = _NUMBER.match(text)
+    if match is None:
+        raise CustomMathError(f"无法解析的答案：{text.strip()}")
+    return _number(match)
+
+
+def answers_match(user_answer, correct_answer):
+    """
+    按数值比较两个答案，3/2、1'1/2 与 6/4 视为相同
+    用户答案无法解析时视为错误
+    """
+    if not isinstance(correct_answer, Number):
+        correct_answer = parse_number(correct_answer)
+    try:
+        return parse_number(user_answer) == correct_answer
+    except CustomMathError:
+        return False
+
+
+def read_lines(path):
+    """
+    读取题目、答案或答卷文件的所有行，去掉末尾的空行
+    :param path: 文件路径
+    :return: 各行内容（不含换行符）组成的列表
+    """
+    with open(path) as file:
+        lines = file.read().splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return lines
+
+
+def load_answer_key(exercise_path="Exercises.txt", answer_path="Answer.txt"):
+    """
+    加载答案表（Number对象列表），结果按文件及其修改时间缓存
+    答案文件存在时直接解析，否则解析并计算题目文件中的每道题
+    :param exercise_path: 题目文件路径
+    :param answer_path: 答案文件路径
+    """
+    if answer_path and os.path.exists(answer_path):
+        source, parse = answer_path, parse_number
+    else:
+        source, parse = exercise_path, lambda question: evaluate(parse_expression(question))
+    stat = os.stat(source)
+    cache_key = (os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+    answer_key = _answer_keys.get(cache_key)
+    if answer_key is None:
+        answer_key = [parse(line) for line in read_lines(source)]
+        if len(_answer_keys) >= ANSWER_KEY_CACHE_SIZE:
+            del _answer_keys[next(iter(_answer_keys))]  # 淘汰最早加入的答案表
+        _answer_keys[cache_key] = answer_key
+    return answer_key
+
+
+def grade_answers(user_answers, answer_key):
+    """
+    逐题比较用户答案与答案表
+    :param user_answers: 用户答案字符串列表
+    :param answer_key: 正确答案列表（Number对象或答案字符串）
+    :return: (正确题号列表, 错误题号列表)，题号从1开始
+    """
+    correct = []
+    incorrect = []
+    for i, (user_answer, correct_answer) in enumerate(zip(user_answers, answer_key), start=1):
+        if answers_match(user_answer, correct_answer):
+            correct.append(i)
+        else:
+            incorrect.append(i)
+    return correct, incorrect
+
+
+def write_grade(correct, incorrect, grade_path="Grade.txt"):
+    """将判分结果写入成绩文件"""
+    with open(grade_path, "w") as grade_file:
+        grade_file.write(f"Correct: {len(correct)} ({', '.join(map(str, correct))})\n")
+        grade_file.write(f"Wrong: {len(incorrect)} ({', '.join(map(str, incorrect))})\n")
+
+
+def grade_files(submission_path, exercise_path="Exercises.txt", answer_path="Answer.txt", grade_path=None):
+    """
+    对已有的题目/答案文件批改一份答卷，无需重新生成题目
+    :param submission_path: 用户答案文件路径，每行一个答案
+    :param exercise_path: 题目文件路径
+    :param answer_path: 答案文件路径
+    :param grade_path: 成绩文件路径，为None时不写文件
+    :return: (正确题号列表, 错误题号列表)
+    """
+    correct, incorrect = grade_answers(read_lines(submission_path), load_answer_key(exercise_path, answer_path))
+    if grade_path:
+        write_grade(correct, incorrect, grade_path)
+    return correct, incorrect
+
+
+class IncrementalGrader:
+    def __init__(self, answer_key=()):
+        """
+        增量判分：缓存每道题的判分结果，只重新判改动过的答案
+        未作答的题目视为错误；每道题改动后的维护开销为 O(log n)，与题目总数基本无关
+        :param answer_key: 正确答案列表（Number对象或答案字符串）
+        """
+        self.answer_key = []
+        self.answers = []  # 用户答案
+        self.verdicts = []  # 每道题的判分结果
+        self.tree = [0]  # 答对标记的树状数组（下标从1开始），用于统计和查找第 k 道答对或答错的题目
+        self.correct_total = 0  # 答对的题目数量
+        self.dirty = set()  # 上次判分后改动过的题目序号（从0开始）
+        self.extend(answer_key)
+
+    def __len__(self):
+        return len(self.answer_key)
+
+    def extend(self, answer_key):
+        """追加题目的正确答案，新题目尚未作答"""
+        tree = self.tree
+        for answer in answer_key:
+            self.answer_key.append(answer)
+            self.answers.append('')
+            self.verdicts.append(False)
+            # 新节点 i 统计 (i - lowbit(i), i] 内答对的题目，其中新题目尚未答对
+            i = len(tree)
+            tree.append(self._prefix(i - 1) - self._prefix(i - (i & -i)))
+
+    def _prefix(self, i):
+        """前 i 道题中答对的数量"""
+        tree = self.tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _add(self, i, delta):
+        """第 i 道题（从1开始）的答对标记增加 delta"""
+        tree = self.tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _find(self, k, correct):
+        """返回第 k 道答对（correct 为 True）或答错的题目题号（从1开始）"""
+        tree = self.tree
+        n = len(tree) - 1
+        position = 0
+        step = 1 << (n.bit_length() - 1) if n else 0
+        while step:
+            node = position + step
+            if node <= n:
+                # 节点 node 恰好统计 (position, node] 这 step 道题
+                count = tree[node] if correct else step - tree[node]
+                if count < k:
+                    position = node
+                    k -= count
+            step >>= 1
+        return position + 1
+
+    def update(self, index, answer):
+        """记录第 index 道题（从0开始）的用户答案，答案改变时标记为待判"""
+        answer = answer.strip()
+        if index < len(self.answers) and self.answers[index] != answer:
+            self.answers[index] = answer
+            self.dirty.add(index)
+
+    def grade(self):
+        """
+        只重新判上次判分后改动过的题目，开销与改动的题目数量成正比
+        :return: 本次重新判分的题目序号列表（从0开始）
+        """
+        graded = sorted(self.dirty)
+        for index in graded:
+            verdict = answers_match(self.answers[index], self.answer_key[index])
+            if verdict != self.verdicts[index]:
+                self.verdicts[index] = verdict
+                delta = 1 if verdict else -1
+                self._add(index + 1, delta)
+                self.correct_total += delta
+        self.dirty.clear()
+        return graded
+
+    def correct_count(self):
+        """答对的题目数量"""
+        return self.correct_total
+
+    def incorrect_count(self):
+        """答错（含未作答）的题目数量"""
+        return len(self.answer_key) - self.correct_total
+
+    def correct(self, limit=None):
+        """
+        正确题号列表（从1开始）
+        :param limit: 只返回前 limit 个题号，每个题号的查找开销为 O(log n)；None 表示全部
+        """
+        if limit is None:
+            return [i for i, verdict in enumerate(self.verdicts, start=1) if verdict]
+        return [self._find(k, True) for k in range(1, min(limit, self.correct_total) + 1)]
+
+    def incorrect(self, limit=None):
+        """
+        错误题号列表（从1开始）
+        :param limit: 只返回前 limit 个题号，每个题号的查找开销为 O(log n)；None 表示全部
+        """
+        if limit is None:
+            return [i for i, verdict in enumerate(self.verdicts, start=1) if not verdict]
+        return [self._find(k, False) for k in range(1, min(limit, self.incorrect_count()) + 1)]
+
+    def write(self, grade_path="Grade.txt"):
+        """写入成绩文件，只在此时生成完整的题号列表"""
+        write_grade(self.correct(), self.incorrect(), grade_path)
+
+
+def grade_stream(lines, answer_key):
+    """
+    逐行比较答卷与答案表，答卷不会整体读入内存；缺少的答案视为错误，多余的行被忽略
+    :param lines: 用户答案行的可迭代对象，例如打开的文件
+    :param answer_key: 正确答案列表
+    :return: (正确题号列表, 错误题号列表)
+    """
+    correct = []
+    incorrect = []
+    lines = iter(lines)
+    for i, correct_answer in enumerate(answer_key, start=1):
+        if answers_match(next(lines, ""), correct_answer):
+            correct.append(i)
+        else:
+            incorrect.append(i)
+    return correct, incorrect
+
+
+def _init_grade_worker(answer_key):
+    """工作进程初始化时保存答案表，之后的任务只传递文件路径"""
+    global _worker_answer_key
+    _worker_answer_key = answer_key
+
+
+def _grade_submission(args):
+    """
+    在工作进程中批改一份答卷并写入成绩文件
+    :param args: (答卷路径, 成绩文件路径)
+    :return: (答卷路径, 正确题数, 错误题号列表)
+    """
+    submission_path, grade_path = args
+    with open(submission_path) as submission_file:
+        correct, incorrect = grade_stream(submission_file, _worker_answer_key)
+    write_grade(correct, incorrect, grade_path)
+    return submission_path, len(correct), incorrect
+
+
+def write_report(error_counts, submissions, total_correct, report_path):
+    """
+    写入汇总报告：答卷数量、平均得分和每道题的错误率
+    :param error_counts: 每道题答错的答卷数量
+    :param submissions: 答卷数量
+    :param total_correct: 所有答卷答对的题目总数
+    """
+    with open(report_path, "w") as report_file:
+        report_file.write(f"Submissions: {submissions}\n")
+        average = total_correct / submissions if submissions else 0
+        report_file.write(f"Average: {average:.2f}/{len(error_counts)}\n")
+        for i, wrong in enumerate(error_counts, start=1):
+            rate = wrong / submissions if submissions else 0
+            report_file.write(f"{i}: {wrong} wrong ({rate:.2%})\n")
+
+
+def grade_directory(submission_dir, exercise_path="Exercises.txt", answer_path="Answer.txt",
+                    output_dir=None, report_path=None, workers=None, pattern="*.txt"):
+    """
+    多进程批改目录下的所有答卷
+    每份答卷 name.txt 的成绩写入 output_dir/name.Grade.txt，汇总报告写入 report_path
+    答案表在每个工作进程中只传递一次，答卷逐行读取，工作进程的内存占用与答卷数量无关
+    :param submission_dir: 答卷目录，每个文件每行一个答案
+    :param exercise_path: 题目文件路径
+    :param answer_path: 答案文件路径
+    :param output_dir: 成绩文件目录，默认为答卷目录下的 grades 目录
+    :param report_path: 汇总报告路径，默认为成绩文件目录下的 Report.txt
+    :param workers: 工作进程数，None 表示使用 CPU 核数，1 表示在当前进程内批改
+    :param pattern: 答卷文件名的匹配模式，成绩文件目录中的 *.Grade.txt 与汇总报告不算作答卷
+    :return: (答卷数量, 每道题的错误数量列表)
+    """
+    answer_key = load_answer_key(exercise_path, answer_path)
+    if output_dir is None:
+        output_dir = os.path.join(submission_dir, "grades")
+    if report_path is None:
+        report_path = os.path.join(output_dir, "Report.txt")
+    os.makedirs(output_dir, exist_ok=True)
+    output_root = os.path.abspath(output_dir)
+    report = os.path.abspath(report_path)
+    tasks = []
+    for submission_path in sorted(glob.glob(os.path.join(submission_dir, pattern))):
+        path = os.path.abspath(submission_path)
+        # 成绩文件目录与答卷目录相同时，跳过之前生成的成绩文件和汇总报告
+        if path == report or (os.path.dirname(path) == output_root and path.endswith(".Grade.txt")):
+            continue
+        name = os.path.splitext(os.path.basename(submission_path))[0]
+        tasks.append((submission_path, os.path.join(output_dir, name + ".Grade.txt")))
+
+    error_counts = [0] * len(answer_key)
+    total_correct = 0
+    if workers == 1:
+        _init_grade_worker(answer_key)
+        results = map(_grade_submission, tasks)
+        executor = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_grade_worker,
+                                       initargs=(answer_key,))
+        results = executor.map(_grade_submission, tasks, chunksize=max(1, len(tasks) // 64))
+    try:
+        for _, correct_count, incorrect in results:
+            total_correct += correct_count
+            for i in incorrect:
+                error_counts[i - 1] += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    write_report(error_counts, len(tasks), total_correct, report_path)
+    return len(tasks), error_counts
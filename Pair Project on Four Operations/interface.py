@@ -1,7 +1,254 @@
 import tkinter as tk
 from function import *
-from PIL import Image, ImageTk, ImageEnhance
+from export import write_question_files
+from grading import parse_number, load_answer_key, IncrementalGrader, read_lines
+import os
+import queue
 import re
+import threading
+
+BACKGROUND_PATH = "background.png"
+BACKGROUND_CACHE_PATH = "background_cache.png"  # 缩放并调暗后的背景图缓存
+GENERATION_BATCH_SIZE = 500  # 后台生成时每批发送给界面的题目数量
+BATCHES_PER_POLL = 4  # 每次轮询最多插入文本框的批数，避免长时间占用事件循环
+POLL_INTERVAL = 50  # 轮询后台生成结果的间隔（毫秒）
+VISIBLE_ROWS = 10  # 题目视图中同时显示的行数
+RESULT_PREVIEW = 30  # 答题结果中最多列出的题号数量
+LIVE_GRADE_DELAY = 300  # 输入停止多久后自动判分（毫秒）
+GRADE_WRITE_DELAY = 2000  # 判分结果改变后多久写入成绩文件（毫秒），期间的多次改动合并为一次写入
+GENERATE_TIME_LIMIT = 60  # 后台生成的时间上限（秒），超时后保留已生成的题目
+
+
+def generate_in_background(max_value, num_questions, messages, cancel_event,
+                           exercise_path="Exercises.txt", answer_path="Answer.txt",
+                           batch_size=GENERATION_BATCH_SIZE, time_limit=GENERATE_TIME_LIMIT):
+    """
+    在后台线程中生成题目并流式写入文件，不直接操作界面，结果通过消息队列分批发送
+    题目边生成边写入临时文件，成功后再替换题目和答案文件，已发送的批次不再保留
+    消息为 ('batch', 题目列表, 答案表)、('done',)、('cancelled',)、('error', 错误信息)，
+    或提前停止、只生成部分题目时的 ('stopped', 原因)
+    :param messages: 消息队列
+    :param cancel_event: 取消事件，被设置后尽快停止生成，删除临时文件，原有文件保持不变
+    :param time_limit: 生成时间上限（秒），None 表示不限制
+    """
+    exercise_temp = exercise_path + ".tmp"
+    answer_temp = answer_path + ".tmp"
+    cancelled = []  # 生成过程中是否收到取消请求
+
+    def stream(exp):
+        """逐个产出题目，同时按批发送给界面；收到取消请求时提前结束"""
+        questions, answer_key = [], []
+        for question, answer in exp.iter_questions():
+            if cancel_event.is_set():
+                cancelled.append(True)
+                return
+            questions.append(question)
+            answer_key.append(parse_number(answer))
+            yield question, answer
+            if len(questions) >= batch_size:
+                messages.put(('batch', questions, answer_key))
+                questions, answer_key = [], []
+        if questions:
+            messages.put(('batch', questions, answer_key))
+
+    try:
+        exp = Expression(max_value, num_questions, time_limit=time_limit)
+        write_question_files(stream(exp), exercise_temp, answer_temp)
+        if cancelled:
+            remove_files(exercise_temp, answer_temp)
+            messages.put(('cancelled',))
+            return
+        os.replace(exercise_temp, exercise_path)
+        os.replace(answer_temp, answer_path)
+        if exp.status == Expression.COMPLETE:
+            messages.put(('done',))
+        else:
+            messages.put(('stopped', Expression.STATUS_MESSAGES[exp.status]))
+    except (CustomMathError, OSError) as e:
+        remove_files(exercise_temp, answer_temp)
+        messages.put(('error', str(e)))
+
+
+def remove_files(*paths):
+    """删除存在的文件"""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class VirtualList:
+    """虚拟列表的可见窗口位置，只记录第一行的序号，滚动计算与界面无关"""
+
+    def __init__(self, rows):
+        """
+        :param rows: 同时可见的行数
+        """
+        self.rows = rows
+        self.total = 0  # 总行数
+        self.first = 0  # 第一个可见行的序号
+
+    def clamp(self, first):
+        """把第一行的序号限制在有效范围内"""
+        return max(0, min(first, self.total - self.rows))
+
+    def set_total(self, total):
+        """更新总行数"""
+        self.total = total
+        self.first = self.clamp(self.first)
+
+    def scroll(self, amount):
+        """向下（正数）或向上（负数）滚动若干行"""
+        self.first = self.clamp(self.first + amount)
+
+    def moveto(self, fraction):
+        """滚动到总长度的指定比例处"""
+        self.first = self.clamp(int(fraction * self.total))
+
+    def yview(self, *args):
+        """处理 Scrollbar 的 command 回调参数：('moveto', 比例) 或 ('scroll', 数量, 'units'/'pages')"""
+        if args[0] == 'moveto':
+            self.moveto(float(args[1]))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.rows
+            self.scroll(amount)
+
+    def visible(self):
+        """返回可见行的序号范围"""
+        return range(self.first, min(self.first + self.rows, self.total))
+
+    def fractions(self):
+        """返回可见部分在总长度中的起止比例，用于 Scrollbar.set"""
+        if self.total == 0:
+            return 0.0, 1.0
+        return self.first / self.total, min(self.first + self.rows, self.total) / self.total
+
+
+class QuestionView:
+    def __init__(self, master, rows=VISIBLE_ROWS, width=40, on_change=None):
+        """
+        虚拟化的题目与答案视图：只为可见的行创建控件，滚动时复用这些控件
+        题目、用户答案与判分结果保存在列表中，内存和重绘开销与题目数量无关
+        :param master: 父控件
+        :param rows: 同时可见的行数
+        :param width: 题目列的宽度（字符数）
+        :param on_change: 用户答案改变时以 (题目序号, 答案) 调用的回调函数
+        """
+        self.on_change = on_change
+        self.frame = tk.Frame(master, bg='white')
+        self.window = VirtualList(rows)
+        self.questions = []  # 题目
+        self.answers = []  # 用户答案
+        self.verdicts = []  # 判分结果，None 表示未判分
+        self.labels = []
+        self.entries = []
+        self.variables = []  # 各可见行输入框的 StringVar
+        self.refreshing = False  # refresh 正在写入输入框，此时的改动不是用户输入
+        for row in range(rows):
+            label = tk.Label(self.frame, anchor='w', width=width, bg='white')
+            variable = tk.StringVar(self.frame)
+            entry = tk.Entry(self.frame, width=12, textvariable=variable)
+            label.grid(row=row, column=0, sticky='w')
+            entry.grid(row=row, column=1)
+            # 监听内容的修改而不是按键，鼠标中键粘贴、右键菜单粘贴等不经过键盘的输入同样会被记录
+            variable.trace_add('write', lambda *args, row=row: self.store(row))
+            for widget in (label, entry):
+                widget.bind('<MouseWheel>', self.on_wheel)
+                widget.bind('<Button-4>', self.on_wheel)
+                widget.bind('<Button-5>', self.on_wheel)
+            self.labels.append(label)
+            self.entries.append(entry)
+            self.variables.append(variable)
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.yview)
+        self.scrollbar.grid(row=0, column=2, rowspan=rows, sticky='ns')
+        self.refresh()
+
+    def clear(self):
+        """清空所有题目"""
+        self.questions, self.answers, self.verdicts = [], [], []
+        self.window.set_total(0)
+        self.refresh()
+
+    def extend(self, questions):
+        """追加题目，只重绘可见的行"""
+        self.questions.extend(questions)
+        self.answers.extend([''] * len(questions))
+        self.verdicts.extend([None] * len(questions))
+        self.window.set_total(len(self.questions))
+        self.refresh()
+
+    def load_answers(self, answers):
+        """用答案列表（例如答案文件的各行）填充用户答案"""
+        for i, answer in enumerate(answers[:len(self.answers)]):
+            self.answers[i] = answer.strip()
+            if self.on_change is not None:
+                self.on_change(i, self.answers[i])
+        self.refresh()
+
+    def set_verdict(self, index, verdict):
+        """更新一道题的判分结果，None 表示不显示"""
+        self.verdicts[index] = verdict
+
+    def store(self, row):
+        """把可见行输入框的内容写回用户答案列表，答案改变时通知回调函数"""
+        if self.refreshing:
+            return
+        index = self.window.first + row
+        if index < len(self.answers):
+            answer = self.variables[row].get()
+            if answer != self.answers[index]:
+                self.answers[index] = answer
+                if self.on_change is not None:
+                    self.on_change(index, answer)
+
+    def yview(self, *args):
+        """滚动条回调"""
+        self.window.yview(*args)
+        self.refresh()
+
+    def on_wheel(self, event):
+        """鼠标滚轮滚动，兼容 Windows/macOS 的 delta 与 X11 的 Button-4/5"""
+        if getattr(event, 'num', None) == 4 or getattr(event, 'delta', 0) > 0:
+            self.window.scroll(-1)
+        else:
+            self.window.scroll(1)
+        self.refresh()
+        return "break"
+
+    def refresh(self):
+        """把可见范围内的题目、答案和判分结果写入复用的控件"""
+        first = self.window.first
+        self.refreshing = True
+        try:
+            for row, (label, entry, variable) in enumerate(zip(self.labels, self.entries, self.variables)):
+                index = first + row
+                if index < len(self.questions):
+                    verdict = self.verdicts[index]
+                    mark = '' if verdict is None else (' ✓' if verdict else ' ✗')
+                    color = 'black' if verdict is None else ('green' if verdict else 'red')
+                    label.config(text=f"{index + 1}. {self.questions[index]}{mark}", fg=color)
+                    entry.config(state=tk.NORMAL)
+                    variable.set(self.answers[index])
+                else:
+                    label.config(text='', fg='black')
+                    variable.set('')
+                    entry.config(state=tk.DISABLED)
+        finally:
+            self.refreshing = False
+        self.scrollbar.set(*self.window.fractions())
+
+
+def format_indices(indices, limit=RESULT_PREVIEW, total=None):
+    """
+    格式化题号列表，超过 limit 个时只列出前面的部分
+    :param total: 题号总数，None 表示 len(indices)；indices 只含前面部分时使用
+    """
+    total = len(indices) if total is None else total
+    text = ', '.join(map(str, indices[:limit]))
+    if total > limit:
+        text += f" ... (共{total}题)"
+    return text
 
 
 class MathQuizApp:
@@ -16,18 +263,33 @@ class MathQuizApp:
 
     def setup_background(self):
         """ 设置背景图片和Canvas """
-        # 加载并调整背景图片
-        background_image = Image.open("background.png")
-        background_image = background_image.resize((700, 700), Image.Resampling.LANCZOS)
-        enhancer = ImageEnhance.Brightness(background_image)  # 调整亮度
-        background_image = enhancer.enhance(0.8)
-        self.background_photo = ImageTk.PhotoImage(background_image)
+        # 缓存比原图新时直接由 Tk 加载，跳过 PIL 的解码、缩放和调亮度
+        if not self.background_cache_valid():
+            self.build_background_cache()
+        self.background_photo = tk.PhotoImage(file=BACKGROUND_CACHE_PATH)
 
         # 创建Canvas组件用于显示背景
         self.canvas = tk.Canvas(self.root, width=700, height=700)
         self.canvas.pack(fill="both", expand=True)
         self.canvas.create_image(0, 0, image=self.background_photo, anchor="nw")
 
+    def background_cache_valid(self):
+        """ 判断背景图缓存是否存在且不旧于原图 """
+        try:
+            return os.path.getmtime(BACKGROUND_CACHE_PATH) >= os.path.getmtime(BACKGROUND_PATH)
+        except OSError:
+            return False
+
+    def build_background_cache(self):
+        """ 加载并调整背景图片，保存为 PNG 缓存 """
+        from PIL import Image, ImageEnhance
+
+        background_image = Image.open(BACKGROUND_PATH)
+        background_image = background_image.resize((700, 700), Image.Resampling.LANCZOS)
+        enhancer = ImageEnhance.Brightness(background_image)  # 调整亮度
+        background_image = enhancer.enhance(0.8)
+        background_image.save(BACKGROUND_CACHE_PATH)
+
     def setup_widgets(self):
         """ 初始化界面控件 """
         # 创建题目数量和最大值的输入框
@@ -36,17 +298,23 @@ class MathQuizApp:
         self.max_value_label = self.create_label("最大值:", 350, 120)
         self.max_value_entry = self.create_entry(350, 150)
 
-        # 创建生成题目按钮
+        # 创建生成题目按钮、取消按钮和进度显示
         self.generate_button = self.create_button("开始生成题目", self.generate_questions, 350, 190)
+        self.cancel_button = self.create_button("取消", self.cancel_generation, 450, 190)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_label = self.create_label("", 560, 190)
 
-        # 创建题目和答案显示区域
-        self.questions_label = self.create_label("题目:", 350, 240)
-        self.questions_text = self.create_text_area(350, 280, 10, 40)
-        self.answers_label = self.create_label("答案:", 350, 420)
-        self.answers_text = self.create_text_area(350, 460, 10, 40)
+        # 创建题目与答案视图，只为可见的行创建控件
+        self.questions_label = self.create_label("题目与答案:", 350, 240)
+        self.question_view = QuestionView(self.root, on_change=self.on_answer_changed)
+        self.grader = None  # 增量判分器，生成或加载题目后创建
+        self.grade_job = None  # 待执行的自动判分
+        self.write_job = None  # 待执行的成绩文件写入
+        self.canvas.create_window(350, 260, window=self.question_view.frame, anchor="n")
 
-        # 创建提交答案按钮
+        # 创建提交答案按钮和导入答案文件按钮
         self.submit_button = self.create_button("提交答案", self.check_answers, 350, 510)
+        self.import_button = self.create_button("导入答案文件", self.import_answers, 470, 510)
 
         # 创建答题结果显示区域
         self.results_label = self.create_label("答题结果:", 350, 550)
@@ -77,31 +345,68 @@ class MathQuizApp:
         return text_area
 
     def generate_questions(self):
-        """ 生成数学题目 """
+        """ 在后台线程中生成数学题目，界面保持响应 """
         try:
             # 获取用户输入的题目数量和最大值
             num_questions = self.validate_input(self.num_questions_entry.get())
             max_value = self.validate_input(self.max_value_entry.get())
+        except ValueError as e:
+            # 显示错误消息
+            self.show_error(str(e))
+            return
 
-            # 调用 function.py 中的 Expression 类生成题目
-            exp = Expression(max_value, num_questions)
-            self.questions, self.answers = exp.run()
+        # 清空文本框和上一次的结果
+        self.num_questions = num_questions
+        self.question_view.clear()
+        self.grader = IncrementalGrader()
+        self.generate_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress_label.config(text=f"进度: 0/{num_questions}")
 
-            # 清空文本框并显示生成的题目
-            self.questions_text.delete(1.0, tk.END)
-            self.answers_text.delete(1.0, tk.END)
-            for i, question in enumerate(self.questions, start=1):
-                self.questions_text.insert(tk.END, f"{i}. {question}\n")
+        # 调用 function.py 中的 Expression 类在后台生成题目
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = threading.Thread(target=generate_in_background,
+                                       args=(max_value, num_questions, self.messages, self.cancel_event),
+                                       daemon=True)
+        self.worker.start()
+        self.root.after(POLL_INTERVAL, self.poll_generation)
 
-            # 将题目和答案保存到文件
-            with open("Exercises.txt", "w") as question_file:
-                question_file.writelines(f"{q}\n" for q in self.questions)
-            with open("Answer.txt", "w") as answer_file:
-                answer_file.writelines(f"{a}\n" for a in self.answers)
+    def poll_generation(self):
+        """ 在事件循环中读取后台生成的结果，按批加入题目视图并更新进度 """
+        for _ in range(BATCHES_PER_POLL):
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] != 'batch':
+                self.finish_generation(message)
+                return
+            _, questions, answer_key = message
+            self.question_view.extend(questions)
+            self.grader.extend(answer_key)
+            self.progress_label.config(text=f"进度: {len(self.grader)}/{self.num_questions}")
+        self.root.after(POLL_INTERVAL, self.poll_generation)
 
-        except ValueError as e:
-            # 显示错误消息
-            self.show_error(str(e))
+    def cancel_generation(self):
+        """ 请求取消正在进行的生成 """
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+
+    def finish_generation(self, message):
+        """ 生成结束、取消或出错后恢复按钮状态 """
+        self.generate_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if message[0] == 'done':
+            self.progress_label.config(text=f"完成: {len(self.grader)}")
+        elif message[0] == 'cancelled':
+            self.progress_label.config(text=f"已取消: {len(self.grader)}")
+        elif message[0] == 'stopped':
+            self.progress_label.config(text=f"已停止: {len(self.grader)}/{self.num_questions}")
+            self.show_error(f"{message[1]}，只生成了 {len(self.grader)} 道题目")
+        else:
+            self.progress_label.config(text="")
+            self.show_error(message[1])
 
     def validate_input(self, value):
         """ 验证用户输入是否为有效的正整数 """
@@ -121,31 +426,83 @@ class MathQuizApp:
         ok_button = tk.Button(error_window, text="确定", command=error_window.destroy)
         ok_button.pack(pady=10)
 
-    def check_answers(self):
-        """ 检查用户输入的答案 """
-        # 获取用户输入的答案
-        user_answers = self.answers_text.get(1.0, tk.END).splitlines()
-
-        # 初始化正确和错误的题目列表
-        correct = []
-        incorrect = []
-
-        # 比较答案
-        for i, (user_answer, correct_answer) in enumerate(zip(user_answers, self.answers), start=1):
-            if user_answer.strip() == correct_answer.strip():
-                correct.append(i)
-            else:
-                incorrect.append(i)
-
-        # 显示结果
+    def import_answers(self):
+        """ 从文件导入用户答案，每行一个答案 """
+        from tkinter import filedialog
+
+        path = filedialog.askopenfilename(filetypes=[("文本文件", "*.txt"), ("所有文件", "*")])
+        if not path:
+            return
+        try:
+            self.load_existing_questions()
+            self.question_view.load_answers(read_lines(path))
+        except (OSError, CustomMathError) as e:
+            self.show_error(str(e))
+
+    def load_existing_questions(self):
+        """ 本次会话未生成题目时，加载已有的题目和答案文件，并创建判分器 """
+        if self.grader is None:
+            self.grader = IncrementalGrader(load_answer_key())
+            if os.path.exists("Exercises.txt"):
+                self.question_view.extend(read_lines("Exercises.txt"))
+
+    def on_answer_changed(self, index, answer):
+        """ 用户答案改变时标记该题待判，输入停止一段时间后自动判分 """
+        if self.grader is None:
+            return
+        self.grader.update(index, answer)
+        if self.grade_job is not None:
+            self.root.after_cancel(self.grade_job)
+        self.grade_job = self.root.after(LIVE_GRADE_DELAY, self.live_grade)
+
+    def live_grade(self):
+        """ 只重新判改动过的题目，更新这些题目的标记和结果摘要，并延迟写入成绩文件 """
+        self.grade_job = None
+        graded = self.grader.grade()
+        if not graded:
+            return
+        for index in graded:
+            self.question_view.set_verdict(index, self.grader.verdicts[index] if self.grader.answers[index] else None)
+        self.question_view.refresh()
+        self.show_results()
+        if self.write_job is not None:
+            self.root.after_cancel(self.write_job)
+        self.write_job = self.root.after(GRADE_WRITE_DELAY, self.write_grade_file)
+
+    def write_grade_file(self):
+        """ 将判分结果写入成绩文件 """
+        self.write_job = None
+        self.grader.write()
+
+    def show_results(self):
+        """ 显示答题结果摘要，只查找前 RESULT_PREVIEW 个题号，完整结果见成绩文件 """
+        correct_count = self.grader.correct_count()
+        incorrect_count = self.grader.incorrect_count()
+        correct = self.grader.correct(RESULT_PREVIEW)
+        incorrect = self.grader.incorrect(RESULT_PREVIEW)
         self.results_text.delete(1.0, tk.END)
-        self.results_text.insert(tk.END, f"正确题号: {', '.join(map(str, correct))}\n")
-        self.results_text.insert(tk.END, f"错误题号: {', '.join(map(str, incorrect))}\n")
+        self.results_text.insert(tk.END, f"正确: {correct_count}  错误: {incorrect_count}\n")
+        self.results_text.insert(tk.END, f"正确题号: {format_indices(correct, total=correct_count)}\n")
+        self.results_text.insert(tk.END, f"错误题号: {format_indices(incorrect, total=incorrect_count)}\n")
 
-        # 保存结果到文件
-        with open("Grade.txt", "w") as grade_file:
-            grade_file.write(f"Correct: {len(correct)} ({', '.join(map(str, correct))})\n")
-            grade_file.write(f"Wrong: {len(incorrect)} ({', '.join(map(str, incorrect))})\n")
+    def check_answers(self):
+        """ 提交答案：判完所有改动过的题目，标记全部题目并立即写入成绩文件 """
+        try:
+            self.load_existing_questions()
+        except (OSError, CustomMathError) as e:
+            self.show_error(str(e))
+            return
+        if self.grade_job is not None:
+            self.root.after_cancel(self.grade_job)
+            self.grade_job = None
+        self.grader.grade()
+        for index, verdict in enumerate(self.grader.verdicts[:len(self.question_view.verdicts)]):
+            self.question_view.set_verdict(index, verdict)
+        self.question_view.refresh()
+        self.show_results()
+        if self.write_job is not None:
+            self.root.after_cancel(self.write_job)
+        self.write_grade_file()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,100 @@
 # main.py
 # 主程序入口文件
 # 2024-09-16完成
-from interface import *     # 导入interface模块中的所有内容
+# 不带参数运行时启动图形界面；指定 -n 与 -r 时在命令行下生成题目，不加载 tkinter 和 PIL
+# 指定 --grade 时按 -e 与 -a 批改目录下的所有答卷
+# 启动时只导入 function.py，其余模块在用到的功能中才导入
+import argparse
+
+from function import Expression, CustomMathError
+
+GENERATE_TIME_LIMIT = 60  # 默认的生成时间上限（秒）
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="四则运算题目生成器")
+    parser.add_argument("-n", dest="number", type=int, help="生成题目的数量")
+    parser.add_argument("-r", dest="range", type=int, help="题目中数值的范围（不含）")
+    parser.add_argument("-e", dest="exercise", default="Exercises.txt", help="题目文件路径")
+    parser.add_argument("-a", dest="answer", default="Answer.txt", help="答案文件路径")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--constructive", action="store_true", help="按约束直接构造合法表达式")
+    parser.add_argument("--export", metavar="PATH", default=None,
+                        help="同时按列导出题目，格式由扩展名决定（.csv/.jsonl/.parquet）")
+    parser.add_argument("--max-attempts", type=int, default=None, help="生成候选表达式的总次数上限")
+    parser.add_argument("--time-limit", type=float, default=GENERATE_TIME_LIMIT,
+                        help=f"生成时间上限（秒），默认 {GENERATE_TIME_LIMIT}，0 表示不限制")
+    parser.add_argument("--history", metavar="PATH", default=None, help="已出题目过滤器文件，避免跨会话重复出题")
+    parser.add_argument("--grade", metavar="DIR", default=None, help="批改目录下的所有答卷")
+    parser.add_argument("--grade-output", metavar="DIR", default=None, help="成绩文件目录")
+    parser.add_argument("--workers", type=int, default=None, help="批改答卷的工作进程数")
+    args = parser.parse_args(argv)
+    if (args.number is None) != (args.range is None):
+        parser.error("-n 与 -r 需要同时指定")
+    if args.number is not None and (args.number <= 0 or args.range <= 0):
+        parser.error("-n 与 -r 必须是正整数")
+    return args
+
+
+def run_cli(args):
+    """在命令行下生成题目并流式写入文件，指定 --export 时在同一遍生成中按列导出，返回题目数量"""
+    from export import write_question_files, tee_question_files, export_questions
+
+    if args.history:
+        from seen_filter import SeenFilter
+        seen = SeenFilter(args.history)
+    else:
+        seen = None
+    try:
+        exp = Expression(args.range, args.number, constructive=args.constructive, seed=args.seed, seen=seen,
+                         max_attempts=args.max_attempts, time_limit=args.time_limit or None)
+        if args.export:
+            records = tee_question_files(exp.iter_records(), args.exercise, args.answer)
+            count = export_questions(records, args.export, seed=args.seed)
+        else:
+            count = write_question_files(exp.iter_questions(), args.exercise, args.answer)
+    finally:
+        if seen is not None:
+            seen.close()
+    if exp.status != Expression.COMPLETE:
+        print(f"{Expression.STATUS_MESSAGES[exp.status]}，只生成了 {count}/{args.number} 道题目")
+    print(f"已生成 {count} 道题目：{args.exercise}，{args.answer}")
+    if args.export:
+        print(f"已导出：{args.export}")
+    return count
+
+
+def run_grade(args):
+    """批改目录下的所有答卷，返回答卷数量"""
+    from grading import grade_directory
+
+    count, _ = grade_directory(args.grade, args.exercise, args.answer,
+                               output_dir=args.grade_output, workers=args.workers)
+    print(f"已批改 {count} 份答卷")
+    return count
+
+
+def run_gui():
+    """启动图形界面，仅在此时导入 tkinter 与 PIL"""
+    import tkinter as tk
+    from interface import MathQuizApp
 
-# 主函数
-if __name__ == "__main__":
     root = tk.Tk()          # 创建Tkinter根窗口
     app = MathQuizApp(root)      # 创建MathQuizApp实例，并将根窗口作为参数传递
     root.mainloop()             # 进入Tkinter事件循环
+
+
+# 主函数
+if __name__ == "__main__":
+    args = parse_args()
+    if args.number is None and args.grade is None:
+        run_gui()
+    else:
+        try:
+            if args.number is not None:
+                run_cli(args)
+            if args.grade is not None:
+                run_grade(args)
+        except (CustomMathError, OSError, ValueError, ImportError) as e:
+            raise SystemExit(f"发生错误: {e}")
@@ -0,0 +1,108 @@
+# seen_filter.py
+# 跨会话记录已出过的题目，基于内存映射文件的布隆过滤器
+#
+# 文件由 32 字节的文件头和位数组组成，启动时直接内存映射，无需解析历史题目文件。
+# 每道题以规范化键（见 Expression.canonical_key）的摘要确定 k 个位，全部为 1 时视为出过；
+# 可能把没出过的题误判为出过（概率约为 error_rate），但不会漏判。
+# 按 1% 的误判率，一千万道题约占 12 MB。
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+from function import CustomMathError
+
+MAGIC = b'SEEN'
+HEADER = struct.Struct('<4sIIIQQ')  # 魔数, 版本, 哈希函数个数, 保留, 位数, 已加入的题目数量
+VERSION = 1
+HEADER_SIZE = 32
+
+
+class SeenFilter:
+    def __init__(self, path, capacity=10000000, error_rate=0.01):
+        """
+        打开已有的过滤器文件，不存在时按容量与误判率创建
+        :param path: 过滤器文件路径
+        :param capacity: 预计加入的题目数量，仅在创建时使用
+        :param error_rate: 达到容量时的误判率，仅在创建时使用
+        """
+        if not os.path.exists(path):
+            if capacity < 1 or not 0 < error_rate < 1:
+                raise CustomMathError("容量必须大于等于1，误判率必须在0到1之间。")
+            bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            bits = (bits + 7) // 8 * 8
+            hashes = max(1, round(bits / capacity * math.log(2)))
+            with open(path, "wb") as filter_file:
+                filter_file.write(HEADER.pack(MAGIC, VERSION, hashes, 0, bits, 0).ljust(HEADER_SIZE, b'\0'))
+                filter_file.truncate(HEADER_SIZE + bits // 8)  # 位数组初始全为 0
+        self.path = path
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, version, self.hashes, _, self.bits, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or len(self.map) != HEADER_SIZE + self.bits // 8:
+            self.close()
+            raise CustomMathError(f"不是有效的题目过滤器文件：{path}")
+
+    @staticmethod
+    def digest(key):
+        """将规范化键转换为两个 64 位哈希值"""
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+        return struct.unpack('<QQ', digest)
+
+    def positions(self, key):
+        """返回键对应的 k 个位的位置（双重哈希）"""
+        h1, h2 = self.digest(key)
+        h2 |= 1  # 保证步长为奇数
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        data = self.map
+        for position in self.positions(key):
+            if not data[HEADER_SIZE + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        """
+        加入一个规范化键
+        :return: 加入前是否不在过滤器中
+        """
+        data = self.map
+        added = False
+        for position in self.positions(key):
+            offset = HEADER_SIZE + (position >> 3)
+            bit = 1 << (position & 7)
+            if not data[offset] & bit:
+                data[offset] |= bit
+                added = True
+        if added:
+            self.count += 1
+            HEADER.pack_into(data, 0, MAGIC, VERSION, self.hashes, 0, self.bits, self.count)
+        return added
+
+    def __len__(self):
+        """已加入的题目数量（估计值，误判的题目不计入）"""
+        return self.count
+
+    def error_rate(self):
+        """按当前题目数量估计的误判率"""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def flush(self):
+        """将修改写回磁盘"""
+        self.map.flush()
+
+    def close(self):
+        """写回修改并关闭文件"""
+        if not self.map.closed:
+            self.map.flush()
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
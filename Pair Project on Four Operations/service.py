@@ -0,0 +1,230 @@
+# service.py
+# 本地 HTTP/JSON 出题与判分服务，基于 asyncio，无需第三方依赖
+# 用法：python service.py --port 8000
+# 接口：
+#   POST /generate  {"count": 10, "max": 10, "seed": 1}  生成题目集，返回 {"id", "seed", "status", "questions"}
+#                   参数允许的题目不足或生成超时时只返回部分题目，status 说明原因（见 Expression.status）
+#   GET  /answers?id=<题目集编号>                         返回 {"id", "answers"}
+#   POST /grade     {"id": ..., "answers": [...]}          判分，返回 {"correct", "wrong"}
+
+import argparse
+import asyncio
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from function import Expression, CustomMathError, GENERATOR_VERSION
+from grading import grade_answers
+
+MAX_COUNT = 10000  # 单次请求最多生成的题目数量
+SET_CACHE_SIZE = 64  # 最多保存的题目集数量
+MAX_BODY = 1024 * 1024  # 请求体大小上限（字节）
+GENERATE_TIME_LIMIT = 10  # 单个题目集的生成时间上限（秒）
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    """带 HTTP 状态码的请求错误"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _generate_set(max, count, seed):
+    """在工作进程中生成题目集，返回 (题目列表, 答案列表, 生成状态)"""
+    exp = Expression(max, count, seed=seed, time_limit=GENERATE_TIME_LIMIT)
+    questions, answers = exp.run()
+    return questions, answers, exp.status
+
+
+def _int_field(data, name, default=None, minimum=1):
+    """读取并校验请求中的整数字段"""
+    value = data.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+        raise HTTPError(400, f"{name}必须是大于等于{minimum}的整数。")
+    return value
+
+
+def _str_field(data, name):
+    """读取并校验请求中的字符串字段"""
+    value = data.get(name)
+    if not isinstance(value, str):
+        raise HTTPError(400, f"{name}必须是字符串。")
+    return value
+
+
+class QuizService:
+    def __init__(self, executor=None, workers=None):
+        """
+        初始化出题与判分服务
+        :param executor: 执行生成任务的执行器，None 表示新建进程池
+        :param workers: 新建进程池时的工作进程数，None 表示使用 CPU 核数
+        """
+        self.executor = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+        self.sets = {}  # 题目集编号到 (题目列表, 答案列表, 生成状态)
+        self.pending = {}  # 正在生成的题目集编号到 Future，相同参数的并发请求共享同一个生成任务
+        self.generated = 0  # 实际提交到执行器的生成任务数量
+
+    @staticmethod
+    def set_id(max, count, seed):
+        """返回题目集编号，相同参数得到相同编号"""
+        return f"v{GENERATOR_VERSION}-m{max}-n{count}-s{seed}"
+
+    async def generate_set(self, max, count, seed):
+        """
+        返回题目集编号及 (题目列表, 答案列表, 生成状态)
+        已生成的题目集直接返回；相同参数正在生成时等待同一个任务，不重复提交
+        """
+        set_id = self.set_id(max, count, seed)
+        if set_id in self.sets:
+            return set_id, self.sets[set_id]
+        future = self.pending.get(set_id)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, _generate_set, max, count, seed)
+            self.pending[set_id] = future
+            self.generated += 1
+            future.add_done_callback(lambda done: self.finish_set(set_id, done))
+        # 某个请求被取消时不影响等待同一任务的其他请求
+        return set_id, await asyncio.shield(future)
+
+    def finish_set(self, set_id, future):
+        """生成任务结束时保存题目集"""
+        del self.pending[set_id]
+        if future.cancelled() or future.exception() is not None:
+            return
+        if len(self.sets) >= SET_CACHE_SIZE:
+            del self.sets[next(iter(self.sets))]  # 淘汰最早生成的题目集
+        self.sets[set_id] = future.result()
+
+    def get_set(self, set_id):
+        """返回已生成的题目集，不存在时抛出 404 错误"""
+        if set_id not in self.sets:
+            raise HTTPError(404, f"题目集不存在：{set_id}")
+        return self.sets[set_id]
+
+    async def handle_generate(self, data):
+        count = _int_field(data, "count")
+        max = _int_field(data, "max", minimum=2)
+        seed = _int_field(data, "seed", random.randrange(2 ** 32), minimum=0)
+        if count > MAX_COUNT:
+            raise HTTPError(400, f"count不能超过{MAX_COUNT}。")
+        set_id, (questions, answers, status) = await self.generate_set(max, count, seed)
+        return {"id": set_id, "seed": seed, "status": status, "questions": questions}
+
+    async def handle_answers(self, query):
+        set_id = query.get("id", [""])[0]
+        return {"id": set_id, "answers": self.get_set(set_id)[1]}
+
+    async def handle_grade(self, data):
+        questions, answers, status = self.get_set(_str_field(data, "id"))
+        user_answers = data.get("answers")
+        if not isinstance(user_answers, list) or not all(isinstance(a, str) for a in user_answers):
+            raise HTTPError(400, "answers必须是字符串列表。")
+        if len(user_answers) != len(answers):
+            raise HTTPError(400, f"answers的数量应为{len(answers)}。")
+        correct, incorrect = grade_answers(user_answers, answers)
+        return {"correct": correct, "wrong": incorrect}
+
+    async def dispatch(self, method, target, body):
+        """根据请求方法与路径调用对应的处理函数，返回响应数据"""
+        url = urlsplit(target)
+        routes = {"/generate": ("POST", self.handle_generate),
+                  "/answers": ("GET", self.handle_answers),
+                  "/grade": ("POST", self.handle_grade)}
+        if url.path not in routes:
+            raise HTTPError(404, f"未知的路径：{url.path}")
+        expected, handler = routes[url.path]
+        if method != expected:
+            raise HTTPError(405, f"{url.path}只支持{expected}请求。")
+        if method == "GET":
+            return await handler(parse_qs(url.query))
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的JSON。")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "请求体必须是JSON对象。")
+        return await handler(data)
+
+    async def handle_connection(self, reader, writer):
+        """处理一个连接上的请求，支持 keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    parts = request_line.decode("latin-1").split()
+                    if len(parts) != 3:
+                        raise HTTPError(400, "请求行格式错误。")
+                    method, target, _ = parts
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HTTPError(413, "请求体过大。")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (CustomMathError, ValueError) as e:
+                    status, payload = 400, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"服务内部错误：{e}"}
+                content = json.dumps(payload, ensure_ascii=False).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(content)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """开始监听，返回 asyncio.Server 对象"""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        """关闭执行器"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(host, port, workers):
+    service = QuizService(workers=workers)
+    server = await service.start(host, port)
+    print(f"服务已启动：http://{host}:{server.sockets[0].getsockname()[1]}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="四则运算出题与判分 HTTP 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--workers", type=int, default=None, help="生成题目的工作进程数")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
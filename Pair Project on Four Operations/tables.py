@@ -0,0 +1,141 @@
+# tables.py
+# 小范围 max 的操作数枚举与运算结果表，按需构建并按 max 缓存
+#
+# Number(max) 可能生成的最简操作数只有有限个（max=10 时 280 个），
+# 为每个 max 枚举一次全部操作数及其生成概率，并用 numpy 一次算出全部运算结果：
+#   numerators[op][i * n + j], denominators[op][i * n + j]
+#                      第 i 个与第 j 个操作数运算结果的最简假分数，除数为零时分母为 0
+#   valid_mask(op, i)  整数位掩码，第 j 位为 1 表示结果存在且非负
+# 每个结果只占两个 int32，max=10 的四张表共约 2.5 MB；Number 对象在查表时才创建（并驻留）
+# 两个操作数都在表中时，运算只是一次查表，不再构造 Fraction；
+# 生成二元子表达式时右操作数直接从有效位中抽取（见 sample_pair），不会生成再丢弃非法的操作数对
+# 结果表的大小随 max 的四次方增长，而查表相对整数运算的优势很小，只在 max 不超过 TABLE_MAX 时使用，
+# 实测见 benchmark.py 的 tables 基准
+
+import bisect
+import itertools
+
+import numpy as np
+
+from function import Number, Fraction, CustomMathError, OPERATORS
+
+TABLE_MAX = 12  # 支持结果表的最大 max（每张表约 8 MB），更大时表的内存按四次方增长、构建变慢，不再使用结果表
+_tables = {}  # max 到 OperationTable 的缓存，最多 TABLE_MAX - 1 张表
+
+
+class OperationTable:
+    def __init__(self, max):
+        """
+        枚举 Number(max) 可能生成的所有最简操作数，并计算其生成概率
+        :param max: 生成数字的最大值
+        """
+        if not isinstance(max, int) or max < 2 or max > TABLE_MAX:
+            raise CustomMathError(f"结果表只支持2到{TABLE_MAX}之间的max。")
+        self.max = max
+        weights = {}
+        # 与 Number.__new__ 的抽样过程一致：整数与分母均匀选择，一半概率带分数部分
+        for integer in range(max):
+            for denominator in range(1, max):
+                for numerator in range(denominator + 1):
+                    improper = integer * denominator + numerator
+                    adjusted = integer - improper // (max * denominator) if improper >= max * denominator else integer
+                    weight = 0.5 if numerator == 0 else 0.5 / denominator
+                    number = Number(nums=(adjusted, numerator, denominator))
+                    weights[number] = weights.get(number, 0) + weight
+        self.operands = sorted(weights)  # 按数值从小到大排列的操作数
+        self.index = {number: i for i, number in enumerate(self.operands)}  # 操作数到序号
+        self.cum_weights = list(itertools.accumulate(weights[number] for number in self.operands))
+        self.numerators = {}  # 运算符到展平的结果分子数组
+        self.denominators = {}  # 运算符到展平的结果分母数组，除数为零处为 0
+        n1 = np.array([number.improper()[0] for number in self.operands], dtype=np.int64)[:, None]
+        d1 = np.array([number.denominator for number in self.operands], dtype=np.int64)[:, None]
+        n2, d2 = n1.T, d1.T
+        for op, (numerator, denominator) in {
+                ' + ': (n1 * d2 + n2 * d1, d1 * d2),
+                ' - ': (n1 * d2 - n2 * d1, d1 * d2),
+                ' * ': (n1 * n2, d1 * d2),
+                ' % ': (n1 * d2, d1 * n2)}.items():
+            gcd = np.gcd(numerator, denominator)
+            gcd[gcd == 0] = 1  # 0 % 0 的分子分母都为 0，保持分母为 0
+            self.numerators[op] = (numerator // gcd).astype(np.int32).ravel()
+            self.denominators[op] = (denominator // gcd).astype(np.int32).ravel()
+        self.full_mask = (1 << len(self.operands)) - 1
+
+    def __len__(self):
+        return len(self.operands)
+
+    def sample(self, rng):
+        """按 Number(max) 的分布随机抽取一个操作数，只消耗一个随机数"""
+        return self.operands[bisect.bisect(self.cum_weights, rng.random() * self.cum_weights[-1])]
+
+    def entry(self, op, i, j):
+        """返回第 i 个与第 j 个操作数的运算结果，除数为零时返回 None"""
+        k = i * len(self.operands) + j
+        denominator = self.denominators[op].item(k)
+        if denominator == 0:
+            return None
+        return Number.from_improper(self.numerators[op].item(k), denominator)
+
+    def valid_mask(self, op, i):
+        """
+        返回第 i 个操作数作左操作数时的有效位掩码，第 j 位表示与第 j 个操作数的运算结果存在且非负
+        操作数都非负且按数值排列，因此无需计算结果：减法时 j <= i 有效，除法时除第 0 个操作数（零）外都有效
+        """
+        if op == ' - ':
+            return (1 << (i + 1)) - 1
+        if op == ' % ':
+            return self.full_mask ^ 1
+        return self.full_mask
+
+    def sample_valid(self, op, i, rng):
+        """
+        按 Number(max) 的分布，从 valid_mask(op, i) 的置位中抽取右操作数，返回其序号
+        没有有效的右操作数时返回 None
+        """
+        mask = self.valid_mask(op, i)
+        if not mask:
+            return None
+        cum_weights = self.cum_weights
+        low = (mask & -mask).bit_length() - 1  # 最低置位
+        high = mask.bit_length()  # 最高置位之后
+        start = cum_weights[low - 1] if low else 0.0
+        span = cum_weights[high - 1] - start
+        while True:
+            # 只在最低与最高置位之间抽样；有效位连续时一次即可抽中
+            j = bisect.bisect(cum_weights, start + rng.random() * span)
+            if mask >> j & 1:
+                return j
+
+    def sample_pair(self, op, rng):
+        """抽取运算结果存在且非负的一对操作数 (左, 右)：左操作数按原分布抽取，右操作数只在有效位中抽取"""
+        while True:
+            i = bisect.bisect(self.cum_weights, rng.random() * self.cum_weights[-1])
+            j = self.sample_valid(op, i, rng)
+            if j is not None:
+                return self.operands[i], self.operands[j]
+
+    def count_valid(self, op):
+        """返回使用运算符 op 时结果存在且非负的有序操作数对数量"""
+        return sum(bin(self.valid_mask(op, i)).count('1') for i in range(len(self.operands)))
+
+    def calculate(self, f1, f2, op):
+        """
+        计算 f1 op f2，两个操作数都在表中时直接查表，否则使用 Fraction 计算
+        除数为零时抛出 CustomMathError
+        """
+        i = self.index.get(f1)
+        j = self.index.get(f2)
+        if i is None or j is None:
+            return Fraction(f1, f2, op).calculate_fractions()
+        result = self.entry(op, i, j)
+        if result is None:
+            raise CustomMathError("除数不能为零。", CustomMathError.ZERO_DIVISOR)
+        return result
+
+
+def get_table(max):
+    """返回 max 对应的结果表，首次调用时构建，之后从缓存返回"""
+    table = _tables.get(max)
+    if table is None:
+        table = _tables[max] = OperationTable(max)
+    return table
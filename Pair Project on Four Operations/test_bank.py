@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from function import Expression, CustomMathError
+from bank import QuestionBank
+
+
+class TestQuestionBank(unittest.TestCase):
+    def test_get_is_cached(self):
+        # Test 1: A stored set is returned without regeneration and survives reopening
+        with tempfile.TemporaryDirectory() as tmp:
+            bank = QuestionBank(tmp)
+            questions, answers = bank.get(10, 30, seed=1)
+            expected = [list(column) for column in zip(*Expression(10, 30, seed=1).iter_questions())]
+            self.assertEqual([questions, answers], expected)
+            key = QuestionBank.key(10, 30, 1)
+            modified = os.path.getmtime(os.path.join(tmp, key + ".txt"))
+            self.assertEqual(QuestionBank(tmp).get(10, 30, seed=1), (questions, answers))
+            self.assertEqual(os.path.getmtime(os.path.join(tmp, key + ".txt")), modified)
+
+            # Test 2: Sets must be seeded
+            with self.assertRaises(CustomMathError):
+                bank.get(10, 30, seed=None)
+
+    def test_sample(self):
+        # Test 3: Random slices come from the largest stored set for max
+        with tempfile.TemporaryDirectory() as tmp:
+            bank = QuestionBank(tmp)
+            bank.build(10, 20, seed=1)
+            bank.build(10, 200, seed=2)
+            questions, answers = bank.sample(10, 50, seed=3)
+            all_questions, all_answers = bank.get(10, 200, seed=2)
+            self.assertEqual(len(set(questions)), 50)
+            for question, answer in zip(questions, answers):
+                self.assertEqual(all_answers[all_questions.index(question)], answer)
+            self.assertEqual(bank.sample(10, 50, seed=3), (questions, answers))
+            with self.assertRaises(CustomMathError):
+                bank.sample(10, 500)
+
+    def test_eviction(self):
+        # Test 4: The least recently used set is evicted when over the size limit
+        with tempfile.TemporaryDirectory() as tmp:
+            bank = QuestionBank(tmp, max_bytes=0)
+            bank.build(10, 50, seed=1)
+            bank.build(10, 50, seed=2)
+            self.assertEqual(list(bank.index), [QuestionBank.key(10, 50, 2)])
+            self.assertFalse(os.path.exists(os.path.join(tmp, QuestionBank.key(10, 50, 1) + ".txt")))
+
+
+if __name__ == '__main__':
+    unittest.main()
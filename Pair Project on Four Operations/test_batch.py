@@ -0,0 +1,58 @@
+import unittest
+from function import Expression, CustomMathError
+from batch import BatchExpression
+
+
+class TestBatchExpression(unittest.TestCase):
+    def test_matches_scalar_calculation(self):
+        # Test 1: Vectorized results equal Fraction.calculate_fractions for every row
+        engine = BatchExpression(10, 1, seed=1)
+        batch = engine.sample(2000)
+        numerator, denominator, valid, _ = engine.evaluate(batch)
+        answers = engine.strings_of(numerator, denominator, cache=False)
+        scalar = Expression(10, 1)
+        for row in range(2000):
+            exp_list = engine.expression_list(batch, row)
+            try:
+                expected = str(scalar.calculate_answer(exp_list))
+            except CustomMathError:
+                expected = None
+            self.assertEqual(answers[row] if valid[row] else None, expected)
+
+    def test_run(self):
+        # Test 2: Generate the requested number of unique questions
+        questions, answers = BatchExpression(10, 500, seed=2).run()
+        self.assertEqual(len(questions), 500)
+        self.assertEqual(len(answers), 500)
+        self.assertEqual(len(set(questions)), 500)
+        for question in questions:
+            self.assertRegex(question, r'^[\d\s\+\-\*\%\(\)\'\/]+$')
+
+        # Test 3: The same seed reproduces the same output
+        self.assertEqual(BatchExpression(10, 50, seed=3).run(), BatchExpression(10, 50, seed=3).run())
+
+    def test_invalid_max(self):
+        # Test 4: max must allow a non-empty denominator range
+        with self.assertRaises(CustomMathError):
+            BatchExpression(1, 10)
+
+    def test_bounded_run(self):
+        # Test 5: Infeasible and limited runs stop with partial results and a status
+        engine = BatchExpression(2, 10000, seed=1)
+        questions, answers = engine.run()
+        self.assertTrue(0 < len(questions) == len(answers) < 10000)
+        self.assertEqual(len(set(questions)), len(questions))
+        self.assertEqual(engine.status, Expression.INFEASIBLE)
+        engine = BatchExpression(10, 1000, seed=1, max_attempts=100)
+        self.assertLess(len(engine.run()[0]), 1000)
+        self.assertEqual((engine.status, engine.generation_times), (Expression.ATTEMPT_LIMIT, 100))
+        engine = BatchExpression(10, 10 ** 6, seed=1, time_limit=0.05)
+        engine.run()
+        self.assertEqual(engine.status, Expression.TIME_LIMIT)
+        engine = BatchExpression(10, 50, seed=1)
+        engine.run()
+        self.assertEqual(engine.status, Expression.COMPLETE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from benchmark import measure, compare, main
+
+
+def fixed_results(throughput, peak_bytes=1000):
+    """返回固定的基准测试结果，避免单元测试依赖真实计时"""
+    def runner(quick):
+        return {'fraction%': {'ops': 100, 'seconds': 100 / throughput, 'throughput': throughput,
+                              'peak_bytes': peak_bytes},
+                'generate_expressions[max=10,n=100]': {'ops': 100, 'seconds': 100 / throughput,
+                                                       'throughput': throughput, 'peak_bytes': peak_bytes,
+                                                       'generation_times': 120, 'acceptance_rate': 100 / 120}}
+    return runner
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare(self):
+        # Test 1: Throughput drops and memory growth beyond tolerance are regressions
+        baseline = {'a': {'throughput': 100.0, 'peak_bytes': 1000}, 'b': {'throughput': 100.0, 'peak_bytes': 1000}}
+        results = {'a': {'throughput': 90.0, 'peak_bytes': 1100}, 'b': {'throughput': 50.0, 'peak_bytes': 2000}}
+        regressions = compare(results, baseline, tolerance=0.3)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith('b:') for r in regressions))
+
+        # Test 4: Values exactly at the tolerance pass; benchmarks missing from the results are skipped
+        results = {'a': {'throughput': 70.0, 'peak_bytes': 1300}}
+        self.assertEqual(compare(results, baseline, tolerance=0.3), [])
+        self.assertEqual(len(compare(results, baseline, tolerance=0.2)), 2)
+
+    def test_measure(self):
+        # Test 2: The best of the repeated timings is reported, using an injected clock
+        ticks = iter([0.0, 5.0, 10.0, 12.0, 20.0, 27.0])
+        calls = []
+        seconds, peak, result = measure(lambda: calls.append(1) or len(calls), repeat=3,
+                                        clock=lambda: next(ticks))
+        self.assertEqual(seconds, 2.0)
+        self.assertEqual(result, 3)
+        self.assertEqual(len(calls), 4)
+        self.assertGreaterEqual(peak, 0)
+
+    def test_save_and_check(self):
+        # Test 3: --save writes a JSON baseline; --check passes on equal results and fails on regressions
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()) as output:
+            path = os.path.join(tmp, "baseline.json")
+            self.assertEqual(main(["--quick", "--save", "--baseline", path], runner=fixed_results(1000.0)), 0)
+            with open(path) as baseline_file:
+                self.assertEqual(json.load(baseline_file), fixed_results(1000.0)(True))
+            self.assertEqual(main(["--check", "--baseline", path], runner=fixed_results(800.0)), 0)
+            self.assertEqual(main(["--check", "--baseline", path], runner=fixed_results(500.0)), 1)
+            self.assertEqual(main(["--check", "--baseline", path, "--tolerance", "0.6"],
+                                  runner=fixed_results(500.0)), 0)
+            self.assertEqual(main(["--check", "--baseline", path], runner=fixed_results(1000.0, 5000)), 1)
+        self.assertIn("退化: fraction%", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
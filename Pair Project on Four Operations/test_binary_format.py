@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from function import Expression, CustomMathError
+from export import write_question_files
+from binary_format import (encode_question, decode_question, write_binary, ExerciseFile,
+                           text_to_binary, binary_to_text)
+
+
+class TestBinaryFormat(unittest.TestCase):
+    def test_encode_decode(self):
+        # Test 1: Postfix encoding keeps parentheses, including redundant ones
+        for question in ["1 + 2", "(1'1/2 + 3) % 2", "4 + (1 + 2)", "(3 % 2) - (1/2 * 1)", "7 - 2 - 1"]:
+            tokens, operands = encode_question(question)
+            self.assertEqual(decode_question(tokens, [o.integer for o in operands],
+                                             [o.numerator for o in operands],
+                                             [o.denominator for o in operands]), question)
+
+    def test_round_trip_and_random_access(self):
+        # Test 2: Text -> binary -> text reproduces both files exactly
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            binary_path = os.path.join(tmp, "Exercises.exb")
+            pairs = list(Expression(10, 200, seed=1).iter_questions())
+            write_question_files(pairs, exercise_path, answer_path)
+            self.assertEqual(text_to_binary(exercise_path, answer_path, binary_path), 200)
+            binary_to_text(binary_path, os.path.join(tmp, "E2.txt"), os.path.join(tmp, "A2.txt"))
+            for original, copy in ((exercise_path, "E2.txt"), (answer_path, "A2.txt")):
+                with open(original) as a, open(os.path.join(tmp, copy)) as b:
+                    self.assertEqual(a.read(), b.read())
+
+            # Test 3: Random access and zero-copy slices
+            exercises = ExerciseFile(binary_path)
+            self.assertEqual(len(exercises), 200)
+            self.assertEqual(exercises[137], pairs[137])
+            block = exercises[10:20]
+            self.assertEqual(len(block), 10)
+            self.assertIsNotNone(block.base)
+            del block, exercises
+
+    def test_limits(self):
+        # Test 4: Questions with too many operators and foreign files are rejected
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "x.exb")
+            with self.assertRaises(CustomMathError):
+                write_binary([("1 + 2 + 3", "6")], path, max_operators=1)
+            with open(path, "wb") as binary_file:
+                binary_file.write(b"not a binary exercise file......")
+            with self.assertRaises(CustomMathError):
+                ExerciseFile(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
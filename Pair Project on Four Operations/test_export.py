@@ -0,0 +1,101 @@
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from function import Expression
+from export import write_question_files, tee_question_files, read_question_files, export_questions
+
+
+class TestExport(unittest.TestCase):
+    def test_write_question_files(self):
+        # Test 1: Stream pairs from iter_questions into both files
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            exp = Expression(10, 25, seed=1)
+            count = write_question_files(exp.iter_questions(), exercise_path, answer_path, chunk_size=7)
+            self.assertEqual(count, 25)
+            with open(exercise_path) as question_file, open(answer_path) as answer_file:
+                questions = question_file.read().splitlines()
+                answers = answer_file.read().splitlines()
+            self.assertEqual(len(questions), 25)
+            self.assertEqual(len(answers), 25)
+
+            # Test 2: iter_questions keeps no per-question lists
+            self.assertEqual(exp.expression_lists, [])
+            self.assertEqual(exp.questions, [])
+            # 判重集合只保存固定宽度的摘要
+            self.assertEqual(len(exp.expressions), 25)
+            self.assertTrue(all(isinstance(key, int) and key.bit_length() <= 64 for key in exp.expressions))
+
+    def test_invalid_chunk_size(self):
+        # Test 3: chunk_size must be positive
+        with self.assertRaises(ValueError):
+            write_question_files([], os.devnull, os.devnull, chunk_size=0)
+
+    def test_columnar_export(self):
+        # Test 4: CSV and JSONL rows carry the operator and numeric answer columns
+        with tempfile.TemporaryDirectory() as tmp:
+            records = list(Expression(10, 50, seed=2).iter_records())
+            pairs = [(question, answer) for question, answer, _ in records]
+            self.assertEqual(pairs, list(Expression(10, 50, seed=2).iter_questions()))
+            jsonl_path = os.path.join(tmp, "set.jsonl")
+            csv_path = os.path.join(tmp, "set.csv")
+            self.assertEqual(export_questions(records, jsonl_path, seed=2, chunk_size=7), 50)
+            self.assertEqual(export_questions(iter(records), csv_path, seed=2, chunk_size=7), 50)
+            with open(jsonl_path) as file:
+                rows = [json.loads(line) for line in file]
+            with open(csv_path, newline="") as file:
+                csv_rows = list(csv.DictReader(file))
+            self.assertEqual([(row['question'], row['answer']) for row in rows], pairs)
+            for row, csv_row, record in zip(rows, csv_rows, records):
+                self.assertEqual(row['operators'], record[2])
+                self.assertEqual(row['operator_count'], len(row['operators']))
+                self.assertEqual(sorted(row['operators']), sorted(token for token in row['question'].split()
+                                                                  if token in ('+', '-', '*', '%')))
+                self.assertEqual(csv_row['operators'], ' '.join(row['operators']))
+                self.assertEqual(int(csv_row['answer_numerator']), row['answer_numerator'])
+                self.assertEqual(row['seed'], 2)
+            row = next(r for r in rows if "/" in r['answer'])
+            numerator, denominator = row['answer_numerator'], row['answer_denominator']
+            self.assertIn(f"/{denominator}", row['answer'])
+            self.assertGreater(numerator, 0)
+
+            # Test 5: Existing text files can be streamed back; unknown formats are rejected
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            write_question_files(pairs, exercise_path, answer_path)
+            self.assertEqual(list(read_question_files(exercise_path, answer_path)), pairs)
+            with self.assertRaises(ValueError):
+                export_questions(records, os.path.join(tmp, "set.xlsx"))
+
+            # Test 6: Seeds outside the 64-bit range are rejected the same way for every format
+            for name in ("set.csv", "set.jsonl", "set.parquet"):
+                for seed in (2 ** 63, "2", True):
+                    with self.assertRaises(ValueError):
+                        export_questions(records, os.path.join(tmp, name), seed=seed)
+
+            # Test 7: Text files and a columnar export are written in one pass
+            tee_exercise = os.path.join(tmp, "TeeExercises.txt")
+            tee_answer = os.path.join(tmp, "TeeAnswer.txt")
+            self.assertEqual(export_questions(tee_question_files(iter(records), tee_exercise, tee_answer, 7),
+                                              jsonl_path, seed=-1), 50)
+            self.assertEqual(list(read_question_files(tee_exercise, tee_answer)), pairs)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow 未安装")
+    def test_parquet_export(self):
+        # Test 8: Parquet output is written in row groups of chunk_size rows
+        import pyarrow.parquet as pq
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "set.parquet")
+            self.assertEqual(export_questions(Expression(10, 50, seed=2).iter_records(), path, seed=2,
+                                              chunk_size=20), 50)
+            parquet_file = pq.ParquetFile(path)
+            self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+            self.assertEqual(parquet_file.read().num_rows, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
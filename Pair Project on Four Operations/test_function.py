@@ -1,5 +1,12 @@
 import unittest
-from function import Number, Fraction, Expression, CustomMathError
+import json
+import random
+import fractions
+from unittest.mock import patch
+from function import Number, Fraction, Expression, CustomMathError, GenerationStats, generate_parallel, \
+    ExpressionNode, analyze, leaf, combine, finish, Quotas, CalculationCache, count_operands, estimate_capacity, \
+    exact_capacity, AcceptanceWindow
+from grading import parse_expression, evaluate, parse_number
 
 
 class TestMathFunctions(unittest.TestCase):
@@ -23,6 +30,24 @@ class TestMathFunctions(unittest.TestCase):
         num.reduce_fraction()
         self.assertEqual(str(num), "2/3")
 
+    def test_number_immutable_and_interned(self):
+        # Test 21: Numbers are always reduced and interned by value
+        num = Number(nums=(0, 4, 6))
+        self.assertIs(num, Number(nums=(0, 2, 3)))
+        self.assertEqual((num.integer, num.numerator, num.denominator), (0, 2, 3))
+        self.assertEqual(str(Number(nums=(1, 7, 4))), "2'3/4")
+
+        # Test 22: Numbers cannot be mutated
+        with self.assertRaises(AttributeError):
+            num.integer = 5
+
+        # Test 23: Exact comparisons and hashing
+        self.assertLess(Number(nums=(0, 1, 3)), Number(nums=(0, 1, 2)))
+        self.assertGreaterEqual(Number(nums=(2, 0, 1)), 2)
+        self.assertEqual(Number(nums=(0, 0, 5)), 0)
+        self.assertEqual(hash(Number(nums=(3, 0, 1))), hash(3))
+        self.assertEqual(len({Number(nums=(0, 1, 2)), Number(nums=(0, 2, 4))}), 1)
+
     def test_fraction_calculation(self):
         # Test 5: Addition
         f1 = Fraction(Number(nums=(1, 1, 2)), Number(nums=(2, 1, 4)), ' + ')
@@ -55,11 +80,281 @@ class TestMathFunctions(unittest.TestCase):
         for question in questions:
             self.assertRegex(question, r'^[\d\s\+\-\*\%\(\)\'\/]+$')
 
+    def test_canonical_key(self):
+        # Test 14: Commutative and associative variants share one key
+        exp = Expression(10, 1)
+        a, b, c = Number(nums=(2, 0, 1)), Number(nums=(3, 0, 1)), Number(nums=(0, 1, 2))
+        key_1 = exp.canonical_key([[a, ' + ', b]])
+        key_2 = exp.canonical_key([[b, ' + ', a]])
+        self.assertEqual(key_1, key_2)
+        key_3 = exp.canonical_key([[a, ' + ', b], [' + ', c]])
+        key_4 = exp.canonical_key([[c, ' + ', b], [' + ', a]])
+        self.assertEqual(key_3, key_4)
+
+        # Test 15: Non-commutative operators keep operand order
+        key_5 = exp.canonical_key([[b, ' - ', a]])
+        key_6 = exp.canonical_key([[a, ' - ', b]])
+        self.assertNotEqual(key_5, key_6)
+
+        # Test 16: Generated expressions contain no duplicates
+        def normal_form(node):
+            # 独立于 canonical_key 的规范形式：展开 + 与 * 的结合链，按文本排序操作数
+            if not isinstance(node, ExpressionNode):
+                return str(node)
+            if node.op in [' + ', ' * ']:
+                operands = []
+                for child in (node.left, node.right):
+                    form = normal_form(child)
+                    if isinstance(form, tuple) and form[0] == node.op:
+                        operands.extend(form[1])
+                    else:
+                        operands.append(form)
+                return node.op, tuple(sorted(operands, key=repr))
+            return node.op, normal_form(node.left), normal_form(node.right)
+
+        exp = Expression(3, 3000, seed=4)
+        questions, _ = exp.run()
+        parsed = [parse_expression(question) for question in questions]
+        forms = [normal_form(tree) for tree in parsed]
+        self.assertEqual(len(forms), 3000)
+        self.assertEqual(len(set(forms)), 3000)
+        # 打印出的结构与判重所用的结构一致，例如 1 + (1 - 0 * 2) 不会打印成 1 + 1 - 0 * 2
+        for tree, exp_list in zip(parsed, exp.expression_lists):
+            self.assertEqual(exp.canonical_key(tree), exp.canonical_key(exp_list))
+        one, two, three = Number(nums=(1, 0, 1)), Number(nums=(2, 0, 1)), Number(nums=(3, 0, 1))
+        key = exp.canonical_key(ExpressionNode(' + ', ExpressionNode(' + ', three, one), two))
+        self.assertEqual(key, (' + ', (('n', 1, 0, 1), ('n', 2, 0, 1), ('n', 3, 0, 1))))
+        self.assertEqual(key, exp.canonical_key(ExpressionNode(' + ', one, ExpressionNode(' + ', two, three))))
+        self.assertNotEqual(exp.canonical_key(ExpressionNode(' - ', three, one)),
+                            exp.canonical_key(ExpressionNode(' - ', one, three)))
+
+    def test_constructive_generation(self):
+        # Test 17: Constructive mode produces valid, consistent answers
+        exp = Expression(5, 200, constructive=True)
+        questions, answers = exp.run()
+        self.assertEqual(len(questions), 200)
+        for exp_list, answer in zip(exp.expression_lists, answers):
+            self.assertEqual(str(exp.calculate_answer(exp_list)), answer)
+
+        # Test 18: Acceptance rate is reported
+        self.assertGreater(exp.acceptance_rate(), 0)
+        self.assertLessEqual(exp.acceptance_rate(), 1)
+        self.assertEqual(Expression(5, 1).acceptance_rate(), 0.0)
+
+    def test_seeded_generation(self):
+        # Test 19: The same seed reproduces the same questions
+        self.assertEqual(Expression(10, 20, seed=3).run(), Expression(10, 20, seed=3).run())
+
+        # Test 20: Parallel output does not depend on the worker count
+        serial = generate_parallel(10, 60, seed=5, workers=1, shard_size=16)
+        parallel = generate_parallel(10, 60, seed=5, workers=2, shard_size=16)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(serial[0]), 60)
+        self.assertEqual(len(set(serial[0])), 60)
+
+    def test_instrumentation(self):
+        # Test 24: Statistics are off by default
+        exp = Expression(5, 100, seed=2)
+        exp.run()
+        self.assertIsNone(exp.stats)
+
+        # Test 25: Phase timers, rejection reasons and histograms add up
+        reports = []
+        exp = Expression(5, 300, seed=2)
+        stats = exp.enable_instrumentation(reports.append)
+        exp.run()
+        data = json.loads(stats.to_json())
+        self.assertEqual(data['calls']['generate_expression_list'], exp.generation_times)
+        self.assertEqual(data['calls']['randomly_generate_questions'], 300)
+        self.assertEqual(sum(data['accepted_by_operators'].values()), 300)
+        self.assertEqual(sum(data['rejections'].values()), exp.generation_times - 300)
+        self.assertEqual(sum(data['rejected_by_operators'].values()), exp.generation_times - 300)
+        self.assertIn(GenerationStats.DUPLICATE, data['rejections'])
+        self.assertIn(CustomMathError.NEGATIVE, data['rejections'])
+        self.assertEqual(reports, [data])
+
+    def test_expression_tree_engine(self):
+        # Test 26: One pass evaluates, keys and renders with minimal parentheses
+        a, b, c = Number(nums=(1, 0, 1)), Number(nums=(2, 0, 1)), Number(nums=(3, 0, 1))
+        tree = ExpressionNode(' - ', c, ExpressionNode(' - ', b, a))
+        node, value, key, text, _ = analyze(tree)
+        self.assertEqual((str(value), text), ("2", "3 - (2 - 1)"))
+        self.assertEqual(analyze(ExpressionNode(' + ', a, ExpressionNode(' + ', b, c)))[3], "1 + 2 + 3")
+        self.assertEqual(analyze(ExpressionNode(' * ', ExpressionNode(' + ', a, b), c))[3], "(1 + 2) * 3")
+        self.assertEqual(key, Expression(5, 1).canonical_key(tree))
+        with self.assertRaises(CustomMathError) as context:
+            analyze(ExpressionNode(' - ', a, b))
+        self.assertEqual(context.exception.reason, CustomMathError.NEGATIVE)
+
+        # Test 27: Legacy expression lists evaluate through the same tree nodes
+        exp = Expression(10, 1)
+        self.assertIsInstance(exp.expression_tree([[c, ' * ', b], [' - ', a]]), ExpressionNode)
+        self.assertEqual(str(exp.calculate_answer([[c, ' * ', b], [' - ', a]])), "5")
+        with self.assertRaises(CustomMathError):
+            exp.calculate_answer([[c, ' * ', b], [a, ' - ']])
+
+        # Test 39: Long chains are combined without re-flattening keys or re-joining text
+        node, value, key, text, chain = leaf(a)
+        for number in [b, c] * 1000:
+            node, value, key, text, chain = combine(' + ', (node, value, key, text, chain), leaf(number))
+        self.assertEqual((key[0], key[1][0], key[2]), (' + ', ' + ', leaf(c)[2]))
+        node, value, key, text, _ = finish((node, value, key, text, chain))
+        self.assertEqual(text, ' + '.join(['1'] + ['2', '3'] * 1000))
+        self.assertEqual(str(value), "5001")
+        self.assertEqual(key, (' + ', tuple(sorted([leaf(n)[2] for n in [a] + [b, c] * 1000]))))
+
+        # Test 28: Any operator count; rendered text parses back to the same value and key
+        exp = Expression(10, 300, seed=4, max_operators=6)
+        questions, answers = exp.run()
+        self.assertEqual(len(set(questions)), 300)
+        self.assertLessEqual(max(len(q.split()) // 2 for q in questions), 6)
+        self.assertTrue(any(len(q.split()) // 2 > 3 for q in questions))
+        for node, question, answer in zip(exp.expression_lists, questions, answers):
+            parsed = parse_expression(question)
+            self.assertEqual(str(evaluate(parsed)), answer)
+            self.assertEqual(exp.canonical_key(parsed), exp.canonical_key(node))
+        self.assertEqual(Expression(10, 300, seed=4, max_operators=6).run(), (questions, answers))
+
+    def test_rational_kernel(self):
+        # Test 29: Cross-cancelled results match exact rationals and are fully reduced
+        rng = random.Random(5)
+        for _ in range(2000):
+            a, b = Number(12, rng=rng), Number(12, rng=rng)
+            fa, fb = fractions.Fraction(*a.improper()), fractions.Fraction(*b.improper())
+            for op, expected in ((' + ', fa + fb), (' * ', fa * fb), (' - ', fa - fb)):
+                result = Fraction(a, b, op).calculate_fractions()
+                self.assertEqual(result.improper(), (expected.numerator, expected.denominator))
+            if b != 0:
+                result = Fraction(a, b, ' % ').calculate_fractions()
+                self.assertEqual(fractions.Fraction(*result.improper()), fa / fb)
+
+        # Test 30: Long chains stay exact without floats
+        value = Number(nums=(1, 0, 1))
+        for k in range(2, 200):
+            value = Fraction(value, Number(nums=(0, 1, k * (k - 1))), ' - ').calculate_fractions()
+        self.assertEqual(value, Number(nums=(0, 1, 199)))
+        self.assertLess(Number(nums=(0, 1, 10 ** 30)), Number(nums=(0, 1, 10 ** 30 - 1)))
+
+    def test_stratified_generation(self):
+        # Test 31: Quotas are met exactly by targeted sampling
+        quotas = Quotas({1: 0.2, 2: 0.5, 3: 0.3}, division=0.4, fractional_only=True)
+        self.assertEqual(sum(quotas.plan(100).values()), 100)
+        for constructive in (False, True):
+            exp = Expression(10, 100, constructive=constructive, seed=6, quotas=quotas)
+            questions, answers = exp.run()
+            counts = [len(exp_list) for exp_list in exp.expression_lists]
+            self.assertEqual([counts.count(k) for k in (1, 2, 3)], [20, 50, 30])
+            self.assertGreaterEqual(sum(' % ' in question for question in questions), 40)
+            self.assertTrue(all("/" in answer for answer in answers))
+            for question, answer in zip(questions, answers):
+                self.assertEqual(str(evaluate(parse_expression(question))), answer)
+
+        # Test 32: Quotas work with the expression tree engine
+        exp = Expression(10, 60, seed=6, max_operators=5, quotas=Quotas({4: 0.5, 5: 0.5}, division=1))
+        questions, answers = exp.run()
+        self.assertEqual(sorted(len(q.split()) // 2 for q in questions), [4] * 30 + [5] * 30)
+        self.assertTrue(all(' % ' in question for question in questions))
+
+        # Test 33: Invalid quotas
+        for kwargs in ({'operators': {1: 0.5}}, {'division': 1.5}, {'operators': {0: 1}}):
+            with self.assertRaises(CustomMathError):
+                Quotas(**kwargs)
+        with self.assertRaises(CustomMathError):
+            Quotas({4: 1}).plan(10)
+
+    def test_calculation_cache(self):
+        # Test 34: Hits, misses and LRU evictions are counted
+        a, b, c = Number(nums=(1, 0, 1)), Number(nums=(0, 1, 2)), Number(nums=(2, 0, 1))
+        cache = CalculationCache(2)
+        self.assertIs(cache.calculate(a, b, ' + '), Fraction(a, b, ' + ').calculate_fractions())
+        cache.calculate(a, b, ' + ')
+        cache.calculate(a, c, ' * ')
+        cache.calculate(a, b, ' + ')
+        cache.calculate(b, c, ' - ')  # 淘汰最久未使用的 a * c
+        self.assertEqual((cache.hits, cache.misses, cache.evictions, len(cache)), (2, 3, 1, 2))
+        self.assertNotIn((a, c, ' * '), cache.entries)
+        with self.assertRaises(CustomMathError):
+            cache.calculate(a, Number(nums=(0, 0, 1)), ' % ')
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(cache.to_dict()['hits'], 0)
+
+        # Test 35: The per-instance cache is opt-in, can be cleared or disabled, and does not change output
+        exp = Expression(5, 200, seed=8, cache_size=64)
+        self.assertEqual(exp.run(), Expression(5, 200, seed=8).run())
+        self.assertGreater(exp.cache.hits, 0)
+        self.assertLessEqual(len(exp.cache), 64)
+        exp.clear_cache()
+        self.assertEqual(len(exp.cache), 0)
+        exp.disable_cache()
+        self.assertIsNone(exp.cache)
+        self.assertIsNone(Expression(5, 1).cache)
+        self.assertIsInstance(Expression(5, 1).enable_cache(10), CalculationCache)
+
+    def test_bounded_generation(self):
+        # Test 36: Operand counts and capacity bounds
+        self.assertEqual((count_operands(1), count_operands(2), count_operands(10)), (0, 2, 280))
+        # 0 与 1 组成的一个运算符的表达式：0+0、0+1、1+1，0-0、1-0、1-1，0*0、0*1、1*1，0%1、1%1
+        self.assertEqual(estimate_capacity(2, 1), 11)
+        self.assertEqual(estimate_capacity(2, 1, division=True), 2)
+        self.assertEqual(estimate_capacity(2, 1, fractional_only=True), 0)
+        self.assertEqual(estimate_capacity(2, 2, fractional_only=True), 1)
+        self.assertEqual(sum(estimate_capacity(3, count) for count in (1, 2, 3)), 88443)
+        # 超出精确枚举范围时的上界仍不小于精确值
+        exact = [estimate_capacity(4, count, division) for count in (1, 2) for division in (False, True)]
+        exact_capacity.cache_clear()
+        with patch("function.EXACT_CAPACITY_PAIRS", 0):
+            bound = [estimate_capacity(4, count, division) for count in (1, 2) for division in (False, True)]
+        exact_capacity.cache_clear()
+        self.assertEqual(exact, [648, 240, 48002, 30926])
+        self.assertTrue(all(e <= b < 2 * e for e, b in zip(exact, bound)))
+
+        # Test 37: Infeasible parameters keep what can be generated and report INFEASIBLE
+        exp = Expression(1, 10)
+        self.assertFalse(exp.feasible())
+        self.assertEqual(exp.run(), ([], []))
+        self.assertEqual((exp.status, exp.generation_times), (Expression.INFEASIBLE, 0))
+        self.assertEqual(list(Expression(1, 10).iter_questions()), [])
+        for exp in (Expression(2, 10 ** 6, seed=1, max_attempts=2000),
+                    Expression(2, 9, seed=1, quotas=Quotas(fractional_only=True))):
+            self.assertFalse(exp.feasible())
+            questions, answers = exp.run()
+            self.assertTrue(0 < len(questions) == len(answers) < exp.question_num)
+            self.assertEqual(exp.status, Expression.INFEASIBLE)
+        self.assertTrue(all(answer.numerator for answer in map(parse_number, answers)))
+        exp = Expression(2, 3000, seed=1)
+        self.assertFalse(exp.feasible())
+        self.assertLessEqual(len(exp.run()[0]), 1113)
+        self.assertEqual(exp.status, Expression.INFEASIBLE)
+        self.assertLess(exp.generation_times, 3000 * Expression.ATTEMPTS_PER_QUESTION // 10)
+
+        # Test 40: Generation stops once the recent acceptance rate collapses
+        window = AcceptanceWindow()
+        self.assertFalse(window.exhausted(999, 999))
+        self.assertFalse(window.exhausted(1000, 900))
+        self.assertFalse(window.exhausted(2000, 1300))
+        self.assertTrue(window.exhausted(3000, 1340))
+        self.assertTrue(AcceptanceWindow().exhausted(1000, 0))
+
+        # Test 38: Attempt and time limits return partial results with a status
+        exp = Expression(10, 100, seed=1, max_attempts=50)
+        questions, answers = exp.run()
+        self.assertEqual((exp.status, exp.generation_times), (Expression.ATTEMPT_LIMIT, 50))
+        self.assertTrue(0 < len(questions) == len(answers) < 100)
+        exp = Expression(10, 10 ** 6, seed=1, time_limit=0.05)
+        self.assertLess(len(exp.run()[0]), 10 ** 6)
+        self.assertEqual(exp.status, Expression.TIME_LIMIT)
+        exp = Expression(10, 100, seed=1)
+        self.assertIsNone(exp.status)
+        exp.run()
+        self.assertEqual(exp.status, Expression.COMPLETE)
+
     def test_error_handling(self):
         # Test 11: Division by zero
-        with self.assertRaises(CustomMathError):
+        with self.assertRaises(CustomMathError) as context:
             f = Fraction(Number(nums=(1, 0, 1)), Number(nums=(0, 0, 1)), ' % ')
             f.calculate_fractions()
+        self.assertEqual(context.exception.reason, CustomMathError.ZERO_DIVISOR)
 
         # Test 12: Positive subtraction (should not raise error)
         f = Fraction(Number(nums=(3, 0, 1)), Number(nums=(2, 0, 1)), ' - ')
@@ -0,0 +1,136 @@
+import os
+import random
+import tempfile
+import unittest
+from function import Number, Expression, CustomMathError
+from grading import (parse_expression, evaluate, parse_number, answers_match, load_answer_key,
+                     grade_answers, grade_files, grade_directory, IncrementalGrader)
+
+
+class TestGrading(unittest.TestCase):
+    def test_parse_and_evaluate(self):
+        # Test 1: Precedence, parentheses and mixed numbers
+        self.assertEqual(str(evaluate(parse_expression("1'1/2 + 3 * 2"))), "7'1/2")
+        self.assertEqual(str(evaluate(parse_expression("(1'1/2 + 3) % 2"))), "2'1/4")
+        self.assertEqual(str(evaluate(parse_expression("7 - 2 - 1"))), "4")
+
+        # Test 2: Malformed questions raise CustomMathError
+        for text in ["1 +", "(1 + 2", "1 / 2 / 3", "a + 1"]:
+            with self.assertRaises(CustomMathError):
+                parse_expression(text)
+
+    def test_generated_questions_evaluate_to_answers(self):
+        # Test 3: Every rendered question evaluates to its stored answer
+        for constructive in (False, True):
+            questions, answers = Expression(10, 300, constructive=constructive, seed=4).run()
+            for question, answer in zip(questions, answers):
+                self.assertEqual(str(evaluate(parse_expression(question))), answer)
+
+    def test_semantic_answer_comparison(self):
+        # Test 4: Equivalent notations are graded as equal
+        self.assertEqual(parse_number("6/4"), Number(nums=(1, 1, 2)))
+        self.assertTrue(answers_match("3/2", "1'1/2"))
+        self.assertTrue(answers_match(" 6/4 ", "1'1/2"))
+        self.assertFalse(answers_match("5/4", "1'1/2"))
+        self.assertFalse(answers_match("abc", "1"))
+        self.assertEqual(grade_answers(["3/2", "2", "x"], ["1'1/2", "3", "0"]), ([1], [2, 3]))
+
+    def test_grade_existing_files(self):
+        # Test 5: Grade against existing files, with and without Answer.txt
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            submission_path = os.path.join(tmp, "submission.txt")
+            grade_path = os.path.join(tmp, "Grade.txt")
+            with open(exercise_path, "w") as file:
+                file.write("1 + 1/2\n3 % 2\n")
+            with open(submission_path, "w") as file:
+                file.write("3/2\n1\n")
+            self.assertEqual(grade_files(submission_path, exercise_path, answer_path), ([1], [2]))
+            with open(answer_path, "w") as file:
+                file.write("1'1/2\n1'1/2\n")
+            self.assertEqual(grade_files(submission_path, exercise_path, answer_path, grade_path), ([1], [2]))
+            with open(grade_path) as file:
+                self.assertEqual(file.read(), "Correct: 1 (1)\nWrong: 1 (2)\n")
+
+            # Test 6: Parsed answer keys are cached
+            self.assertIs(load_answer_key(exercise_path, answer_path), load_answer_key(exercise_path, answer_path))
+
+    def test_grade_directory(self):
+        # Test 7: Each submission gets a grade file and the report has per-question error rates
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            submission_dir = os.path.join(tmp, "submissions")
+            os.makedirs(submission_dir)
+            with open(exercise_path, "w") as file:
+                file.write("1 + 1/2\n3 % 2\n2 * 2\n")
+            with open(answer_path, "w") as file:
+                file.write("1'1/2\n1'1/2\n4\n")
+            submissions = {"alice": "3/2\n1'1/2\n4\n", "bob": "3/2\n1\n", "carol": "1\n6/4\n4\n"}
+            for name, content in submissions.items():
+                with open(os.path.join(submission_dir, name + ".txt"), "w") as file:
+                    file.write(content)
+            for workers in (1, 2):
+                output_dir = os.path.join(tmp, f"grades{workers}")
+                count, errors = grade_directory(submission_dir, exercise_path, answer_path,
+                                                output_dir=output_dir, workers=workers)
+                self.assertEqual((count, errors), (3, [1, 1, 1]))
+                with open(os.path.join(output_dir, "bob.Grade.txt")) as file:
+                    self.assertEqual(file.read(), "Correct: 1 (1)\nWrong: 2 (2, 3)\n")
+                with open(os.path.join(output_dir, "Report.txt")) as file:
+                    report = file.read().splitlines()
+                self.assertEqual(report[:3], ["Submissions: 3", "Average: 2.00/3", "1: 1 wrong (33.33%)"])
+
+            # Test 11: Writing grades into the submission directory does not grade them on a re-run
+            for _ in range(2):
+                count, errors = grade_directory(submission_dir, exercise_path, answer_path,
+                                                output_dir=submission_dir, workers=1)
+                self.assertEqual((count, errors), (3, [1, 1, 1]))
+            self.assertIn("alice.Grade.txt", os.listdir(submission_dir))
+
+    def test_incremental_grader(self):
+        # Test 8: Only edited lines are re-graded and results match a full grading pass
+        questions, answers = Expression(10, 50, seed=4).run()
+        grader = IncrementalGrader(answers[:30])
+        grader.extend(answers[30:])
+        self.assertEqual((len(grader), grader.correct_count()), (50, 0))
+        submission = [''] * 50
+        for index in (0, 5, 49):
+            submission[index] = answers[index]
+            grader.update(index, answers[index])
+        grader.update(7, "9999")
+        submission[7] = "9999"
+        self.assertEqual(grader.grade(), [0, 5, 7, 49])
+        self.assertEqual(grader.grade(), [])
+        self.assertEqual((grader.correct(), grader.incorrect()), grade_answers(submission, answers))
+        self.assertEqual(grader.correct(limit=2), [1, 6])
+        grader.update(5, " " + answers[5] + " ")
+        grader.update(0, "")
+        self.assertEqual(grader.grade(), [0])
+        self.assertEqual(grader.correct(), [6, 50])
+        self.assertEqual(grader.incorrect(limit=3), [1, 2, 3])
+        self.assertEqual((grader.correct_count(), grader.incorrect_count()), (2, 48))
+
+        # Test 9: Limited lookups agree with the full lists after random edits
+        rng = random.Random(1)
+        edited = IncrementalGrader(answers)
+        for _ in range(20):
+            for index in rng.sample(range(50), 10):
+                edited.update(index, answers[index] if rng.random() < 0.6 else "")
+            edited.grade()
+            for limit in (0, 1, 7, 100):
+                self.assertEqual(edited.correct(limit), edited.correct()[:limit])
+                self.assertEqual(edited.incorrect(limit), edited.incorrect()[:limit])
+            self.assertEqual(edited.correct_count(), len(edited.correct()))
+
+        # Test 10: The grade file matches the cached verdicts
+        with tempfile.TemporaryDirectory() as tmp:
+            grade_path = os.path.join(tmp, "Grade.txt")
+            grader.write(grade_path)
+            with open(grade_path) as file:
+                self.assertTrue(file.readline().startswith("Correct: 2 (6, 50)"))
+
+
+if __name__ == '__main__':
+    unittest.main()
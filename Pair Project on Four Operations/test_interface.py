@@ -1,5 +1,19 @@
+import os
+import queue
+import tempfile
+import threading
 import unittest
 from function import Number, Fraction, Expression, CustomMathError
+from interface import generate_in_background, VirtualList, QuestionView, format_indices
+
+
+def tk_root():
+    """返回新建的 Tk 根窗口，没有可用的显示时返回 None"""
+    import tkinter as tk
+    try:
+        return tk.Tk()
+    except tk.TclError:
+        return None
 
 
 class TestMathFunctions(unittest.TestCase):
@@ -72,5 +86,103 @@ class TestMathFunctions(unittest.TestCase):
         self.assertEqual(str(result), "0")
 
 
+class TestBackgroundGeneration(unittest.TestCase):
+    def drain(self, messages):
+        items = []
+        while not messages.empty():
+            items.append(messages.get_nowait())
+        return items
+
+    def test_generate_in_background(self):
+        # Test 14: Results arrive in batches, followed by 'done', and files are written
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            messages = queue.Queue()
+            generate_in_background(10, 25, messages, threading.Event(), exercise_path, answer_path, batch_size=10)
+            items = self.drain(messages)
+            self.assertEqual([len(item[1]) for item in items[:-1]], [10, 10, 5])
+            self.assertEqual(items[-1], ('done',))
+            with open(answer_path) as answer_file:
+                self.assertEqual(answer_file.read().splitlines(), [str(a) for item in items[:-1] for a in item[2]])
+            self.assertTrue(os.path.exists(exercise_path))
+            self.assertEqual(sorted(os.listdir(tmp)), ["Answer.txt", "Exercises.txt"])
+
+    def test_cancel_generation(self):
+        # Test 15: A cancelled run stops early, keeps existing files and leaves no temporary files
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            messages = queue.Queue()
+            cancel_event = threading.Event()
+            cancel_event.set()
+            generate_in_background(10, 1000, messages, cancel_event, exercise_path, os.path.join(tmp, "Answer.txt"))
+            self.assertEqual(self.drain(messages), [('cancelled',)])
+            self.assertEqual(os.listdir(tmp), [])
+
+            with open(exercise_path, "w") as exercise_file:
+                exercise_file.write("1 + 1\n")
+            cancel_event = threading.Event()
+            batches = queue.Queue()
+
+            class CancelAfterFirstBatch:
+                def put(self, message):
+                    batches.put(message)
+                    cancel_event.set()
+
+            generate_in_background(10, 1000, CancelAfterFirstBatch(), cancel_event, exercise_path,
+                                   os.path.join(tmp, "Answer.txt"), batch_size=10)
+            items = self.drain(batches)
+            self.assertEqual((len(items), items[-1]), (2, ('cancelled',)))
+            self.assertEqual(os.listdir(tmp), ["Exercises.txt"])
+            with open(exercise_path) as exercise_file:
+                self.assertEqual(exercise_file.read(), "1 + 1\n")
+
+
+class TestVirtualList(unittest.TestCase):
+    def test_scrolling(self):
+        # Test 16: Only a window of rows is visible, clamped to the list bounds
+        window = VirtualList(10)
+        self.assertEqual(list(window.visible()), [])
+        self.assertEqual(window.fractions(), (0.0, 1.0))
+        window.set_total(1000000)
+        self.assertEqual(window.visible(), range(0, 10))
+        window.scroll(-5)
+        self.assertEqual(window.first, 0)
+        window.yview('scroll', '2', 'pages')
+        self.assertEqual(window.visible(), range(20, 30))
+        window.yview('moveto', '0.5')
+        self.assertEqual(window.first, 500000)
+        self.assertEqual(window.fractions(), (0.5, 0.50001))
+        window.yview('moveto', '1.0')
+        self.assertEqual(window.visible(), range(999990, 1000000))
+        window.set_total(15)
+        self.assertEqual(window.visible(), range(5, 15))
+
+        # Test 17: Long result lists are truncated
+        self.assertEqual(format_indices([1, 2, 3]), "1, 2, 3")
+        self.assertEqual(format_indices(list(range(1, 101)), limit=3), "1, 2, 3 ... (共100题)")
+        self.assertEqual(format_indices([1, 2], limit=2, total=40), "1, 2 ... (共40题)")
+
+
+class TestQuestionView(unittest.TestCase):
+    def test_edits_without_key_events(self):
+        # Test 18: Edits that bypass the keyboard (e.g. pasting) reach the answers; refresh() does not
+        root = tk_root()
+        if root is None:
+            self.skipTest("没有可用的显示")
+        try:
+            changes = []
+            view = QuestionView(root, rows=3, on_change=lambda index, answer: changes.append((index, answer)))
+            view.extend(["1 + 1", "2 + 2", "3 + 3", "4 + 4"])
+            self.assertEqual(changes, [])
+            view.entries[1].insert(0, "4")  # 与粘贴相同，不产生按键事件
+            self.assertEqual((view.answers[1], changes), ("4", [(1, "4")]))
+            view.yview('scroll', '1', 'units')
+            self.assertEqual(view.variables[0].get(), "4")
+            self.assertEqual(changes, [(1, "4")])
+        finally:
+            root.destroy()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from main import parse_args, run_cli, run_grade, GENERATE_TIME_LIMIT
+
+
+class TestMain(unittest.TestCase):
+    def test_run_cli(self):
+        # Test 1: Generate files from the command line
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            args = parse_args(["-n", "20", "-r", "10", "-e", exercise_path, "-a", answer_path, "--seed", "1"])
+            self.assertEqual(run_cli(args), 20)
+            with open(exercise_path) as question_file, open(answer_path) as answer_file:
+                self.assertEqual(len(question_file.read().splitlines()), 20)
+                self.assertEqual(len(answer_file.read().splitlines()), 20)
+
+    def test_invalid_arguments(self):
+        # Test 2: -n and -r must be given together and be positive
+        for argv in (["-n", "5"], ["-r", "5"], ["-n", "0", "-r", "5"]):
+            with self.assertRaises(SystemExit):
+                parse_args(argv)
+        self.assertIsNone(parse_args([]).number)
+        self.assertEqual(parse_args([]).time_limit, GENERATE_TIME_LIMIT)
+
+    def test_headless_imports(self):
+        # Test 3: The command-line path does not import the GUI modules, other modules are imported on use
+        code = "import sys, main; print('tkinter' in sys.modules or 'PIL' in sys.modules or 'interface' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(output.stdout.strip(), "False")
+        code = "import sys, main; print(sorted({'export', 'grading', 'seen_filter'} & set(sys.modules)))"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    def test_run_grade(self):
+        # Test 4: Grade a directory of submissions from the command line
+        with tempfile.TemporaryDirectory() as tmp:
+            exercise_path = os.path.join(tmp, "Exercises.txt")
+            answer_path = os.path.join(tmp, "Answer.txt")
+            run_cli(parse_args(["-n", "5", "-r", "10", "-e", exercise_path, "-a", answer_path, "--seed", "1"]))
+            submission_dir = os.path.join(tmp, "submissions")
+            os.makedirs(submission_dir)
+            for name in ("a", "b"):
+                with open(answer_path) as source, open(os.path.join(submission_dir, name + ".txt"), "w") as target:
+                    target.write(source.read())
+            args = parse_args(["--grade", submission_dir, "-e", exercise_path, "-a", answer_path, "--workers", "1"])
+            self.assertEqual(run_grade(args), 2)
+            with open(os.path.join(submission_dir, "grades", "a.Grade.txt")) as file:
+                self.assertTrue(file.read().startswith("Correct: 5 "))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from function import Expression, CustomMathError, GenerationStats
+from seen_filter import SeenFilter
+
+
+class TestSeenFilter(unittest.TestCase):
+    def test_membership_and_persistence(self):
+        # Test 1: Added keys are found again after reopening; the file is sized from capacity
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "seen.bin")
+            keys = [(' + ', (('n', i, 0, 1), ('n', 1, 0, 1))) for i in range(2000)]
+            with SeenFilter(path, capacity=2000, error_rate=0.01) as seen:
+                added = sum(seen.add(key) for key in keys)  # 误判为已存在的键不计数
+                self.assertGreater(added, 1950)
+                self.assertFalse(seen.add(keys[0]))
+            self.assertLess(os.path.getsize(path), 3000)
+            with SeenFilter(path) as seen:
+                self.assertEqual(len(seen), added)
+                self.assertTrue(all(key in seen for key in keys))
+                others = [(' * ', ('n', i, 0, 1), ('n', 2, 0, 1)) for i in range(10000)]
+                false_positives = sum(key in seen for key in others)
+                self.assertLess(false_positives / len(others), 0.03)
+
+            # Test 2: Files that are not filters are rejected
+            bad_path = os.path.join(tmp, "bad.bin")
+            with open(bad_path, "wb") as file:
+                file.write(b"x" * 64)
+            with self.assertRaises(CustomMathError):
+                SeenFilter(bad_path)
+
+    def test_generation_avoids_repeats(self):
+        # Test 3: A second session with the same seed issues no repeated questions
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "seen.bin")
+            with SeenFilter(path, capacity=10000) as seen:
+                first = Expression(10, 200, seed=1, seen=seen)
+                first.run()
+            with SeenFilter(path) as seen:
+                second = Expression(10, 200, seed=1, seen=seen)
+                stats = second.enable_instrumentation()
+                second.run()
+                self.assertEqual(len(seen), 400)
+            self.assertFalse(first.expressions & second.expressions)
+            self.assertGreater(stats.rejections[GenerationStats.SEEN], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
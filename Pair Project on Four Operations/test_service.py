@@ -0,0 +1,92 @@
+import asyncio
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from function import Expression
+from service import QuizService
+
+
+async def request(port, method, target, data=None):
+    """发送一个请求，返回 (状态码, 响应数据)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(data).encode() if data is not None else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+class TestQuizService(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.service = QuizService(executor=self.executor)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def run_with_server(self, scenario):
+        async def main():
+            server = await self.service.start("127.0.0.1", 0)
+            async with server:
+                return await scenario(server.sockets[0].getsockname()[1])
+        return asyncio.run(main())
+
+    def test_generate_answers_grade(self):
+        # Test 1: Generate, fetch answers and grade over HTTP
+        async def scenario(port):
+            status, generated = await request(port, "POST", "/generate", {"count": 20, "max": 10, "seed": 3})
+            self.assertEqual(status, 200)
+            self.assertEqual(generated["questions"], Expression(10, 20, seed=3).run()[0])
+            self.assertEqual(generated["status"], Expression.COMPLETE)
+            status, answers = await request(port, "GET", f"/answers?id={generated['id']}")
+            self.assertEqual(status, 200)
+            submission = list(answers["answers"])
+            submission[0] = "9999"
+            status, grade = await request(port, "POST", "/grade", {"id": generated["id"], "answers": submission})
+            self.assertEqual(status, 200)
+            self.assertEqual(grade["wrong"], [1])
+            self.assertEqual(grade["correct"], list(range(2, 21)))
+
+        self.run_with_server(scenario)
+
+    def test_errors(self):
+        # Test 2: Bad requests get JSON errors with matching status codes
+        async def scenario(port):
+            self.assertEqual((await request(port, "POST", "/generate", {"count": 0, "max": 10}))[0], 400)
+            with patch("service.GENERATE_TIME_LIMIT", 0.2):
+                status, data = await request(port, "POST", "/generate", {"count": 10000, "max": 2, "seed": 1})
+            self.assertEqual((status, data["status"]), (200, Expression.INFEASIBLE))
+            self.assertTrue(0 < len(data["questions"]) < 10000)
+            self.assertEqual((await request(port, "GET", "/answers?id=missing"))[0], 404)
+            self.assertEqual((await request(port, "GET", "/generate"))[0], 405)
+            self.assertEqual((await request(port, "GET", "/unknown"))[0], 404)
+            status, data = await request(port, "POST", "/grade", {"id": "missing", "answers": []})
+            self.assertEqual(status, 404)
+            self.assertIn("error", data)
+            for set_id in (["a"], None, 1):
+                status, data = await request(port, "POST", "/grade", {"id": set_id, "answers": []})
+                self.assertEqual(status, 400)
+                self.assertIn("error", data)
+
+        self.run_with_server(scenario)
+
+    def test_coalescing(self):
+        # Test 3: Concurrent identical requests share one generation task
+        async def scenario(port):
+            body = {"count": 200, "max": 10, "seed": 5}
+            results = await asyncio.gather(*[request(port, "POST", "/generate", body) for _ in range(5)])
+            self.assertEqual(len({json.dumps(data) for _, data in results}), 1)
+            await request(port, "POST", "/generate", body)
+            self.assertEqual(self.service.generated, 1)
+            await request(port, "POST", "/generate", {"count": 200, "max": 10, "seed": 6})
+            self.assertEqual(self.service.generated, 2)
+
+        self.run_with_server(scenario)
+
+
+if __name__ == '__main__':
+    unittest.main()
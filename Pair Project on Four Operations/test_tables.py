@@ -0,0 +1,80 @@
+import random
+import unittest
+from function import Number, Fraction, Expression, CustomMathError, GenerationStats
+from grading import parse_expression, evaluate
+from tables import OperationTable, get_table, TABLE_MAX
+
+
+class TestOperationTable(unittest.TestCase):
+    def test_operands(self):
+        # Test 1: Every operand Number(max) can produce is enumerated once, in order
+        table = OperationTable(10)
+        self.assertEqual(len(table), 280)
+        self.assertEqual(table.operands, sorted(set(table.operands)))
+        rng = random.Random(1)
+        for _ in range(2000):
+            self.assertIn(Number(10, rng=rng), table.index)
+            self.assertIn(table.sample(rng), table.index)
+        self.assertIs(get_table(10), get_table(10))
+        with self.assertRaises(CustomMathError):
+            OperationTable(TABLE_MAX + 1)
+
+        # Test 7: Results are stored as compact int32 numerator/denominator arrays
+        for op in (' + ', ' - ', ' * ', ' % '):
+            self.assertEqual(table.numerators[op].nbytes + table.denominators[op].nbytes, 8 * 280 ** 2)
+
+    def test_lookup_matches_fraction(self):
+        # Test 2: Table lookups equal Fraction results, with zero divisors rejected
+        table = OperationTable(6)
+        rng = random.Random(2)
+        for _ in range(500):
+            a, b = table.sample(rng), table.sample(rng)
+            for op in (' + ', ' - ', ' * ', ' % '):
+                if op == ' % ' and b == 0:
+                    with self.assertRaises(CustomMathError):
+                        table.calculate(a, b, op)
+                else:
+                    self.assertIs(table.calculate(a, b, op), Fraction(a, b, op).calculate_fractions())
+        big = Number(nums=(100, 0, 1))
+        self.assertEqual(table.calculate(big, big, ' + '), Number(nums=(200, 0, 1)))
+
+        # Test 3: Validity bitmasks mark non-negative results and non-zero divisors
+        zero = table.index[Number(nums=(0, 0, 1))]
+        for i in range(len(table)):
+            self.assertFalse(table.valid_mask(' % ', i) >> zero & 1)
+            self.assertEqual(bin(table.valid_mask(' - ', i)).count('1'), i + 1)
+        self.assertEqual(table.count_valid(' + '), len(table) ** 2)
+        for i in range(len(table)):
+            for op in (' - ', ' % '):
+                mask = 0
+                for j in range(len(table)):
+                    result = table.entry(op, i, j)
+                    if result is not None and result >= 0:
+                        mask |= 1 << j
+                self.assertEqual(table.valid_mask(op, i), mask)
+
+        # Test 4: Operand pairs are drawn only from the valid bits
+        for _ in range(500):
+            for op in (' + ', ' - ', ' * ', ' % '):
+                left, right = table.sample_pair(op, rng)
+                self.assertTrue(table.valid_mask(op, table.index[left]) >> table.index[right] & 1)
+                self.assertGreaterEqual(table.calculate(left, right, op), 0)
+
+    def test_generation_with_tables(self):
+        # Test 5: Generation with tables is reproducible and answers stay correct
+        for kwargs in ({}, {'constructive': True}, {'max_operators': 5}):
+            questions, answers = Expression(10, 300, seed=3, tables=True, **kwargs).run()
+            self.assertEqual(Expression(10, 300, seed=3, tables=True, **kwargs).run(), (questions, answers))
+            self.assertEqual(len(set(questions)), 300)
+            for question, answer in zip(questions, answers):
+                self.assertEqual(str(evaluate(parse_expression(question))), answer)
+
+        # Test 6: Single-operator questions built from table pairs are never rejected as invalid
+        exp = Expression(10, 300, seed=3, tables=True, max_operators=1)
+        stats = exp.enable_instrumentation()
+        exp.run()
+        self.assertEqual(set(stats.rejections) - {GenerationStats.DUPLICATE}, set())
+
+
+if __name__ == '__main__':
+    unittest.main()